@@ -0,0 +1,83 @@
+"""1日あたり大量のメッセージがある場合のマージ・タイムライン作成の所要時間を測る。
+
+    uv run python -m benchmarks.bench_merge [1日の件数 ...]
+"""
+
+import sys
+import timeit
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from src.journal_writer import JournalWriter
+from src.message_store import merge_messages
+from src.models import DailySummary, Message
+
+JST = ZoneInfo("Asia/Tokyo")
+_DEFAULT_SIZES = (10_000, 50_000)
+_NEW = 20  # 1回のポーリングで届く新規メッセージ数
+_EDITS = 5  # 1回のポーリングで届く編集数
+
+
+def _day(count: int) -> list[Message]:
+    start = datetime(2026, 1, 1, tzinfo=JST)
+    step = timedelta(days=1) / (count + _NEW)
+    return [
+        Message(
+            message_id=i + 1,
+            timestamp=start + step * i,
+            text=f"メモ {i}",
+            source_chat=-1001234,
+            attachments=[],
+        )
+        for i in range(count)
+    ]
+
+
+def _poll(existing: list[Message]) -> list[Message]:
+    """末尾に続く新規メッセージと、既存メッセージへの編集。"""
+    last = existing[-1]
+    new = [
+        Message(last.message_id + i + 1, last.timestamp + timedelta(seconds=i + 1),
+                f"新規 {i}", last.source_chat, [])
+        for i in range(_NEW)
+    ]
+    stride = len(existing) // _EDITS
+    edits = [
+        Message(m.message_id, m.timestamp, m.text + " (編集)", m.source_chat, [])
+        for m in existing[::stride][:_EDITS]
+    ]
+    return new + edits
+
+
+def _merge_dict_sort(existing: list[Message], new: list[Message]) -> list[Message]:
+    """以前の実装: 全件を dict に入れ直して並べ直す。"""
+    by_id = {m.message_id: m for m in existing}
+    for msg in new:
+        by_id[msg.message_id] = msg
+    return sorted(by_id.values(), key=lambda m: m.timestamp)
+
+
+def _best(func, number: int = 5) -> float:
+    return min(timeit.repeat(func, number=1, repeat=number)) * 1000
+
+
+def main() -> None:
+    sizes = [int(a) for a in sys.argv[1:]] or list(_DEFAULT_SIZES)
+    writer = JournalWriter()
+    for count in sizes:
+        existing = _day(count)
+        new = _poll(existing)
+        assert merge_messages(existing, new) == _merge_dict_sort(existing, new)
+        summary = DailySummary(date="2026-01-01", messages=merge_messages(existing, new))
+        old_merge = _best(lambda: _merge_dict_sort(existing, new))
+        new_merge = _best(lambda: merge_messages(existing, new))
+        # 描画前のタイムライン作成: 以前は毎回 dedup_by_id + sort、現在は ordered=True で省略
+        old_timeline = _best(lambda: writer._timeline(summary))
+        print(f"{count} messages/day, {_NEW} new + {_EDITS} edits per poll")
+        print(f"  merge     dict+sort  {old_merge:7.2f} ms   sorted merge {new_merge:7.2f} ms")
+        print(f"  timeline  dedup+sort {old_timeline:7.2f} ms   ordered      {0:7.2f} ms")
+        print(f"  total     {old_merge + old_timeline:7.2f} ms -> {new_merge:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""メッセージ表現ごとのメモリ使用量（1メッセージあたりのバイト数）を測る。
+
+    uv run python -m benchmarks.bench_models [件数]
+"""
+
+import gc
+import json
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from src.day_batch import DayBatch
+from src.message_store import dict_to_msg, msg_to_dict
+from src.models import Attachment, FrozenMessage, Message
+
+JST = ZoneInfo("Asia/Tokyo")
+_DEFAULT_COUNT = 100_000
+
+
+def _lines(count: int) -> list[str]:
+    """messages/*.jsonl と同じ形式の行を生成する。"""
+    start = datetime(2026, 1, 1, tzinfo=JST)
+    result = []
+    for i in range(count):
+        attachments = (
+            [Attachment(file_id=f"f{i}", file_name=f"photo_{i}.jpg", media_type="photo")]
+            if i % 10 == 0
+            else []
+        )
+        msg = Message(
+            message_id=i + 1,
+            timestamp=start + timedelta(seconds=i * 30),
+            text=f"メモ {i}: 今日の出来事",
+            source_chat=-1001234,
+            attachments=attachments,
+        )
+        result.append(json.dumps(msg_to_dict(msg), ensure_ascii=False))
+    return result
+
+
+def _load(lines: list[str]):
+    """ログから読み込むのと同じく、行ごとに新しい Message を作る。"""
+    return (dict_to_msg(json.loads(line)) for line in lines)
+
+
+def _measure(build) -> int:
+    """build() が返すオブジェクトの保持に必要なバイト数を tracemalloc で測る。"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    return after - before
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else _DEFAULT_COUNT
+    lines = _lines(count)
+    results = {
+        "Message (dataclass)": _measure(lambda: list(_load(lines))),
+        "FrozenMessage (slots)": _measure(
+            lambda: [FrozenMessage.from_message(m) for m in _load(lines)]
+        ),
+        "DayBatch (columnar)": _measure(lambda: DayBatch.from_messages(_load(lines))),
+    }
+    print(f"{count} messages (text, timestamp and attachment objects included)")
+    for name, nbytes in results.items():
+        print(f"  {name:<24} {nbytes / count:8.1f} bytes/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+from array import array
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timedelta, timezone
+
+from src.models import NO_ATTACHMENTS, FrozenAttachment, FrozenMessage, Message
+
+
+class DayBatch:
+    """1日分などのメッセージを列ごとにまとめて保持するコンテナ。
+
+    message_id・chat id・UNIX 時刻・UTC オフセットは array のバッファに、本文は1つの
+    UTF-8 バッファ（+ 各メッセージの終端位置）に詰めて格納し、メッセージごとの
+    オブジェクトを持たない。添付はあるメッセージの分だけ位置をキーに保持する。
+    要素を取り出すと FrozenMessage を組み立てて返す。
+    """
+
+    __slots__ = (
+        "message_ids", "chat_ids", "timestamps", "utc_offsets",
+        "_text", "_text_ends", "_attachments",
+    )
+
+    def __init__(self) -> None:
+        self.message_ids = array("q")
+        self.chat_ids = array("q")
+        self.timestamps = array("d")  # UNIX 時刻（秒）
+        self.utc_offsets = array("i")  # タイムゾーンの UTC オフセット（秒）
+        self._text = bytearray()
+        self._text_ends = array("Q")
+        self._attachments: dict[int, tuple[FrozenAttachment, ...]] = {}
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[Message | FrozenMessage]) -> "DayBatch":
+        batch = cls()
+        for msg in messages:
+            batch.append(msg)
+        return batch
+
+    def append(self, msg: Message | FrozenMessage) -> None:
+        offset = msg.timestamp.utcoffset()
+        self.message_ids.append(msg.message_id)
+        self.chat_ids.append(msg.source_chat)
+        self.timestamps.append(msg.timestamp.timestamp())
+        self.utc_offsets.append(int(offset.total_seconds()) if offset is not None else 0)
+        self._text += msg.text.encode("utf-8")
+        self._text_ends.append(len(self._text))
+        if msg.attachments:
+            self._attachments[len(self.message_ids) - 1] = tuple(
+                a if isinstance(a, FrozenAttachment) else FrozenAttachment.from_attachment(a)
+                for a in msg.attachments
+            )
+
+    def __len__(self) -> int:
+        return len(self.message_ids)
+
+    def __getitem__(self, index: int) -> FrozenMessage:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("DayBatch index out of range")
+        return FrozenMessage(
+            message_id=self.message_ids[index],
+            timestamp=datetime.fromtimestamp(
+                self.timestamps[index], _timezone(self.utc_offsets[index])
+            ),
+            text=self.text(index),
+            source_chat=self.chat_ids[index],
+            attachments=self._attachments.get(index, NO_ATTACHMENTS),
+        )
+
+    def __iter__(self) -> Iterator[FrozenMessage]:
+        return (self[i] for i in range(len(self)))
+
+    def text(self, index: int) -> str:
+        """index 番目の本文だけを取り出す（FrozenMessage を組み立てない）。"""
+        start = self._text_ends[index - 1] if index > 0 else 0
+        return self._text[start:self._text_ends[index]].decode("utf-8")
+
+    def to_messages(self) -> list[Message]:
+        return [m.to_message() for m in self]
+
+    def nbytes(self) -> int:
+        """列バッファが占めるバイト数（添付を除く）。"""
+        columns = (
+            self.message_ids, self.chat_ids, self.timestamps, self.utc_offsets, self._text_ends
+        )
+        return sum(len(c) * c.itemsize for c in columns) + len(self._text)
+
+
+_TIMEZONES: dict[int, timezone] = {}
+
+
+def _timezone(offset_seconds: int) -> timezone:
+    """同じ UTC オフセットの timezone を使い回す。"""
+    tz = _TIMEZONES.get(offset_seconds)
+    if tz is None:
+        tz = _TIMEZONES[offset_seconds] = timezone(timedelta(seconds=offset_seconds))
+    return tz
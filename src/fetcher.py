@@ -1,35 +1,119 @@
+import time
+
 import httpx
 
+from src.http_client import request_timeout
+from src.metrics import FETCH_LATENCY
 from src.models import Message
 from src.normalizer import normalize
+from src.profiler import span
+
+API_BASE = "https://api.telegram.org"
+_HTTP_TIMEOUT = 30.0
 
 
 class FetchError(Exception):
     pass
 
 
-def fetch(bot_token: str, chat_id: int, offset: int) -> tuple[list[Message], int]:
-    """Telegram getUpdates API を呼び出し、chat_id に一致するメッセージと次回 offset を返す。"""
-    url = f"https://api.telegram.org/bot{bot_token}/getUpdates"
+def fetch(
+    bot_token: str,
+    chat_id: int,
+    offset: int,
+    *,
+    timeout: int = 0,
+    limit: int | None = None,
+    api_base: str = API_BASE,
+    client: httpx.Client | None = None,
+) -> tuple[list[Message], int]:
+    """Telegram getUpdates API を呼び出し、chat_id に一致するメッセージと次回 offset を返す。
+
+    timeout > 0 の場合はロングポーリングとなり、更新が届くまで最大 timeout 秒
+    サーバ側で接続が保持される（更新が届いた時点で即座に返る）。
+    limit を指定すると1回に取得する更新数を制限する（Bot API の上限は 100）。
+    client を渡すとその接続プールを再利用する。省略時はリクエストごとに接続する。
+    """
+    url = f"{api_base}/bot{bot_token}/getUpdates"
+    params = {"offset": offset}
+    if timeout > 0:
+        params["timeout"] = timeout
+    if limit is not None:
+        params["limit"] = limit
     try:
-        response = httpx.get(url, params={"offset": offset}, timeout=30.0)
-        response.raise_for_status()
-        data = response.json()
+        with span("fetch") as current:
+            started = time.perf_counter()
+            if client is not None:
+                response = client.get(
+                    url, params=params, timeout=request_timeout(client, timeout)
+                )
+            else:
+                response = httpx.get(url, params=params, timeout=_HTTP_TIMEOUT + timeout)
+            FETCH_LATENCY.observe(time.perf_counter() - started)
+            response.raise_for_status()
+            current.bytes = len(response.content)
+            data = response.json()
     except httpx.HTTPError as exc:
         raise FetchError(str(exc)) from exc
 
+    return _parse_updates(data, chat_id, offset)
+
+
+async def fetch_async(
+    bot_token: str,
+    chat_id: int,
+    offset: int,
+    *,
+    client: httpx.AsyncClient,
+    timeout: int = 0,
+    limit: int | None = None,
+    api_base: str = API_BASE,
+) -> tuple[list[Message], int]:
+    """fetch の非同期版。AsyncClient の接続プールを使って getUpdates を呼び出す。"""
+    url = f"{api_base}/bot{bot_token}/getUpdates"
+    params = {"offset": offset}
+    if timeout > 0:
+        params["timeout"] = timeout
+    if limit is not None:
+        params["limit"] = limit
+    try:
+        with span("fetch") as current:
+            started = time.perf_counter()
+            response = await client.get(
+                url, params=params, timeout=request_timeout(client, timeout)
+            )
+            FETCH_LATENCY.observe(time.perf_counter() - started)
+            response.raise_for_status()
+            current.bytes = len(response.content)
+            data = response.json()
+    except httpx.HTTPError as exc:
+        raise FetchError(str(exc)) from exc
+
+    return _parse_updates(data, chat_id, offset)
+
+
+def _parse_updates(data: dict, chat_id: int, offset: int) -> tuple[list[Message], int]:
+    """getUpdates のレスポンスから chat_id のメッセージと次回 offset を取り出す。"""
     if not data.get("ok"):
         raise FetchError(data.get("description", "API returned ok=false"))
+    return parse_updates(data["result"], chat_id, offset)
+
+
+def parse_updates(updates: list[dict], chat_id: int, offset: int) -> tuple[list[Message], int]:
+    """Update のリストを正規化し、chat_id のメッセージと次回 offset を返す。
 
+    getUpdates のレスポンスと webhook で受け取った Update の両方で使う。
+    """
     messages = []
     max_update_id = 0
-    for update in data["result"]:
-        update_id = update.get("update_id", 0)
-        if update_id > max_update_id:
-            max_update_id = update_id
-        msg = normalize(update)
-        if msg is not None and msg.source_chat == chat_id:
-            messages.append(msg)
+    with span("normalize") as current:
+        for update in updates:
+            update_id = update.get("update_id", 0)
+            if update_id > max_update_id:
+                max_update_id = update_id
+            msg = normalize(update)
+            if msg is not None and msg.source_chat == chat_id:
+                messages.append(msg)
+        current.messages = len(messages)
 
     next_offset = max_update_id + 1 if max_update_id > 0 else offset
     return messages, next_offset
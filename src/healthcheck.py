@@ -13,7 +13,11 @@ class HealthResult(TypedDict):
     last_update_id: int | None
 
 
-def check(bot_token: str, state_file: Path = Path("state.json")) -> HealthResult:
+def check(
+    bot_token: str,
+    state_file: Path = Path("state.json"),
+    client: httpx.Client | None = None,
+) -> HealthResult:
     """システムの健全性を確認し、結果を dict で返す。
 
     Keys:
@@ -22,6 +26,8 @@ def check(bot_token: str, state_file: Path = Path("state.json")) -> HealthResult
         ok (bool): すべて正常か
         bot_username (str | None): Bot のユーザー名（API 正常時）
         last_update_id (int | None): 最後の update_id（state 正常時）
+
+    client を渡すとその接続プールを再利用する。
     """
     result: HealthResult = {"api": False, "state": False, "ok": False,
                             "bot_username": None, "last_update_id": None}
@@ -29,7 +35,8 @@ def check(bot_token: str, state_file: Path = Path("state.json")) -> HealthResult
     # --- Telegram API 疎通確認 ---
     try:
         url = f"https://api.telegram.org/bot{bot_token}/getMe"
-        resp = httpx.get(url, timeout=10.0)
+        http = client if client is not None else httpx
+        resp = http.get(url, timeout=10.0)
         resp.raise_for_status()
         data = resp.json()
         if data.get("ok"):
@@ -0,0 +1,118 @@
+import os
+from dataclasses import dataclass
+
+import httpx
+
+_DEFAULT_MAX_CONNECTIONS = 4
+_DEFAULT_MAX_KEEPALIVE = 2
+# ポーリング間隔（POLL_INTERVAL_SECONDS、既定 300 秒）より長くし、待機中に切れないようにする
+_DEFAULT_KEEPALIVE_EXPIRY = 360.0
+_KEEPALIVE_MARGIN = 60.0  # ポーリング間隔に足す余裕（秒）
+_DEFAULT_CONNECT_TIMEOUT = 10.0
+_DEFAULT_READ_TIMEOUT = 30.0
+
+
+@dataclass
+class ConnectionStats:
+    requests: int = 0
+    connections: int = 0
+
+    @property
+    def reused(self) -> int:
+        """既存の keep-alive 接続で処理されたリクエスト数。"""
+        return self.requests - self.connections
+
+
+class HttpClient(httpx.Client):
+    """keep-alive で接続を使い回す長寿命クライアント。接続の新規確立/再利用を記録する。"""
+
+    def __init__(
+        self,
+        *,
+        http2: bool = False,
+        max_connections: int = _DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = _DEFAULT_MAX_KEEPALIVE,
+        keepalive_expiry: float = _DEFAULT_KEEPALIVE_EXPIRY,
+        connect_timeout: float = _DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = _DEFAULT_READ_TIMEOUT,
+    ):
+        self.stats = ConnectionStats()
+        super().__init__(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            event_hooks={"request": [self._on_request]},
+        )
+
+    def _on_request(self, request: httpx.Request) -> None:
+        self.stats.requests += 1
+        request.extensions["trace"] = self._on_trace
+
+    def _on_trace(self, event_name: str, info: dict) -> None:
+        # TCP 接続の確立は新規接続時のみ発生する（再利用時は呼ばれない）
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.connections += 1
+
+
+def _settings_from_env() -> dict:
+    """環境変数から HttpClient のコンストラクタ引数を組み立てる。
+
+    HTTP_KEEPALIVE_EXPIRY が未指定なら、POLL_INTERVAL_SECONDS に余裕を足した値
+    （既定値より短くはしない）にして、ポーリングの待機をまたいで接続を使い回す。
+    """
+    keepalive_expiry = _DEFAULT_KEEPALIVE_EXPIRY
+    if "POLL_INTERVAL_SECONDS" in os.environ:
+        keepalive_expiry = max(
+            keepalive_expiry, float(os.environ["POLL_INTERVAL_SECONDS"]) + _KEEPALIVE_MARGIN
+        )
+    return {
+        "http2": os.environ.get("HTTP2", "0") == "1",
+        "max_connections": int(
+            os.environ.get("HTTP_MAX_CONNECTIONS", str(_DEFAULT_MAX_CONNECTIONS))
+        ),
+        "max_keepalive_connections": int(
+            os.environ.get("HTTP_MAX_KEEPALIVE", str(_DEFAULT_MAX_KEEPALIVE))
+        ),
+        "keepalive_expiry": float(
+            os.environ.get("HTTP_KEEPALIVE_EXPIRY", str(keepalive_expiry))
+        ),
+        "connect_timeout": float(
+            os.environ.get("HTTP_CONNECT_TIMEOUT", str(_DEFAULT_CONNECT_TIMEOUT))
+        ),
+        "read_timeout": float(
+            os.environ.get("HTTP_READ_TIMEOUT", str(_DEFAULT_READ_TIMEOUT))
+        ),
+    }
+
+
+def create_client() -> HttpClient:
+    """環境変数の設定から HttpClient を生成する。
+
+    HTTP2=1 で HTTP/2 を有効化する（`httpx[http2]` のインストールが必要）。
+    """
+    return HttpClient(**_settings_from_env())
+
+
+def create_async_client() -> httpx.AsyncClient:
+    """create_client と同じ設定で非同期エンジン用の AsyncClient を生成する。"""
+    settings = _settings_from_env()
+    return httpx.AsyncClient(
+        http2=settings["http2"],
+        limits=httpx.Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_keepalive_connections"],
+            keepalive_expiry=settings["keepalive_expiry"],
+        ),
+        timeout=httpx.Timeout(settings["read_timeout"], connect=settings["connect_timeout"]),
+    )
+
+
+def request_timeout(client: httpx.Client | httpx.AsyncClient, hold: int) -> httpx.Timeout:
+    """ロングポーリングの保持時間 hold 秒だけ読み取りタイムアウトを延長した Timeout を返す。"""
+    base = client.timeout
+    read = None if base.read is None else base.read + hold
+    return httpx.Timeout(connect=base.connect, read=read, write=base.write, pool=base.pool)
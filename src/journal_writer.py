@@ -1,8 +1,22 @@
+import hashlib
+import json
 import logging
+import os
+from collections.abc import Callable
+from dataclasses import dataclass
 from pathlib import Path
 
 from src.dedup import dedup_by_id
+from src.media_store import MediaStore
+from src.metrics import BYTES_WRITTEN
 from src.models import Attachment, DailySummary, Message
+from src.profiler import span
+from src.summarizer import summarize, summary_size
+from src.tagger import Tagger
+from src.wal import WriteGroup
+
+# 描画結果が変わる変更（テンプレート・書式）を入れたら上げる。--rebuild が全日付を描き直す
+RENDERER_VERSION = 3
 
 _MEDIA_LABELS = {
     "photo": "画像",
@@ -13,11 +27,50 @@ _MEDIA_LABELS = {
 }
 
 
+@dataclass
+class WriteStats:
+    written: int = 0
+    skipped: int = 0
+    bytes: int = 0  # 書き出した Markdown のバイト数（差分描画では書き足した分）
+
+
 class JournalWriter:
-    def __init__(self, daily_dir: Path = Path("daily")):
+    def __init__(
+        self,
+        daily_dir: Path = Path("daily"),
+        tagger: Tagger | None = None,
+        media: MediaStore | None = None,
+    ):
         self.daily_dir = daily_dir
+        self.tagger = tagger if tagger is not None else Tagger()
+        # media が渡されると、ダウンロード済みの添付をプレースホルダではなくリンクで描く
+        self.media = media
+        self.stats = WriteStats()
+
+    def write(
+        self,
+        summary: DailySummary,
+        logger: logging.Logger | None = None,
+        new_messages: list[Message] | None = None,
+        group: WriteGroup | None = None,
+        ordered: bool = False,
+    ) -> Path:
+        """日次 Markdown を書き出す。
 
-    def write(self, summary: DailySummary, logger: logging.Logger | None = None) -> Path:
+        new_messages（今回追加されたメッセージ）が渡され、いずれも描画済みの末尾より後ろに
+        並ぶ新規メッセージで要約も変わらなければ、タイムライン末尾以降（タイムライン行と
+        タグ節）の書き直しだけで済ませる。
+        要約は summary.summary があればそれを、なければ summarizer で本文から作る。
+        ただし new_messages が渡された場合（ポーリング）は、要約の件数が変わらない間は
+        前回描画した要約をそのまま使う（件数はメッセージ数で決まるため、最初の描画で要約が
+        なかった日も件数が増える時点で作り直す）。それ以外で作り直すのは --generate-daily・
+        再構築など new_messages なしで描くときだけにする。
+        編集・順序の前後するメッセージが含まれる場合は全体を描画し直す。
+        描画結果のハッシュが前回書き出した内容と同じならファイルには書かない。
+        group が渡された場合は書き込みをグループに積み、WriteAheadLog.commit で反映する。
+        ordered=True は summary.messages がすでに時刻順・message_id 重複なし
+        （merge_messages・MessageStore.load の結果）であることを示し、並べ直しを省く。
+        """
         self.daily_dir.mkdir(parents=True, exist_ok=True)
         path = self.daily_dir / f"{summary.date}.md"
         done_marker = path.with_suffix(".md.done")
@@ -27,38 +80,258 @@ class JournalWriter:
                     f"{summary.date}: LLM処理済みのためスキップ（遅延メッセージは反映されません）"
                 )
             return path
-        path.write_text(self._render(summary), encoding="utf-8")
+        messages = summary.messages if ordered else self._timeline(summary)
+        previous = None
+        if new_messages is not None and not summary.summary:
+            rendered = _load_rendered(path) or {}
+            if rendered.get("summary_size") == summary_size(len(messages)):
+                previous = rendered.get("summary")
+        bullets = previous if previous is not None else self._summarize(summary, messages)
+        if new_messages is not None and self._append(path, new_messages, bullets, group):
+            self.stats.written += 1
+            return path
+        timeline, tags = self._render_parts(summary, messages, bullets)
+        content = timeline + _render_tags(tags)
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        rendered = _load_rendered(path)
+        if rendered is not None and rendered.get("sha256") == digest:
+            self.stats.skipped += 1
+            return path
+        size = len(content.encode("utf-8"))
+        self.stats.bytes += size
+        BYTES_WRITTEN.inc(size, kind="daily")
+        if group is not None:
+            group.write(path, content)
+        else:
+            path.write_text(content, encoding="utf-8")
+        self._save_rendered(
+            path,
+            messages,
+            size,
+            timeline_end=len(timeline.encode("utf-8")),
+            bullets=bullets,
+            summary_size=summary_size(len(messages)),
+            tags=tags,
+            sha256=digest,
+            group=group,
+        )
+        self.stats.written += 1
         return path
 
-    def _render(self, summary: DailySummary) -> str:
-        """DailySummary を Markdown 文字列に変換する。"""
+    def lags_behind(self, date_str: str, messages: list[Message]) -> bool:
+        """messages（保存済みの1日分）に描画済みの最大 message_id より新しいものがあるか。
+
+        日記ファイル自体がなければ遅れているとみなす。描画後に書き換えられたファイル
+        （LLM 要約など）もサイドカーの max_id で判定する。
+        """
+        if not messages:
+            return False
+        path = self.daily_dir / f"{date_str}.md"
+        if not path.exists():
+            return True
+        try:
+            rendered = json.loads(_rendered_path(path).read_text())
+        except (OSError, json.JSONDecodeError):
+            return False  # サイドカー導入前の日記
+        return max(m.message_id for m in messages) > rendered.get("max_id", 0)
+
+    def _timeline(self, summary: DailySummary) -> list[Message]:
+        """タイムラインに並べるメッセージ（message_id 重複排除・時刻順）を返す。"""
         messages = dedup_by_id(summary.messages)
-        messages = sorted(messages, key=lambda m: m.timestamp)
+        return sorted(messages, key=lambda m: m.timestamp)
+
+    def _summarize(self, summary: DailySummary, messages: list[Message]) -> list[str]:
+        if summary.summary:
+            return summary.summary
+        with span("summarize") as current:
+            current.messages = len(messages)
+            return summarize(messages)
 
+    def _render_parts(
+        self, summary: DailySummary, messages: list[Message], bullets: list[str]
+    ) -> tuple[str, list[str]]:
+        """タイムライン末尾までの Markdown と、タグ節に並べるタグを返す。"""
         lines: list[str] = []
 
         lines += [f"# {summary.date} 日記", ""]
 
+        if bullets:
+            lines += ["## 要約", ""]
+            lines += [f"- {bullet}" for bullet in bullets]
+            lines.append("")
+
         lines += ["## タイムライン", ""]
         for msg in messages:
-            lines.append(f"- {_format_message(msg)}")
+            lines.append(f"- {_format_message(msg, self._media_link)}")
         lines.append("")
 
-        return "\n".join(lines)
+        return "\n".join(lines), self.tagger.tag(messages)
+
+    def _media_link(self, att: Attachment) -> str | None:
+        """ダウンロード済みの添付への daily/ からの相対パス。未保存なら None。"""
+        if self.media is None:
+            return None
+        path = self.media.get(att)
+        if path is None:
+            return None
+        return Path(os.path.relpath(path, self.daily_dir)).as_posix()
+
+    # ----------------------------------------------------------------------
+    # 差分描画
+    # ----------------------------------------------------------------------
+
+    def _append(
+        self,
+        path: Path,
+        new_messages: list[Message],
+        bullets: list[str],
+        group: WriteGroup | None = None,
+    ) -> bool:
+        """タイムライン末尾以降の書き直しだけで全体描画と同じ結果になる場合にそうする。
+
+        サイドカー（YYYY-MM-DD.md.rendered）に記録した描画済みの最大 message_id・
+        最終 timestamp・ファイルサイズと照合し、条件を満たさなければ何もせず False を返す。
+        Telegram の message_id はチャット内で単調増加するため、最大 ID 以下は編集とみなす。
+        新しい行はタイムライン末尾（サイドカーの timeline_end）に書き、その後ろのタグ節は
+        記録済みのタグに新しいメッセージのタグを足して描き直す。
+        要約（bullets）が描画済みのものと変わる場合はタイムラインの位置がずれるため行わない。
+        """
+        rendered = _load_rendered(path)
+        if rendered is None or not new_messages or "timeline_end" not in rendered:
+            return False
+        if bullets != rendered.get("summary", []):
+            return False
+        ids = [m.message_id for m in new_messages]
+        if len(set(ids)) != len(ids) or min(ids) <= rendered["max_id"]:
+            return False
+        new_messages = sorted(new_messages, key=lambda m: m.timestamp)
+        if new_messages[0].timestamp.timestamp() < rendered["last_ts"]:
+            return False
+        lines = "".join(f"- {_format_message(m, self._media_link)}\n" for m in new_messages)
+        # 新しいメッセージは時刻順で末尾に並ぶため、タグの出現順は既存タグの後ろに足すだけでよい
+        tags = list(rendered["tags"])
+        tags += [t for t in self.tagger.tag(new_messages) if t not in tags]
+        offset = rendered["timeline_end"]
+        data = lines + _render_tags(tags)
+        added = len(data.encode("utf-8"))
+        self.stats.bytes += added
+        BYTES_WRITTEN.inc(added, kind="daily")
+        if group is not None:
+            group.append(path, data, offset=offset)
+        else:
+            with path.open("r+b") as f:
+                f.seek(offset)
+                f.truncate()
+                f.write(data.encode("utf-8"))
+        self._save_rendered(
+            path,
+            new_messages,
+            offset + added,
+            max_id=rendered["max_id"],
+            timeline_end=offset + len(lines.encode("utf-8")),
+            bullets=bullets,
+            summary_size=rendered.get("summary_size"),
+            tags=tags,
+            group=group,
+        )
+        return True
 
+    def _save_rendered(
+        self,
+        path: Path,
+        messages: list[Message],
+        size: int,
+        max_id: int = 0,
+        timeline_end: int = 0,
+        bullets: list[str] | None = None,
+        summary_size: int | None = None,
+        tags: list[str] | None = None,
+        sha256: str | None = None,
+        group: WriteGroup | None = None,
+    ) -> None:
+        """描画済み状態をサイドカーに記録する。messages は時刻順、size は書き込み後のサイズ。
 
-def _format_message(msg: Message) -> str:
-    """メッセージを「HH:MM テキスト [添付]」形式の文字列に変換する。"""
+        timeline_end はタイムライン最終行の直後のバイト位置、bullets は要約の箇条書き、
+        summary_size は要約を作ったときのメッセージ数での件数、tags はタグ節に並べたタグ。
+
+        追記時はファイル全体のハッシュを計算しないため sha256 は None になる。
+        """
+        sidecar = _rendered_path(path)
+        data = {
+            "max_id": max([max_id, *(m.message_id for m in messages)]),
+            "last_ts": messages[-1].timestamp.timestamp() if messages else 0.0,
+            "size": size,
+            "timeline_end": timeline_end,
+            "summary": bullets or [],
+            "summary_size": summary_size,
+            "tags": tags or [],
+            "sha256": sha256,
+        }
+        if group is not None:
+            group.write(sidecar, json.dumps(data))
+            return
+        tmp = sidecar.with_name(sidecar.name + ".tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, sidecar)
+
+
+def _rendered_path(path: Path) -> Path:
+    return path.with_suffix(".md.rendered")
+
+
+def _load_rendered(path: Path) -> dict | None:
+    """サイドカーを読み込む。Markdown が描画後に書き換えられていれば None。"""
+    sidecar = _rendered_path(path)
+    if not path.exists() or not sidecar.exists():
+        return None
+    try:
+        data = json.loads(sidecar.read_text())
+    except json.JSONDecodeError:
+        return None
+    if data.get("size") != path.stat().st_size:
+        return None
+    return data
+
+
+def render_timeline(date_str: str, messages: list[Message]) -> str:
+    """見出しとタイムラインだけの Markdown（要約・タグを除いた LLM への入力）。"""
+    lines = [f"# {date_str} 日記", "", "## タイムライン", ""]
+    lines += [f"- {_format_message(msg)}" for msg in messages]
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _render_tags(tags: list[str]) -> str:
+    """タイムラインの後ろに続けるタグ節。タグがなければ空文字列。"""
+    if not tags:
+        return ""
+    return "\n## タグ\n\n" + "".join(f"- {tag}\n" for tag in tags)
+
+
+def _format_message(
+    msg: Message, media_link: Callable[[Attachment], str | None] | None = None
+) -> str:
+    """メッセージを「HH:MM テキスト [添付]」形式の文字列に変換する。
+
+    media_link は添付のリンク先（ダウンロード済みでなければ None）を返す関数。
+    """
     time_str = msg.timestamp.strftime("%H:%M")
     parts = [time_str]
     if msg.text:
         parts.append(msg.text)
     for att in msg.attachments:
-        parts.append(_format_attachment(att))
+        parts.append(_format_attachment(att, media_link(att) if media_link else None))
     return " ".join(parts)
 
 
-def _format_attachment(att: Attachment) -> str:
-    """添付ファイルを「[種別: ファイル名]」形式の文字列に変換する。"""
+def _format_attachment(att: Attachment, link: str | None = None) -> str:
+    """添付ファイルを「[種別: ファイル名]」形式の文字列に変換する。
+
+    link があれば Markdown のリンク（画像は埋め込み）にする。
+    """
     label = _MEDIA_LABELS.get(att.media_type, "ファイル")
-    return f"[{label}: {att.file_name}]"
+    if link is None:
+        return f"[{label}: {att.file_name}]"
+    if att.media_type == "photo":
+        return f"![{label}: {att.file_name}]({link})"
+    return f"[{label}: {att.file_name}]({link})"
@@ -0,0 +1,293 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from src.journal_writer import render_timeline
+from src.message_store import MessageStore
+
+_DEFAULT_TIMEOUT = 300
+_DEFAULT_WORKERS = 4
+_TIMELINE_HEADING = "## タイムライン"
+_TAGS_HEADING = "## タグ"
+
+
+class LlmError(Exception):
+    """LLM コマンドの失敗（終了コード非0・タイムアウト・空出力）。"""
+
+
+@dataclass
+class LlmStats:
+    called: int = 0  # LLM を呼び出した日数
+    cached: int = 0  # キャッシュから再利用した日数
+    written: int = 0  # 日次 Markdown を書き換えた日数
+    failed: list[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+class LlmSummarizer:
+    """タイムラインを LLM_CMD に渡して日記を再構成し、結果をキャッシュする。
+
+    コマンドは `command + [prompt_flag, プロンプト]` で起動し、タイムラインを stdin に、
+    結果を stdout から受け取る（scripts/summarize.sh と同じ呼び出し方）。
+    結果はコマンド・prompt_flag・プロンプト・タイムラインのハッシュをキーに cache_dir に
+    保存し、いずれも変わらない日は LLM を呼ばずに再利用する。
+
+    token_budget を指定すると、プロンプトとタイムラインの合計がそれを超える日は
+    map-reduce で要約する: タイムラインを予算内のチャンクに分けて map_prompt で
+    並行に要約し（チャンクごとにキャッシュ）、チャンク要約を reduce_prompt でまとめて
+    Summary とタグを作る。チャンク要約を並べても予算を超える場合は、予算内に収まる
+    まで隣り合うチャンク要約を map_prompt でまとめ直してから reduce する。
+    タイムラインは LLM を通さず元のまま差し込むため、出力は daily_summary.txt の
+    形式と同じになる。
+
+    LLM コマンドの同時実行数は、日をまたいだ全呼び出し（summarize_range の並行分と
+    map の並行分の合計）で map_workers 個までに抑える。
+    """
+
+    def __init__(
+        self,
+        command: list[str],
+        prompt_path: Path = Path("prompts/daily_summary.txt"),
+        *,
+        prompt_flag: str = "-p",
+        timeout: float = _DEFAULT_TIMEOUT,
+        cache_dir: Path = Path("llm_cache"),
+        token_budget: int | None = None,
+        map_prompt_path: Path = Path("prompts/chunk_summary.txt"),
+        reduce_prompt_path: Path = Path("prompts/daily_reduce.txt"),
+        map_workers: int = _DEFAULT_WORKERS,
+    ):
+        self.command = command
+        self.prompt = prompt_path.read_text(encoding="utf-8")
+        self.prompt_flag = prompt_flag
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        self.token_budget = token_budget
+        self.map_workers = map_workers
+        self._slots = threading.BoundedSemaphore(map_workers)
+        if token_budget is not None:
+            self.map_prompt = map_prompt_path.read_text(encoding="utf-8")
+            self.reduce_prompt = reduce_prompt_path.read_text(encoding="utf-8")
+
+    def summarize(self, timeline: str) -> tuple[str, bool]:
+        """(LLM の出力, キャッシュから返したか) を返す。失敗時は LlmError。"""
+        if (
+            self.token_budget is None
+            or estimate_tokens(self.prompt) + estimate_tokens(timeline) <= self.token_budget
+        ):
+            return self._cached_run(self.prompt, timeline)
+        return self._map_reduce(timeline)
+
+    def _map_reduce(self, timeline: str) -> tuple[str, bool]:
+        assert self.token_budget is not None
+        heading, items = _split_timeline(timeline)
+        chunks = _chunk(items, self._map_budget(heading))
+        inputs = [
+            f"{heading}\n\n{_TIMELINE_HEADING}（{i}/{len(chunks)}）\n\n" + "".join(chunk)
+            for i, chunk in enumerate(chunks, start=1)
+        ]
+        parts, cached = self._run_all(self.map_prompt, inputs)
+        reduce_budget = self.token_budget - estimate_tokens(self.reduce_prompt)
+        while len(parts) > 1 and estimate_tokens(_parts_input(heading, parts)) > reduce_budget:
+            groups = _chunk([f"{p.strip()}\n" for p in parts], self._map_budget(heading))
+            if len(groups) == len(parts):
+                break  # 1つずつでも予算を超える。これ以上まとめられない
+            merged, merged_cached = self._run_all(
+                self.map_prompt, [_parts_input(heading, group) for group in groups]
+            )
+            parts, cached = merged, cached and merged_cached
+        reduced, reduce_cached = self._cached_run(
+            self.reduce_prompt, _parts_input(heading, parts)
+        )
+        output = _insert_timeline(reduced, "".join(items))
+        return output, reduce_cached and cached
+
+    def _map_budget(self, heading: str) -> int:
+        """map_prompt 1回に渡せる本文の概算トークン数。"""
+        assert self.token_budget is not None
+        return self.token_budget - estimate_tokens(self.map_prompt) - estimate_tokens(heading)
+
+    def _run_all(self, prompt: str, inputs: list[str]) -> tuple[list[str], bool]:
+        """inputs をそれぞれ prompt で並行に要約し、(出力の列, すべてキャッシュだったか) を返す。"""
+        with ThreadPoolExecutor(max_workers=self.map_workers) as pool:
+            results = list(pool.map(lambda data: self._cached_run(prompt, data), inputs))
+        return [output for output, _ in results], all(cached for _, cached in results)
+
+    def _cached_run(self, prompt: str, data: str) -> tuple[str, bool]:
+        """コマンド・プロンプト・入力のハッシュで結果をキャッシュしつつ LLM を呼ぶ。"""
+        key = hashlib.sha256(
+            json.dumps([self.command, self.prompt_flag, prompt, data]).encode("utf-8")
+        ).hexdigest()
+        cache_path = self.cache_dir / f"{key}.md"
+        if cache_path.exists():
+            return cache_path.read_text(encoding="utf-8"), True
+        output = self._run(prompt, data)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomic(cache_path, output)
+        return output, False
+
+    def _run(self, prompt: str, data: str) -> str:
+        try:
+            with self._slots:
+                result = subprocess.run(
+                    [*self.command, self.prompt_flag, prompt],
+                    input=data,
+                    capture_output=True,
+                    text=True,
+                    timeout=self.timeout,
+                    check=False,
+                )
+        except subprocess.TimeoutExpired as exc:
+            raise LlmError(f"timed out after {self.timeout}s") from exc
+        except OSError as exc:
+            raise LlmError(str(exc)) from exc
+        if result.returncode != 0:
+            raise LlmError(f"exit status {result.returncode}: {result.stderr.strip()[:200]}")
+        if not result.stdout.strip():
+            raise LlmError("empty output")
+        return result.stdout
+
+
+def estimate_tokens(text: str) -> int:
+    """トークン数の概算（UTF-8 で3バイト ≒ 1トークン。日本語は1文字 ≒ 1トークン）。"""
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def _split_timeline(timeline: str) -> tuple[str, list[str]]:
+    """render_timeline の出力を見出し行とタイムラインの項目（改行込み）に分ける。
+
+    本文に改行を含むメッセージは「- 」で始まらない継続行を持つため、直前の項目に含める。
+    """
+    heading, _, rest = timeline.partition("\n")
+    items: list[str] = []
+    for line in rest.splitlines(keepends=True):
+        if line.startswith("- "):
+            items.append(line)
+        elif items:
+            items[-1] += line
+    if items:
+        items[-1] = items[-1].rstrip("\n") + "\n"
+    return heading, items
+
+
+def _chunk(items: list[str], budget: int) -> list[list[str]]:
+    """項目を順に詰め、概算トークン数が budget を超えないチャンクに分ける。
+
+    1項目だけで budget を超える場合はその項目だけのチャンクにする。
+    """
+    chunks: list[list[str]] = []
+    current: list[str] = []
+    used = 0
+    for item in items:
+        tokens = estimate_tokens(item)
+        if current and used + tokens > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += tokens
+    if current or not chunks:
+        chunks.append(current)
+    return chunks
+
+
+def _parts_input(heading: str, parts: list[str]) -> str:
+    """要約の列を「## パート i/n」の節に並べた reduce 用の入力にする。"""
+    sections = "\n\n".join(
+        f"## パート {i}/{len(parts)}\n\n{part.strip()}" for i, part in enumerate(parts, start=1)
+    )
+    return f"{heading}\n\n{sections}\n"
+
+
+def _insert_timeline(reduced: str, items: str) -> str:
+    """reduce の出力（Summary とタグ）の「## タグ」の前に元のタイムラインを差し込む。"""
+    section = f"{_TIMELINE_HEADING}\n\n{items}\n"
+    before, heading, after = reduced.partition(f"\n{_TAGS_HEADING}")
+    if not heading:
+        return f"{reduced.rstrip()}\n\n{section.rstrip()}\n"
+    return f"{before.rstrip()}\n\n{section}{_TAGS_HEADING}{after}"
+
+
+def summarize_range(
+    dates: list[str],
+    summarizer: LlmSummarizer,
+    messages: MessageStore,
+    daily_dir: Path,
+    logger: logging.Logger,
+    *,
+    workers: int | None = None,
+    notes_dir: Path | None = None,
+) -> LlmStats:
+    """複数の日付を LLM で要約し、daily/YYYY-MM-DD.md を結果で置き換える。
+
+    タイムラインはメッセージストアから組み立てるため、.md.done のある日でも
+    メッセージが増えていれば要約し直す（キャッシュキーが変わる）。
+    LLM の呼び出しは workers 個までのスレッドで並行させ、各呼び出しに timeout を設ける。
+    書き換えた日には .md.done を作り、notes_dir があればそこへコピーする。
+    書き込み・コピーに失敗した日は LLM の失敗と同じく failed に記録して続ける。
+    """
+    stats = LlmStats()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers or _DEFAULT_WORKERS) as pool:
+        futures = {}
+        for date_str in dates:
+            day_messages = messages.load(date_str)
+            if not day_messages:
+                logger.info(f"No messages for {date_str}, skipping LLM summary")
+                continue
+            timeline = render_timeline(date_str, day_messages)
+            futures[pool.submit(summarizer.summarize, timeline)] = date_str
+        for future in as_completed(futures):
+            date_str = futures[future]
+            try:
+                output, cached = future.result()
+            except LlmError as exc:
+                logger.error(f"{date_str}: LLM summary failed: {exc}")
+                stats.failed.append(date_str)
+                continue
+            if cached:
+                stats.cached += 1
+            else:
+                stats.called += 1
+            try:
+                saved = _save_summary(daily_dir / f"{date_str}.md", output, notes_dir)
+            except OSError as exc:
+                logger.error(f"{date_str}: saving LLM summary failed: {exc}")
+                stats.failed.append(date_str)
+                continue
+            if saved:
+                stats.written += 1
+
+    stats.failed.sort()
+    stats.elapsed = time.monotonic() - started
+    logger.info(
+        f"LLM summarized {len(futures)} day(s): called={stats.called}, cached={stats.cached}, "
+        f"written={stats.written}, failed={len(stats.failed)} in {stats.elapsed:.1f}s"
+    )
+    return stats
+
+
+def _save_summary(path: Path, output: str, notes_dir: Path | None) -> bool:
+    """要約結果を書き出して .md.done を作る。内容が同じなら書かずに False を返す。"""
+    done_marker = path.with_suffix(".md.done")
+    if path.exists() and done_marker.exists() and path.read_text(encoding="utf-8") == output:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic(path, output)
+    done_marker.touch()
+    if notes_dir is not None:
+        shutil.copy2(path, notes_dir / path.name)
+    return True
+
+
+def _write_atomic(path: Path, content: str) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(content, encoding="utf-8")
+    os.replace(tmp, path)
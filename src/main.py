@@ -1,100 +1,240 @@
 import argparse
+import asyncio
 import json
 import logging
 import os
+import shlex
+import threading
 import time
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date, datetime
 from pathlib import Path
 from zoneinfo import ZoneInfo
 
+import httpx
 from dotenv import load_dotenv
 
-from src.fetcher import fetch
-from src.journal_writer import JournalWriter
+from src.fetcher import API_BASE, fetch, fetch_async, parse_updates
+from src.http_client import HttpClient, create_async_client, create_client
+from src.journal_writer import RENDERER_VERSION, JournalWriter, WriteStats
+from src.llm_summarizer import LlmSummarizer, summarize_range
 from src.logger import setup_logger
-from src.models import Attachment, DailySummary, Message, State
-from src.retry import with_retry
+from src.media_fetcher import MediaFetcher, MediaStats
+from src.media_store import MediaStore
+from src.message_store import MessageStore, open_message_store
+from src.metrics import (
+    LAST_MESSAGE_TIMESTAMP,
+    LAST_OFFSET,
+    MESSAGES_INGESTED,
+    POLL_DURATION,
+    REGISTRY,
+    RETRIES,
+    Gauge,
+    MetricsServer,
+)
+from src.models import DailySummary, Message, State
+from src.profiler import enable as enable_profile
+from src.profiler import format_summary, span, summarize_trace
+from src.retry import with_retry, with_retry_async
+from src.search_index import SearchIndex
+from src.seen_index import SeenIndex
+from src.sqlite_store import SqliteMessageStore
 from src.state_store import StateStore
+from src.tagger import Tagger, load_rules
+from src.wal import WriteAheadLog, WriteGroup
+from src.webhook import WebhookServer
 
 JST = ZoneInfo("Asia/Tokyo")
 _DEFAULT_INTERVAL = 300  # 5 minutes
+_DEFAULT_POLL_TIMEOUT = 0  # 0 = ロングポーリング無効（短間隔ポーリング）
+_DRAIN_PAGE_SIZE = 100  # getUpdates の limit 上限
+_DEFAULT_QUEUE_SIZE = 2  # 非同期エンジンで書き込み待ちにできるバッチ数
+_DEFAULT_WEBHOOK_PORT = 8443
+_DEFAULT_WEBHOOK_QUEUE_SIZE = 1000
+_WEBHOOK_BATCH_SIZE = 100
+_WEBHOOK_BATCH_WAIT = 1.0  # 秒。最初の Update 到着からこの時間内に届いた分をまとめて書く
+_DEFAULT_SEARCH_LIMIT = 20
+_DEFAULT_LLM_TIMEOUT = 300  # LLM_CMD 1回あたりの上限（秒）
+_DEFAULT_LLM_WORKERS = 4
+_DEFAULT_MEDIA_WORKERS = 4
+_DEFAULT_METRICS_HOST = "127.0.0.1"
+_DEFAULT_PROFILE_PATH = "logs/profile.jsonl"
+_WRITE_RETRY_DELAY = 1.0  # 秒。確認応答済みバッチの書き込み再試行の初回待ち（倍々に延ばす）
+_WRITE_RETRY_MAX_DELAY = 60.0
 
 
 # --------------------------------------------------------------------------
-# シリアライズ
+# メッセージ永続化
 # --------------------------------------------------------------------------
 
 
-def _msg_to_dict(msg: Message) -> dict:
-    """Message を JSON シリアライズ可能な dict に変換する。"""
-    return {
-        "message_id": msg.message_id,
-        "timestamp": msg.timestamp.isoformat(),
-        "text": msg.text,
-        "source_chat": msg.source_chat,
-        "attachments": [
-            {"file_id": a.file_id, "file_name": a.file_name, "media_type": a.media_type}
-            for a in msg.attachments
-        ],
-    }
+def _load_day_messages(date_str: str, messages_dir: Path) -> list[Message]:
+    """messages_dir から date_str のメッセージリストを読み込む。ファイルがなければ空リスト。"""
+    return MessageStore(messages_dir).load(date_str)
 
 
-def _dict_to_msg(d: dict) -> Message:
-    """dict を Message に復元する。"""
-    return Message(
-        message_id=d["message_id"],
-        timestamp=datetime.fromisoformat(d["timestamp"]),
-        text=d["text"],
-        source_chat=d["source_chat"],
-        attachments=[
-            Attachment(
-                file_id=a["file_id"],
-                file_name=a["file_name"],
-                media_type=a["media_type"],
-            )
-            for a in d.get("attachments", [])
-        ],
-    )
+def _save_day_messages(date_str: str, messages: list[Message], messages_dir: Path) -> None:
+    """date_str のメッセージログを messages の内容で置き換える。"""
+    MessageStore(messages_dir).save(date_str, messages)
+
+
+def compact_messages(
+    messages: Path | MessageStore, logger: logging.Logger, date_str: str | None = None
+) -> None:
+    """追記ログを畳む。date_str 省略時は保存済みの全日付が対象。"""
+    message_store = open_message_store(messages)
+    dates = [date_str] if date_str is not None else message_store.dates()
+    for d in dates:
+        message_store.compact(d)
+    logger.info(f"Compacted {len(dates)} day(s)")
 
 
 # --------------------------------------------------------------------------
-# メッセージ永続化
+# ポーリング
 # --------------------------------------------------------------------------
 
 
-def _load_day_messages(date_str: str, messages_dir: Path) -> list[Message]:
-    """messages_dir/date_str.json からメッセージリストを読み込む。ファイルがなければ空リスト。"""
-    path = messages_dir / f"{date_str}.json"
-    if not path.exists():
-        return []
-    return [_dict_to_msg(d) for d in json.loads(path.read_text())]
+def _write_days(
+    new_messages: list[Message],
+    writer: JournalWriter,
+    messages: Path | MessageStore,
+    logger: logging.Logger,
+    group: WriteGroup | None = None,
+) -> WriteStats:
+    """新着メッセージを JST 日付ごとにまとめ、影響を受けた日を1回ずつマージ・保存・描画する。
+
+    内容の変わらないファイルは書き出さず、messages/ と daily/ を合わせた
+    書き込み・スキップ件数を返す。group が渡された場合は書き込みをグループに積む。
+    """
+    message_store = open_message_store(messages)
+    by_date: dict[str, list[Message]] = {}
+    for msg in new_messages:
+        d = msg.timestamp.astimezone(JST).date().isoformat()
+        by_date.setdefault(d, []).append(msg)
 
+    stats = WriteStats()
+    changed_by_date: dict[str, tuple[list[Message], list[Message]]] = {}
+    with message_store.transaction():
+        for date_str, msgs in by_date.items():
+            with span("load") as current:
+                existing = message_store.load(date_str)
+                current.messages = len(existing)
+            with span("save") as current:
+                changed, merged = message_store.append_merged(date_str, msgs, existing, group)
+                current.messages = len(changed)
+            if not changed:
+                if writer.lags_behind(date_str, existing):
+                    # ストアは先にコミット済みで日記だけ書けずに落ちた（SQLite ストア）
+                    changed_by_date[date_str] = (existing, [])
+                    stats.skipped += 1
+                    continue
+                stats.skipped += 2  # messages/ と daily/ のどちらも書かない
+                continue
+            stats.written += 1
+            changed_by_date[date_str] = (merged, changed)
 
-def _save_day_messages(date_str: str, messages: list[Message], messages_dir: Path) -> None:
-    """メッセージリストを messages_dir/date_str.json に保存する。"""
-    messages_dir.mkdir(parents=True, exist_ok=True)
-    path = messages_dir / f"{date_str}.json"
-    path.write_text(
-        json.dumps([_msg_to_dict(m) for m in messages], ensure_ascii=False, indent=2)
-    )
+    for date_str, (merged, changed) in changed_by_date.items():
+        daily = DailySummary(
+            date=date_str,
+            messages=merged,
+        )
+        before, before_bytes = writer.stats.written, writer.stats.bytes
+        with span("render") as current:
+            writer.write(
+                daily, logger, new_messages=changed or None, group=group, ordered=True
+            )
+            current.messages = len(changed)
+            current.bytes = writer.stats.bytes - before_bytes
+        if writer.stats.written != before:
+            stats.written += 1
+        else:
+            stats.skipped += 1
 
+    if by_date:
+        logger.info(f"Files written={stats.written}, skipped={stats.skipped} (unchanged)")
+    return stats
 
-# --------------------------------------------------------------------------
-# マージ
-# --------------------------------------------------------------------------
 
+def _write_batch(
+    new_messages: list[Message],
+    next_offset: int,
+    store: StateStore,
+    writer: JournalWriter,
+    messages: Path | MessageStore,
+    logger: logging.Logger,
+    wal: WriteAheadLog | None = None,
+    seen: SeenIndex | None = None,
+    search: SearchIndex | None = None,
+    media: MediaFetcher | None = None,
+) -> None:
+    """新着メッセージを書き出し、offset を state に保存する。
+
+    wal が渡された場合はメッセージ・日記・state の書き込みを1グループとしてコミットし、
+    途中でクラッシュしても offset とデータが食い違わないようにする。
+    seen が渡された場合は取り込み済みと同一内容のメッセージを日次ファイルを開く前に落とし、
+    書き込みが完了してから索引を更新する。search が渡された場合は全文検索の索引も更新する。
+    media が渡された場合は日記を描く前に添付ファイルをダウンロードし、リンクとして描く
+    （失敗した添付はプレースホルダのまま残り、--fetch-media で取り直せる）。
+    """
+    if seen is not None:
+        with span("dedup") as current:
+            new_messages = seen.unseen(new_messages)
+            current.messages = len(new_messages)
+    if media is not None:
+        with span("media") as current:
+            current.bytes = media.download(new_messages).bytes
+    group = wal.begin() if wal is not None else None
+    _write_days(new_messages, writer, messages, logger, group=group)
+    with span("state"):
+        store.save(State(last_update_id=next_offset, last_run_at=datetime.now(JST)), group=group)
+    if wal is not None:
+        with span("commit"):
+            wal.commit(group)
+    with span("index") as current:
+        if seen is not None:
+            seen.add(new_messages)
+        if search is not None:
+            search.add(new_messages)
+        current.messages = len(new_messages)
+    MESSAGES_INGESTED.inc(len(new_messages))
+    LAST_OFFSET.set(next_offset)
+    if new_messages:
+        latest = max(m.timestamp.timestamp() for m in new_messages)
+        LAST_MESSAGE_TIMESTAMP.set(max(latest, LAST_MESSAGE_TIMESTAMP.value() or 0))
 
-def _merge_messages(existing: list[Message], new: list[Message]) -> list[Message]:
-    """既存と新規を message_id でマージし timestamp 順に返す。編集済みメッセージは上書き。"""
-    by_id: dict[int, Message] = {m.message_id: m for m in existing}
-    for msg in new:
-        by_id[msg.message_id] = msg  # 編集済みメッセージは上書き
-    return sorted(by_id.values(), key=lambda m: m.timestamp)
 
+def _write_batch_until_saved(
+    new_messages: list[Message],
+    next_offset: int,
+    store: StateStore,
+    writer: JournalWriter,
+    messages: Path | MessageStore,
+    logger: logging.Logger,
+    wal: WriteAheadLog | None = None,
+    seen: SeenIndex | None = None,
+    search: SearchIndex | None = None,
+    media: MediaFetcher | None = None,
+    retry_delay: float = _WRITE_RETRY_DELAY,
+) -> None:
+    """Telegram へ確認応答済みのバッチを、保存できるまで指数バックオフで書き直す。
 
-# --------------------------------------------------------------------------
-# ポーリング
-# --------------------------------------------------------------------------
+    確認応答済みの Update は Telegram から取り直せないため、失敗しても捨てずに
+    メモリに持ったまま再試行する（書き込みは同一内容を書かないため繰り返してよい）。
+    """
+    delay = retry_delay
+    while True:
+        try:
+            _write_batch(
+                new_messages, next_offset, store, writer, messages, logger,
+                wal, seen, search, media,
+            )
+            return
+        except Exception as exc:
+            logger.exception(f"Write error, retrying in {delay:.1f}s: {exc}")
+            RETRIES.inc()
+            time.sleep(delay)
+            delay = min(delay * 2, _WRITE_RETRY_MAX_DELAY)
 
 
 def poll_once(
@@ -102,33 +242,94 @@ def poll_once(
     chat_id: int,
     store: StateStore,
     writer: JournalWriter,
-    messages_dir: Path,
+    messages: Path | MessageStore,
     logger: logging.Logger,
+    *,
+    poll_timeout: int = 0,
+    api_base: str = API_BASE,
+    client: HttpClient | None = None,
+    wal: WriteAheadLog | None = None,
+    seen: SeenIndex | None = None,
+    search: SearchIndex | None = None,
+    media: MediaFetcher | None = None,
 ) -> None:
-    state = store.load()
-    new_messages, next_offset = with_retry(lambda: fetch(bot_token, chat_id, state.last_update_id))
-
-    by_date: dict[str, list[Message]] = {}
-    for msg in new_messages:
-        d = msg.timestamp.astimezone(JST).date().isoformat()
-        by_date.setdefault(d, []).append(msg)
+    started = time.perf_counter()
+    with span("poll") as current:
+        state = store.load()
+        new_messages, next_offset = with_retry(
+            lambda: fetch(
+                bot_token, chat_id, state.last_update_id,
+                timeout=poll_timeout, api_base=api_base, client=client,
+            )
+        )
+        current.messages = len(new_messages)
 
-    for date_str, msgs in by_date.items():
-        existing = _load_day_messages(date_str, messages_dir)
-        merged = _merge_messages(existing, msgs)
-        _save_day_messages(date_str, merged, messages_dir)
-        daily = DailySummary(
-            date=date_str,
-            messages=merged,
+        _write_batch(
+            new_messages, next_offset, store, writer, messages, logger,
+            wal, seen, search, media,
         )
-        writer.write(daily, logger)
+    POLL_DURATION.observe(time.perf_counter() - started)
 
     if new_messages:
         logger.info(f"Fetched {len(new_messages)} new message(s)")
     else:
         logger.info("No new messages")
 
-    store.save(State(last_update_id=next_offset, last_run_at=datetime.now(JST)))
+
+def drain_backlog(
+    bot_token: str,
+    chat_id: int,
+    store: StateStore,
+    writer: JournalWriter,
+    messages: Path | MessageStore,
+    logger: logging.Logger,
+    *,
+    api_base: str = API_BASE,
+    client: HttpClient | None = None,
+    wal: WriteAheadLog | None = None,
+    seen: SeenIndex | None = None,
+    search: SearchIndex | None = None,
+    media: MediaFetcher | None = None,
+) -> int:
+    """未取得の更新を getUpdates の limit/offset で空になるまでページングして取り込む。
+
+    全ページを集めてから影響を受けた日を1回ずつ書き出し、すべて保存し終えた後に
+    最終 offset を state に記録する。
+    次のページを要求した時点でそれより前のページは Telegram 側で確認済み（削除対象）に
+    なるため、途中のページが再試行しても失敗した場合は、それまでに集めた分をその offset
+    とともに書き出してから例外を送出する。取り込んだメッセージ数を返す。
+    """
+    offset = store.load().last_update_id
+    collected: list[Message] = []
+    pages = 0
+    while True:
+        try:
+            page, next_offset = with_retry(
+                lambda: fetch(
+                    bot_token, chat_id, offset,
+                    limit=_DRAIN_PAGE_SIZE, api_base=api_base, client=client,
+                )
+            )
+        except Exception:
+            if pages:
+                _write_batch(
+                    collected, offset, store, writer, messages, logger,
+                    wal, seen, search, media,
+                )
+                logger.warning(
+                    f"Drain failed after {pages} page(s); saved {len(collected)} message(s) "
+                    f"up to offset {offset}"
+                )
+            raise
+        if next_offset == offset:
+            break
+        collected.extend(page)
+        offset = next_offset
+        pages += 1
+
+    _write_batch(collected, offset, store, writer, messages, logger, wal, seen, search, media)
+    logger.info(f"Drained {len(collected)} message(s) in {pages} page(s)")
+    return len(collected)
 
 
 def poll_loop(
@@ -136,19 +337,200 @@ def poll_loop(
     chat_id: int,
     store: StateStore,
     writer: JournalWriter,
-    messages_dir: Path,
+    messages: Path | MessageStore,
     logger: logging.Logger,
     interval: int,
+    *,
+    poll_timeout: int = 0,
+    api_base: str = API_BASE,
+    client: HttpClient | None = None,
+    wal: WriteAheadLog | None = None,
+    seen: SeenIndex | None = None,
+    search: SearchIndex | None = None,
+    media: MediaFetcher | None = None,
 ) -> None:
-    logger.info(f"Starting polling loop (interval={interval}s)")
+    """ポーリングを繰り返す。
+
+    poll_timeout > 0 のときはロングポーリングで待機するため、成功時は sleep せず
+    直ちに次の getUpdates を発行する。エラー時のみ interval 秒待機する。
+    client を渡した場合は新しい接続が確立されたときだけ接続統計をログに出す。
+    """
+    if poll_timeout > 0:
+        logger.info(f"Starting long polling loop (timeout={poll_timeout}s)")
+    else:
+        logger.info(f"Starting polling loop (interval={interval}s)")
+    connections = 0
     while True:
         try:
-            poll_once(bot_token, chat_id, store, writer, messages_dir, logger)
+            poll_once(
+                bot_token, chat_id, store, writer, messages, logger,
+                poll_timeout=poll_timeout, api_base=api_base, client=client,
+                wal=wal, seen=seen, search=search, media=media,
+            )
         except Exception as exc:
             logger.exception(f"Poll error: {exc}")
+        else:
+            if poll_timeout > 0:
+                continue
+        finally:
+            if client is not None and client.stats.connections != connections:
+                connections = client.stats.connections
+                logger.info(
+                    f"HTTP connection opened (requests={client.stats.requests}, "
+                    f"connections={connections}, reused={client.stats.reused})"
+                )
         time.sleep(interval)
 
 
+# --------------------------------------------------------------------------
+# 非同期取り込み
+# --------------------------------------------------------------------------
+
+
+async def ingest_async(
+    bot_token: str,
+    chat_id: int,
+    store: StateStore,
+    writer: JournalWriter,
+    messages: Path | MessageStore,
+    logger: logging.Logger,
+    interval: int,
+    *,
+    client: httpx.AsyncClient,
+    poll_timeout: int = 0,
+    api_base: str = API_BASE,
+    queue_size: int = _DEFAULT_QUEUE_SIZE,
+    stop: asyncio.Event | None = None,
+    wal: WriteAheadLog | None = None,
+    seen: SeenIndex | None = None,
+    search: SearchIndex | None = None,
+    media: MediaFetcher | None = None,
+    retry_delay: float = _WRITE_RETRY_DELAY,
+) -> None:
+    """取得とディスク書き込みを重ねて実行する非同期の取り込みエンジン。
+
+    取得側は書き込みの完了を待たずに次の getUpdates を発行し、結果を上限付きキューへ
+    積む（キューが満杯なら取得側が待たされる）。書き込み側はファイル I/O をスレッドへ
+    逃がし、バッチの保存が終わるたびに offset を state に記録する。
+    次の getUpdates が前バッチの確認応答を兼ねるため、書き込みに失敗したバッチは
+    捨てずに保存できるまで retry_delay からの指数バックオフで書き直す（その間、取得側は
+    満杯のキューで待たされる）。
+    stop がセットされると、キューに残ったバッチを書き終えてから終了する。
+    """
+    stop = stop or asyncio.Event()
+    queue: asyncio.Queue[tuple[list[Message], int] | None] = asyncio.Queue(maxsize=queue_size)
+
+    async def produce() -> None:
+        offset = (await asyncio.to_thread(store.load)).last_update_id
+        while not stop.is_set():
+            try:
+                batch = await with_retry_async(
+                    lambda: fetch_async(
+                        bot_token, chat_id, offset,
+                        client=client, timeout=poll_timeout, api_base=api_base,
+                    )
+                )
+            except Exception as exc:
+                logger.exception(f"Poll error: {exc}")
+                await asyncio.sleep(interval)
+                continue
+            await queue.put(batch)
+            offset = batch[1]
+            if poll_timeout == 0 and not batch[0]:
+                await asyncio.sleep(interval)
+        await queue.put(None)
+
+    async def consume() -> None:
+        while (batch := await queue.get()) is not None:
+            new_messages, next_offset = batch
+            await asyncio.to_thread(
+                _write_batch_until_saved,
+                new_messages, next_offset, store, writer, messages, logger,
+                wal, seen, search, media, retry_delay,
+            )
+            if new_messages:
+                logger.info(f"Fetched {len(new_messages)} new message(s)")
+
+    async with asyncio.TaskGroup() as group:
+        group.create_task(produce())
+        group.create_task(consume())
+
+
+async def _run_async_engine(
+    bot_token: str,
+    chat_id: int,
+    store: StateStore,
+    writer: JournalWriter,
+    messages: Path | MessageStore,
+    logger: logging.Logger,
+    interval: int,
+    *,
+    poll_timeout: int,
+    api_base: str,
+    wal: WriteAheadLog | None = None,
+    seen: SeenIndex | None = None,
+    search: SearchIndex | None = None,
+    media: MediaFetcher | None = None,
+) -> None:
+    logger.info(f"Starting async ingestion engine (timeout={poll_timeout}s)")
+    async with create_async_client() as client:
+        await ingest_async(
+            bot_token, chat_id, store, writer, messages, logger, interval,
+            client=client, poll_timeout=poll_timeout, api_base=api_base,
+            wal=wal, seen=seen, search=search, media=media,
+        )
+
+
+# --------------------------------------------------------------------------
+# Webhook
+# --------------------------------------------------------------------------
+
+
+def serve_webhook(
+    chat_id: int,
+    store: StateStore,
+    writer: JournalWriter,
+    messages: Path | MessageStore,
+    logger: logging.Logger,
+    server: WebhookServer,
+    *,
+    batch_size: int = _WEBHOOK_BATCH_SIZE,
+    batch_wait: float = _WEBHOOK_BATCH_WAIT,
+    stop: threading.Event | None = None,
+    wal: WriteAheadLog | None = None,
+    seen: SeenIndex | None = None,
+    search: SearchIndex | None = None,
+    media: MediaFetcher | None = None,
+    retry_delay: float = _WRITE_RETRY_DELAY,
+) -> None:
+    """webhook サーバで受け取った Update をバッチ単位で poll_once と同じ書き込み経路へ流す。
+
+    state には受け取った最大 update_id + 1 を記録する（getUpdates へ戻す場合の offset）。
+    Update は受信時に 200 を返して確認応答済みのため、書き込みに失敗したバッチは
+    サーバを止めずに保存できるまで書き直す。
+    stop がセットされるとキューに残った分を書き終えてから終了する。
+    """
+    stop = stop or threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    logger.info(f"Starting webhook server on {server.server_address[0]}:{server.server_port}")
+    try:
+        while not stop.is_set() or not server.updates.empty():
+            updates = server.next_batch(batch_size, batch_wait)
+            if not updates:
+                continue
+            offset = store.load().last_update_id
+            new_messages, next_offset = parse_updates(updates, chat_id, offset)
+            _write_batch_until_saved(
+                new_messages, max(offset, next_offset), store, writer, messages, logger,
+                wal, seen, search, media, retry_delay,
+            )
+            logger.info(f"Received {len(updates)} update(s), {len(new_messages)} new message(s)")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
 # --------------------------------------------------------------------------
 # 日次確定
 # --------------------------------------------------------------------------
@@ -157,19 +539,205 @@ def poll_loop(
 def generate_daily(
     date_str: str,
     writer: JournalWriter,
-    messages_dir: Path,
+    messages: Path | MessageStore,
     logger: logging.Logger,
-) -> None:
-    messages = _load_day_messages(date_str, messages_dir)
-    if not messages:
+) -> str:
+    """date_str の日次 Markdown を書き出し、結果（written / skipped / empty）を返す。
+
+    .md.done がある日と内容の変わらない日は skipped になる。
+    """
+    with span("load") as current:
+        day_messages = open_message_store(messages).load(date_str)
+        current.messages = len(day_messages)
+    if not day_messages:
         logger.info(f"No messages for {date_str}")
-        return
+        return "empty"
     daily = DailySummary(
         date=date_str,
-        messages=messages,
+        messages=day_messages,
     )
-    path = writer.write(daily, logger)
+    before, before_bytes = writer.stats.written, writer.stats.bytes
+    with span("render") as current:
+        path = writer.write(daily, logger, ordered=True)
+        current.messages = len(day_messages)
+        current.bytes = writer.stats.bytes - before_bytes
+    if writer.stats.written == before:
+        return "skipped"
     logger.info(f"Generated {path}")
+    return "written"
+
+
+@dataclass
+class GenerateStats:
+    written: int = 0
+    skipped: int = 0
+    failed: list[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+# プロセスプールの各ワーカーが1つずつ開くライタとストア（_init_generate_worker で設定）
+_worker: tuple[JournalWriter, MessageStore] | None = None
+
+
+def _init_generate_worker(
+    daily_dir: Path,
+    tagger: Tagger,
+    media_dir: Path | None,
+    store_type: type[MessageStore],
+    store_path: Path,
+) -> None:
+    global _worker
+    media = MediaStore(media_dir) if media_dir is not None else None
+    _worker = (JournalWriter(daily_dir, tagger, media), store_type(store_path))
+
+
+def _generate_in_worker(date_str: str) -> tuple[str, str]:
+    """ワーカープロセスで1日分を生成し、(日付, 結果) を返す。例外は呼び出し元へ伝わる。"""
+    assert _worker is not None
+    writer, message_store = _worker
+    return date_str, generate_daily(
+        date_str, writer, message_store, logging.getLogger("telegram_diary")
+    )
+
+
+def generate_range(
+    dates: list[str],
+    writer: JournalWriter,
+    messages: Path | MessageStore,
+    logger: logging.Logger,
+    *,
+    workers: int | None = None,
+) -> GenerateStats:
+    """複数の日付の日次 Markdown をプロセスプールで並列に書き出す。
+
+    各ワーカーは自前のライタとストアを開く（SQLite の接続はプロセス間で共有できないため）。
+    失敗した日付は記録して残りを続行する。workers=1 のときはこのプロセス内で順に処理する。
+    """
+    message_store = open_message_store(messages)
+    if isinstance(message_store, SqliteMessageStore):
+        store_spec = (SqliteMessageStore, message_store.db_path)
+    else:
+        store_spec = (MessageStore, message_store.messages_dir)
+    media_dir = writer.media.media_dir if writer.media is not None else None
+    stats = GenerateStats()
+    started = time.monotonic()
+
+    def record(result: str) -> None:
+        if result == "written":
+            stats.written += 1
+        else:
+            stats.skipped += 1
+
+    if workers == 1:
+        for date_str in dates:
+            try:
+                record(generate_daily(date_str, writer, message_store, logger))
+            except Exception as exc:
+                logger.exception(f"{date_str}: generation failed: {exc}")
+                stats.failed.append(date_str)
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_generate_worker,
+            initargs=(writer.daily_dir, writer.tagger, media_dir, *store_spec),
+        ) as pool:
+            futures = {pool.submit(_generate_in_worker, d): d for d in dates}
+            for future in as_completed(futures):
+                try:
+                    record(future.result()[1])
+                except Exception as exc:
+                    logger.error(f"{futures[future]}: generation failed: {exc}")
+                    stats.failed.append(futures[future])
+
+    stats.failed.sort()
+    stats.elapsed = time.monotonic() - started
+    logger.info(
+        f"Generated {len(dates)} day(s): written={stats.written}, skipped={stats.skipped}, "
+        f"failed={len(stats.failed)} in {stats.elapsed:.1f}s"
+    )
+    return stats
+
+
+def fetch_media(
+    dates: list[str],
+    fetcher: MediaFetcher,
+    writer: JournalWriter,
+    messages: Path | MessageStore,
+    logger: logging.Logger,
+) -> MediaStats:
+    """保存済みの日の添付ファイルをまとめてダウンロードし、添付のある日を描き直す。
+
+    DOWNLOAD_MEDIA を有効にする前に取り込んだ日や、ダウンロードに失敗した日の取り直し用。
+    """
+    message_store = open_message_store(messages)
+    by_date = {d: message_store.load(d) for d in dates}
+    with_media = [d for d, msgs in by_date.items() if any(m.attachments for m in msgs)]
+    stats = fetcher.download([m for d in with_media for m in by_date[d]])
+    for date_str in with_media:
+        generate_daily(date_str, writer, message_store, logger)
+    return stats
+
+
+def _manifest_path(writer: JournalWriter) -> Path:
+    return writer.daily_dir / ".manifest.json"
+
+
+def _load_manifest(path: Path) -> dict:
+    """前回の再構築で記録したマニフェストを読む。ないか壊れていれば空のマニフェスト。"""
+    try:
+        data = json.loads(path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"renderer_version": None, "tagger": None, "days": {}}
+    return {
+        "renderer_version": data.get("renderer_version"),
+        "tagger": data.get("tagger"),
+        "days": data.get("days", {}),
+    }
+
+
+def rebuild_daily(
+    writer: JournalWriter,
+    messages: Path | MessageStore,
+    logger: logging.Logger,
+    *,
+    workers: int | None = None,
+) -> GenerateStats:
+    """入力が変わった日だけ daily/ を再生成する。
+
+    daily/.manifest.json に日ごとの入力ハッシュ（MessageStore.digest）と描画に使った
+    RENDERER_VERSION・タグ語彙のハッシュ（Tagger.digest）を記録し、ハッシュが変わった日・
+    Markdown がない日だけを generate_range に渡す。RENDERER_VERSION かタグ語彙が
+    変わった場合は全日付を描き直す。
+    失敗した日はマニフェストに残さず、次回の再構築で再試行する。
+    """
+    message_store = open_message_store(messages)
+    path = _manifest_path(writer)
+    manifest = _load_manifest(path)
+    renderer_changed = (
+        manifest["renderer_version"] != RENDERER_VERSION
+        or manifest["tagger"] != writer.tagger.digest
+    )
+    inputs = {d: message_store.digest(d) for d in message_store.dates()}
+    stale = [
+        d for d, digest in inputs.items()
+        if renderer_changed
+        or manifest["days"].get(d) != digest
+        or not (writer.daily_dir / f"{d}.md").exists()
+    ]
+    logger.info(f"Rebuild: {len(stale)} of {len(inputs)} day(s) changed")
+    stats = generate_range(stale, writer, message_store, logger, workers=workers)
+
+    failed = set(stats.failed)
+    data = {
+        "renderer_version": RENDERER_VERSION,
+        "tagger": writer.tagger.digest,
+        "days": {d: digest for d, digest in inputs.items() if d not in failed},
+    }
+    writer.daily_dir.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2, sort_keys=True))
+    os.replace(tmp, path)
+    return stats
 
 
 # --------------------------------------------------------------------------
@@ -181,6 +749,160 @@ def _today_jst() -> str:
     return datetime.now(JST).date().isoformat()
 
 
+def _open_messages(logger: logging.Logger) -> MessageStore:
+    """MESSAGE_STORE 環境変数に応じてメッセージストアを開く（jsonl / sqlite）。
+
+    sqlite を初めて使うときは messages/ の既存ログを取り込む。
+    """
+    messages_dir = Path("messages")
+    if os.environ.get("MESSAGE_STORE", "jsonl") != "sqlite":
+        cache_size = os.environ.get("MESSAGE_CACHE_SIZE")
+        if cache_size is None:
+            return MessageStore(messages_dir)
+        return MessageStore(messages_dir, cache_size=int(cache_size))
+    db_path = Path(os.environ.get("MESSAGE_DB", "messages.db"))
+    is_new = not db_path.exists()
+    message_store = SqliteMessageStore(db_path)
+    if is_new:
+        imported = message_store.import_from(MessageStore(messages_dir))
+        logger.info(f"Imported {imported} day(s) from {messages_dir} into {db_path}")
+    return message_store
+
+
+def _open_tagger() -> Tagger:
+    """TAG_RULES（タグ語彙の JSON）が指定されていればその語彙で、なければ既定の語彙で開く。"""
+    rules_path = os.environ.get("TAG_RULES")
+    return Tagger(load_rules(Path(rules_path)) if rules_path else None)
+
+
+def _open_llm_summarizer(workers: int | None = None) -> LlmSummarizer:
+    """LLM_CMD / LLM_PROMPT_FLAG / LLM_TIMEOUT_SECONDS（scripts/summarize.sh と共通）で開く。
+
+    LLM_TOKEN_BUDGET を指定すると、それを超える日はチャンクに分けて map-reduce で要約する。
+    """
+    token_budget = os.environ.get("LLM_TOKEN_BUDGET")
+    return LlmSummarizer(
+        shlex.split(os.environ.get("LLM_CMD", "gemini")),
+        Path("prompts/daily_summary.txt"),
+        prompt_flag=os.environ.get("LLM_PROMPT_FLAG", "-p"),
+        timeout=float(os.environ.get("LLM_TIMEOUT_SECONDS", str(_DEFAULT_LLM_TIMEOUT))),
+        cache_dir=Path(os.environ.get("LLM_CACHE_DIR", "llm_cache")),
+        token_budget=int(token_budget) if token_budget else None,
+        map_workers=workers or _DEFAULT_LLM_WORKERS,
+    )
+
+
+def _open_media_store() -> MediaStore | None:
+    """DOWNLOAD_MEDIA=1 のとき MEDIA_DIR（既定 img）のメディアストアを開く。"""
+    if os.environ.get("DOWNLOAD_MEDIA", "0") != "1":
+        return None
+    return MediaStore(Path(os.environ.get("MEDIA_DIR", "img")))
+
+
+def _open_media_fetcher(
+    media: MediaStore | None, logger: logging.Logger, client: HttpClient | None = None
+) -> MediaFetcher | None:
+    """media があれば MEDIA_WORKERS 個まで並行にダウンロードするフェッチャを開く。"""
+    if media is None:
+        return None
+    return MediaFetcher(
+        media,
+        os.environ["TELEGRAM_BOT_TOKEN"],
+        client=client,
+        api_base=os.environ.get("TELEGRAM_API_BASE", API_BASE),
+        workers=int(os.environ.get("MEDIA_WORKERS", str(_DEFAULT_MEDIA_WORKERS))),
+        logger=logger,
+    )
+
+
+def _open_search_index(messages: MessageStore, logger: logging.Logger) -> SearchIndex:
+    """SEARCH_DB（既定 search.db）の全文検索索引を開く。初回は保存済みの全メッセージを取り込む。"""
+    db_path = Path(os.environ.get("SEARCH_DB", "search.db"))
+    is_new = not db_path.exists()
+    search = SearchIndex(db_path)
+    if is_new:
+        imported = search.import_from(messages)
+        logger.info(f"Indexed {imported} message(s) into {db_path}")
+    return search
+
+
+def _start_metrics_server(
+    store: StateStore,
+    writer: JournalWriter,
+    messages: MessageStore,
+    logger: logging.Logger,
+) -> MetricsServer | None:
+    """METRICS_PORT が指定されていれば /metrics を返す HTTP サーバを別スレッドで起動する。
+
+    取り込みの遅れ（最後のメッセージからの経過秒）・日ごとの Markdown のサイズ・
+    メッセージストアのキャッシュの当たり/外れの回数はスクレイプのたびに求める。
+    起動時に state と最新日のメッセージから初期値を入れる。
+    """
+    port = os.environ.get("METRICS_PORT")
+    if not port:
+        return None
+    LAST_OFFSET.set(store.load().last_update_id)
+    dates = messages.dates()
+    if dates and (latest := messages.load(dates[-1])):
+        LAST_MESSAGE_TIMESTAMP.set(latest[-1].timestamp.timestamp())
+    REGISTRY.register(
+        Gauge(
+            "telegram_diary_ingest_lag_seconds",
+            "最後に取り込んだメッセージの時刻からの経過秒数。",
+            fn=lambda: (
+                None if (ts := LAST_MESSAGE_TIMESTAMP.value()) is None else time.time() - ts
+            ),
+        )
+    )
+    REGISTRY.register(
+        Gauge(
+            "telegram_diary_daily_file_bytes",
+            "日次 Markdown（daily/YYYY-MM-DD.md）のサイズ。",
+            fn=lambda: _daily_file_sizes(writer.daily_dir),
+        )
+    )
+    REGISTRY.register(
+        Gauge(
+            "telegram_diary_message_cache_lookups",
+            "MessageStore.load の日単位キャッシュを引いた回数（result=hit/miss）。",
+            fn=lambda: [
+                ({"result": "hit"}, messages.cache_stats.hits),
+                ({"result": "miss"}, messages.cache_stats.misses),
+            ],
+        )
+    )
+    server = MetricsServer((os.environ.get("METRICS_HOST", _DEFAULT_METRICS_HOST), int(port)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving metrics on http://{server.server_address[0]}:{server.server_port}/metrics")
+    return server
+
+
+def _daily_file_sizes(daily_dir: Path) -> list[tuple[dict[str, str], float]]:
+    sizes = []
+    for path in sorted(daily_dir.glob("*.md")):
+        try:
+            sizes.append(({"date": path.stem}, path.stat().st_size))
+        except FileNotFoundError:
+            continue  # 一覧を取った後に消えた
+    return sizes
+
+
+def search_messages(
+    search: SearchIndex,
+    query: str,
+    *,
+    since: str | None = None,
+    until: str | None = None,
+    limit: int = _DEFAULT_SEARCH_LIMIT,
+) -> list[str]:
+    """検索結果を「YYYY-MM-DD HH:MM 本文」の行にして返す。"""
+    lines = []
+    for result in search.search(query, since=since, until=until, limit=limit):
+        text = result.text.replace("\n", " / ")
+        lines.append(f"{result.date} {result.timestamp:%H:%M} {text}")
+    return lines
+
+
 def main() -> None:
     load_dotenv()
 
@@ -192,20 +914,264 @@ def main() -> None:
         const=_today_jst(),
         help="日次ジャーナルを生成する (YYYY-MM-DD)。省略時は当日。",
     )
+    parser.add_argument(
+        "--generate-range",
+        metavar=("START", "END"),
+        nargs=2,
+        help="START から END まで（両端を含む）の日次ジャーナルを並列に再生成する。",
+    )
+    parser.add_argument(
+        "--generate-all",
+        action="store_true",
+        help="messages/ にある全日付の日次ジャーナルを並列に再生成する。",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help=(
+            "--generate-range / --generate-all / --rebuild のワーカープロセス数（既定: CPU 数）、"
+            "--llm-summarize の同時実行数（既定: 4）。"
+        ),
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="前回の再構築から入力（messages/）か描画処理が変わった日だけ daily/ を再生成する。",
+    )
+    parser.add_argument(
+        "--llm-summarize",
+        metavar=("START", "END"),
+        nargs=2,
+        help="START から END まで（両端を含む）の日記を LLM_CMD で要約し直す（結果はキャッシュ）。",
+    )
+    parser.add_argument(
+        "--fetch-media",
+        metavar=("START", "END"),
+        nargs=2,
+        help="START から END まで（両端を含む）の添付ファイルをダウンロードし、日記を描き直す。",
+    )
+    parser.add_argument(
+        "--search",
+        metavar="QUERY",
+        help="メッセージ本文と添付ファイル名を全文検索する（空白区切りで AND）。",
+    )
+    parser.add_argument("--since", metavar="DATE", help="--search の開始日 (YYYY-MM-DD)。")
+    parser.add_argument("--until", metavar="DATE", help="--search の終了日 (YYYY-MM-DD)。")
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=_DEFAULT_SEARCH_LIMIT,
+        help=f"--search で表示する件数（既定: {_DEFAULT_SEARCH_LIMIT}）。",
+    )
+    parser.add_argument(
+        "--catch-up",
+        action="store_true",
+        help="未取得の更新を空になるまで一括で取り込んで終了する（障害復旧用）。",
+    )
+    parser.add_argument(
+        "--async-engine",
+        action="store_true",
+        help="取得と書き込みを重ねて実行する asyncio ベースのエンジンでポーリングする。",
+    )
+    parser.add_argument(
+        "--webhook",
+        action="store_true",
+        help="ポーリングの代わりにローカル HTTP サーバで push された Update を受け取る。",
+    )
+    parser.add_argument(
+        "--compact",
+        metavar="DATE",
+        nargs="?",
+        const="",
+        help="messages/ の追記ログを畳む (YYYY-MM-DD)。省略時は全日付。",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        nargs="?",
+        const=_DEFAULT_PROFILE_PATH,
+        help=(
+            "取得・正規化・読み込み・マージ・保存・描画などの段階ごとの所要時間を"
+            f"JSON Lines で PATH に追記する（既定: {_DEFAULT_PROFILE_PATH}）。"
+        ),
+    )
+    parser.add_argument(
+        "--profile-summary",
+        metavar="PATH",
+        nargs="?",
+        const=_DEFAULT_PROFILE_PATH,
+        help="--profile のトレースを段階ごとに集計し、p50 / p99 を表示する。",
+    )
     args = parser.parse_args()
 
+    if args.profile_summary is not None:
+        for line in format_summary(summarize_trace(Path(args.profile_summary))):
+            print(line)
+        return
+
     logger = setup_logger(Path("logs"))
+    if args.profile is not None:
+        enable_profile(Path(args.profile))
     store = StateStore()
-    writer = JournalWriter(Path("daily"))
-    messages_dir = Path("messages")
+    media = _open_media_store()
+    if args.fetch_media is not None and media is None:
+        media = MediaStore(Path(os.environ.get("MEDIA_DIR", "img")))
+    writer = JournalWriter(Path("daily"), _open_tagger(), media)
+    messages = _open_messages(logger)
 
     if args.generate_daily is not None:
-        generate_daily(args.generate_daily, writer, messages_dir, logger)
-    else:
-        bot_token = os.environ["TELEGRAM_BOT_TOKEN"]
-        chat_id = int(os.environ["TELEGRAM_CHAT_ID"])
-        interval = int(os.environ.get("POLL_INTERVAL_SECONDS", str(_DEFAULT_INTERVAL)))
-        poll_loop(bot_token, chat_id, store, writer, messages_dir, logger, interval)
+        generate_daily(args.generate_daily, writer, messages, logger)
+        return
+    if args.generate_range is not None or args.generate_all or args.rebuild:
+        if args.rebuild:
+            stats = rebuild_daily(writer, messages, logger, workers=args.workers)
+        else:
+            dates = messages.dates()
+            if args.generate_range is not None:
+                start, end = (date.fromisoformat(d).isoformat() for d in args.generate_range)
+                dates = [d for d in dates if start <= d <= end]
+            stats = generate_range(dates, writer, messages, logger, workers=args.workers)
+        print(
+            f"written={stats.written} skipped={stats.skipped} failed={len(stats.failed)} "
+            f"({stats.elapsed:.1f}s)"
+        )
+        for date_str in stats.failed:
+            print(f"failed: {date_str}")
+        if stats.failed:
+            raise SystemExit(1)
+        return
+    if args.llm_summarize is not None:
+        start, end = (date.fromisoformat(d).isoformat() for d in args.llm_summarize)
+        notes_dir = os.environ.get("NOTES_DIR")
+        llm_stats = summarize_range(
+            [d for d in messages.dates() if start <= d <= end],
+            _open_llm_summarizer(args.workers),
+            messages,
+            writer.daily_dir,
+            logger,
+            workers=args.workers,
+            notes_dir=Path(notes_dir) if notes_dir else None,
+        )
+        print(
+            f"called={llm_stats.called} cached={llm_stats.cached} written={llm_stats.written} "
+            f"failed={len(llm_stats.failed)} ({llm_stats.elapsed:.1f}s)"
+        )
+        for date_str in llm_stats.failed:
+            print(f"failed: {date_str}")
+        if llm_stats.failed:
+            raise SystemExit(1)
+        return
+    if args.fetch_media is not None:
+        start, end = (date.fromisoformat(d).isoformat() for d in args.fetch_media)
+        with create_client() as client:
+            fetcher = _open_media_fetcher(media, logger, client)
+            assert fetcher is not None
+            media_stats = fetch_media(
+                [d for d in messages.dates() if start <= d <= end],
+                fetcher, writer, messages, logger,
+            )
+        print(
+            f"downloaded={media_stats.downloaded} reused={media_stats.reused} "
+            f"failed={len(media_stats.failed)} ({media_stats.bytes} bytes, "
+            f"{media_stats.elapsed:.1f}s)"
+        )
+        if media_stats.failed:
+            raise SystemExit(1)
+        return
+    if args.compact is not None:
+        compact_messages(messages, logger, args.compact or None)
+        return
+    if args.search is not None:
+        search = _open_search_index(messages, logger)
+        since, until = (
+            date.fromisoformat(d).isoformat() if d else None for d in (args.since, args.until)
+        )
+        for line in search_messages(
+            search, args.search, since=since, until=until, limit=args.limit
+        ):
+            print(line)
+        return
+
+    chat_id = int(os.environ["TELEGRAM_CHAT_ID"])
+    wal = _open_wal(logger)
+    try:
+        _run_daemon(args, chat_id, store, writer, messages, logger, wal, media)
+    finally:
+        wal.close()
+
+
+def _open_wal(logger: logging.Logger) -> WriteAheadLog:
+    """WAL の排他ロックを取り、前回の実行で残ったコミット済みグループを復旧する。
+
+    書き込みを WAL 経由で行う常駐モードだけが呼ぶ。ロックは close まで保持し、
+    別の常駐プロセスが動いていれば WalLockedError で終了する。
+    """
+    wal = WriteAheadLog(Path("state.wal"))
+    replayed = wal.recover()
+    if replayed:
+        logger.info(f"Replayed {replayed} committed write group(s) from {wal.path}")
+    return wal
+
+
+def _run_daemon(
+    args: argparse.Namespace,
+    chat_id: int,
+    store: StateStore,
+    writer: JournalWriter,
+    messages: MessageStore,
+    logger: logging.Logger,
+    wal: WriteAheadLog,
+    media: MediaStore | None,
+) -> None:
+    """常駐モード（webhook・非同期エンジン・--catch-up・ポーリング）を実行する。"""
+    _start_metrics_server(store, writer, messages, logger)
+    seen = SeenIndex(Path("seen"))
+    search = _open_search_index(messages, logger)
+    if args.webhook:
+        server = WebhookServer(
+            (
+                os.environ.get("WEBHOOK_HOST", "127.0.0.1"),
+                int(os.environ.get("WEBHOOK_PORT", str(_DEFAULT_WEBHOOK_PORT))),
+            ),
+            secret_token=os.environ.get("WEBHOOK_SECRET_TOKEN"),
+            queue_size=int(
+                os.environ.get("WEBHOOK_QUEUE_SIZE", str(_DEFAULT_WEBHOOK_QUEUE_SIZE))
+            ),
+        )
+        serve_webhook(
+            chat_id, store, writer, messages, logger, server,
+            wal=wal, seen=seen, search=search, media=_open_media_fetcher(media, logger),
+        )
+        return
+
+    bot_token = os.environ["TELEGRAM_BOT_TOKEN"]
+    interval = int(os.environ.get("POLL_INTERVAL_SECONDS", str(_DEFAULT_INTERVAL)))
+    poll_timeout = int(os.environ.get("POLL_TIMEOUT_SECONDS", str(_DEFAULT_POLL_TIMEOUT)))
+    api_base = os.environ.get("TELEGRAM_API_BASE", API_BASE)
+    if args.async_engine:
+        asyncio.run(
+            _run_async_engine(
+                bot_token, chat_id, store, writer, messages, logger, interval,
+                poll_timeout=poll_timeout, api_base=api_base,
+                wal=wal, seen=seen, search=search, media=_open_media_fetcher(media, logger),
+            )
+        )
+        return
+    with create_client() as client:
+        fetcher = _open_media_fetcher(media, logger, client)
+        if args.catch_up:
+            drain_backlog(
+                bot_token, chat_id, store, writer, messages, logger,
+                api_base=api_base, client=client, wal=wal, seen=seen, search=search,
+                media=fetcher,
+            )
+        else:
+            poll_loop(
+                bot_token, chat_id, store, writer, messages, logger, interval,
+                poll_timeout=poll_timeout, api_base=api_base, client=client,
+                wal=wal, seen=seen, search=search, media=fetcher,
+            )
 
 
 if __name__ == "__main__":
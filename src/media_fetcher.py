@@ -0,0 +1,158 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+
+import httpx
+
+from src.fetcher import API_BASE
+from src.http_client import create_client
+from src.media_store import MediaStore, media_key
+from src.models import Attachment, Message
+from src.retry import with_retry
+
+_DEFAULT_WORKERS = 4
+
+
+class MediaError(Exception):
+    """getFile の失敗やダウンロードしたサイズの不一致。"""
+
+
+@dataclass
+class MediaStats:
+    downloaded: int = 0  # 新たにダウンロードしたファイル数
+    reused: int = 0  # 保存済みのファイルを使い回した数
+    bytes: int = 0  # 今回受信したバイト数（再開分を含む）
+    failed: list[str] = field(default_factory=list)  # 失敗した file_id
+    elapsed: float = 0.0
+
+
+class MediaFetcher:
+    """添付ファイルを getFile で解決し、MediaStore へ並行にダウンロードする。
+
+    同時ダウンロード数は workers 個まで。本文はチャンクごとに img/.partial/ へ書き足すため
+    大きな動画もメモリに載せない。途中で切れた場合は Range ヘッダで続きから取り直す
+    （サーバが 206 を返さなければ最初から書き直す）。
+    """
+
+    def __init__(
+        self,
+        store: MediaStore,
+        bot_token: str,
+        *,
+        client: httpx.Client | None = None,
+        api_base: str = API_BASE,
+        workers: int = _DEFAULT_WORKERS,
+        max_attempts: int = 3,
+        retry_delay: float = 1.0,
+        logger: logging.Logger | None = None,
+    ):
+        self.store = store
+        self.bot_token = bot_token
+        self.client = client if client is not None else create_client()
+        self.api_base = api_base
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.logger = logger or logging.getLogger("telegram_diary")
+
+    def download(self, messages: list[Message]) -> MediaStats:
+        """messages の添付のうち未保存のものをダウンロードする。失敗は記録して続行する。"""
+        stats = MediaStats()
+        started = time.monotonic()
+        pending: dict[str, Attachment] = {}
+        for msg in messages:
+            for att in msg.attachments:
+                if self.store.get(att) is not None:
+                    stats.reused += 1
+                else:
+                    pending.setdefault(media_key(att), att)
+        if not pending:
+            return stats
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._download_with_retry, att): att for att in pending.values()}
+            for future in as_completed(futures):
+                att = futures[future]
+                try:
+                    received = future.result()
+                except (MediaError, httpx.HTTPError, OSError) as exc:
+                    self.logger.warning(f"Media download failed ({att.file_name}): {exc}")
+                    stats.failed.append(att.file_id)
+                    continue
+                if received is None:
+                    stats.reused += 1
+                else:
+                    stats.downloaded += 1
+                    stats.bytes += received
+        stats.elapsed = time.monotonic() - started
+        self.logger.info(
+            f"Media downloaded={stats.downloaded}, reused={stats.reused}, "
+            f"failed={len(stats.failed)} ({stats.bytes} bytes in {stats.elapsed:.1f}s)"
+        )
+        return stats
+
+    def _download_with_retry(self, att: Attachment) -> int | None:
+        # 再試行は partial の続きから始まるため、途中で切れた分を取り直さない
+        return with_retry(
+            lambda: self.fetch(att), max_attempts=self.max_attempts, base_delay=self.retry_delay
+        )
+
+    def fetch(self, att: Attachment) -> int | None:
+        """1ファイルをダウンロードして保存し、受信したバイト数を返す。
+
+        getFile の結果から同じファイルが保存済みとわかった場合は None を返す。
+        """
+        key = media_key(att)
+        info = self._get_file(att.file_id)
+        keys = [key, info.get("file_unique_id", "")]
+        existing = self.store.lookup(keys[1]) if keys[1] else None
+        if existing is not None:
+            self.store.link(keys, existing)
+            return None
+        if "file_path" not in info:
+            raise MediaError("getFile returned no file_path")
+        partial = self.store.partial_path(key)
+        url = f"{self.api_base}/file/bot{self.bot_token}/{info['file_path']}"
+        received = self._stream(url, partial, info.get("file_size"))
+        suffix = PurePosixPath(info["file_path"]).suffix or PurePosixPath(att.file_name).suffix
+        self.store.commit(keys, partial, suffix)
+        return received
+
+    def _get_file(self, file_id: str) -> dict:
+        response = self.client.get(
+            f"{self.api_base}/bot{self.bot_token}/getFile", params={"file_id": file_id}
+        )
+        try:
+            data = response.json()
+        except ValueError as exc:
+            raise MediaError(f"getFile returned HTTP {response.status_code}") from exc
+        if not data.get("ok"):
+            raise MediaError(data.get("description", "getFile returned ok=false"))
+        return data["result"]
+
+    def _stream(self, url: str, partial: Path, expected: int | None) -> int:
+        """url の本文を partial に書き足し、受信したバイト数を返す。"""
+        partial.parent.mkdir(parents=True, exist_ok=True)
+        offset = partial.stat().st_size if partial.exists() else 0
+        if expected is not None and offset >= expected:
+            if offset == expected:
+                return 0
+            partial.unlink()
+            offset = 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        received = 0
+        with self.client.stream("GET", url, headers=headers) as response:
+            response.raise_for_status()
+            mode = "ab" if response.status_code == 206 else "wb"
+            with partial.open(mode) as f:
+                # 受信した分をその都度書く（チャンクにまとめ直すと切断時に末尾を失う）
+                for chunk in response.iter_bytes():
+                    f.write(chunk)
+                    received += len(chunk)
+        size = partial.stat().st_size
+        if expected is not None and size != expected:
+            if size > expected:
+                partial.unlink()
+            raise MediaError(f"size mismatch: expected {expected} bytes, got {size}")
+        return received
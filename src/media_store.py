@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from src.models import Attachment
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+class MediaStore:
+    """ダウンロードした添付ファイルを内容のハッシュで名付けて保存する。
+
+    保存先は img/<sha256 の先頭2桁>/<sha256><拡張子>。
+
+    Telegram の file_unique_id（古い記録では file_id）から保存先への対応を img/index.json に
+    持ち、同じファイルを2度ダウンロードしない。別のファイルとして届いても中身が同じなら
+    1つのファイルを共有する。ダウンロード途中のファイルは img/.partial/ に置き、
+    中断後はその続きから再開する。複数スレッドからの commit は直列化する。
+    """
+
+    def __init__(self, media_dir: Path = Path("img")):
+        self.media_dir = media_dir
+        self._index_path = media_dir / "index.json"
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+
+    def get(self, att: Attachment) -> Path | None:
+        """保存済みならそのパスを、なければ None を返す。"""
+        return self.lookup(media_key(att))
+
+    def lookup(self, key: str) -> Path | None:
+        relative = self._index.get(key)
+        if relative is None:
+            return None
+        path = self.media_dir / relative
+        return path if path.exists() else None
+
+    def partial_path(self, key: str) -> Path:
+        return self.media_dir / ".partial" / f"{key}.part"
+
+    def link(self, keys: list[str], path: Path) -> None:
+        """保存済みの path を keys からも引けるようにする。"""
+        with self._lock:
+            self._record(keys, path)
+
+    def commit(self, keys: list[str], partial: Path, suffix: str) -> Path:
+        """ダウンロードし終えた partial をハッシュで名付けた保存先へ移し、keys を登録する。
+
+        同じ内容のファイルがすでにあれば partial は捨ててそちらを使う。
+        """
+        digest = _sha256(partial)
+        path = self.media_dir / digest[:2] / f"{digest}{suffix}"
+        with self._lock:
+            if path.exists():
+                partial.unlink()
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(partial, path)
+            self._record(keys, path)
+        return path
+
+    def _record(self, keys: list[str], path: Path) -> None:
+        relative = path.relative_to(self.media_dir).as_posix()
+        changed = False
+        for key in keys:
+            if key and self._index.get(key) != relative:
+                self._index[key] = relative
+                changed = True
+        if changed:
+            self._save_index()
+
+    def _load_index(self) -> dict[str, str]:
+        try:
+            return json.loads(self._index_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self) -> None:
+        self.media_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self._index_path.with_name(self._index_path.name + ".tmp")
+        tmp.write_text(json.dumps(self._index, indent=2, sort_keys=True))
+        os.replace(tmp, self._index_path)
+
+
+def media_key(att: Attachment) -> str:
+    """同一ファイルの判定キー。file_unique_id のない古い記録は file_id で代用する。"""
+    return att.file_unique_id or att.file_id
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
@@ -0,0 +1,397 @@
+import bisect
+import hashlib
+import itertools
+import json
+import os
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from operator import attrgetter
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from src.day_batch import DayBatch
+from src.metrics import BYTES_WRITTEN
+from src.models import Attachment, Message
+from src.profiler import span
+from src.wal import WriteGroup
+
+_DEFAULT_CACHE_SIZE = 8
+_JST = ZoneInfo("Asia/Tokyo")
+
+# --------------------------------------------------------------------------
+# シリアライズ
+# --------------------------------------------------------------------------
+
+
+def msg_to_dict(msg: Message) -> dict:
+    """Message を JSON シリアライズ可能な dict に変換する。"""
+    return {
+        "message_id": msg.message_id,
+        "timestamp": msg.timestamp.isoformat(),
+        "text": msg.text,
+        "source_chat": msg.source_chat,
+        "attachments": [_attachment_to_dict(a) for a in msg.attachments],
+    }
+
+
+def _attachment_to_dict(att: Attachment) -> dict:
+    # file_unique_id は持っている場合だけ書く（それ以前の記録とシリアライズ結果を変えない）
+    d = {"file_id": att.file_id, "file_name": att.file_name, "media_type": att.media_type}
+    if att.file_unique_id:
+        d["file_unique_id"] = att.file_unique_id
+    return d
+
+
+def dict_to_msg(d: dict) -> Message:
+    """dict を Message に復元する。"""
+    return Message(
+        message_id=d["message_id"],
+        timestamp=datetime.fromisoformat(d["timestamp"]),
+        text=d["text"],
+        source_chat=d["source_chat"],
+        attachments=[
+            Attachment(
+                file_id=a["file_id"],
+                file_name=a["file_name"],
+                media_type=a["media_type"],
+                file_unique_id=a.get("file_unique_id", ""),
+            )
+            for a in d.get("attachments", [])
+        ],
+    )
+
+
+# --------------------------------------------------------------------------
+# 日次メッセージログ
+# --------------------------------------------------------------------------
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+
+class MessageStore:
+    """日ごとのメッセージを追記専用の JSON Lines（messages/YYYY-MM-DD.jsonl）で保持する。
+
+    ポーリングのたびに新規・編集分だけを末尾に追記し、同一 message_id は読み込み時に
+    後勝ちで解決する。compact で1 message_id 1行に畳み直す。
+    旧形式の messages/YYYY-MM-DD.json は最初のアクセス時に .jsonl へ移行する。
+
+    読み込み結果は直近 cache_size 日分を LRU でキャッシュする（書き込みはキャッシュにも
+    反映）。ファイルの mtime とサイズが変わっていれば外部で編集されたとみなして読み直す。
+    """
+
+    def __init__(
+        self, messages_dir: Path = Path("messages"), cache_size: int = _DEFAULT_CACHE_SIZE
+    ):
+        self.messages_dir = messages_dir
+        self.cache_size = cache_size
+        self.cache_stats = CacheStats()
+        self._cache: OrderedDict[str, tuple[tuple[int | None, int], list[Message]]] = OrderedDict()
+
+    def path(self, date_str: str) -> Path:
+        return self.messages_dir / f"{date_str}.jsonl"
+
+    def load(self, date_str: str) -> list[Message]:
+        """date_str のメッセージを timestamp 順に返す。ファイルがなければ空リスト。"""
+        self._migrate(date_str)
+        path = self.path(date_str)
+        if not path.exists():
+            self._cache.pop(date_str, None)
+            return []
+        cached = self._cached(date_str)
+        if cached is not None:
+            self.cache_stats.hits += 1
+            return list(cached)
+        self.cache_stats.misses += 1
+        messages = _fold(self._read_records(path))
+        self._remember(date_str, messages)
+        return list(messages)
+
+    def load_batch(self, date_str: str) -> DayBatch:
+        """date_str のメッセージを列形式の DayBatch で返す（長期間をまとめて読む用途向け）。"""
+        return DayBatch.from_messages(self.load(date_str))
+
+    def iter_messages(
+        self, start: datetime, end: datetime, chat_id: int | None = None
+    ) -> Iterator[Message]:
+        """timestamp が start 以上 end 未満のメッセージを timestamp 順に1件ずつ返す。
+
+        範囲にかかる日を1日ずつ読み込み、その日の timestamp 列（DayBatch）を二分探索して
+        範囲の始まりから読み、end に達したところで打ち切る。保持するのは常に1日分だけ。
+        読み込んだ日は LRU キャッシュに載せない（長い範囲を流し読みしてもポーリングで使う
+        直近の日を追い出さない）。chat_id を指定するとそのチャットのメッセージだけを返す。
+        タイムゾーンのない start / end は JST とみなす。
+        """
+        start, end = (t if t.tzinfo else t.replace(tzinfo=_JST) for t in (start, end))
+        first, last = (t.astimezone(_JST).date().isoformat() for t in (start, end))
+        low, high = start.timestamp(), end.timestamp()
+        for date_str in self.dates():
+            if date_str < first:
+                continue
+            if date_str > last:
+                break
+            batch = DayBatch.from_messages(self._read_day(date_str))
+            stop = bisect.bisect_left(batch.timestamps, high)
+            for i in range(bisect.bisect_left(batch.timestamps, low), stop):
+                if chat_id is None or batch.chat_ids[i] == chat_id:
+                    yield batch[i].to_message()
+
+    def append(
+        self, date_str: str, messages: list[Message], group: WriteGroup | None = None
+    ) -> list[Message]:
+        """新規・編集メッセージをログ末尾に追記し、実際に追記したメッセージを返す。
+
+        保存済みの版と内容が同一のメッセージ（重複 Update や変化のない編集）は書かない。
+        group が渡された場合は追記をグループに積み、WriteAheadLog.commit で反映する。
+        """
+        changed = self.changed(date_str, messages)
+        if changed:
+            cached = self._cached(date_str)
+            merged = merge_messages(cached, changed) if cached is not None else None
+            self._write_changed(date_str, changed, merged, group)
+        return changed
+
+    def append_merged(
+        self,
+        date_str: str,
+        messages: list[Message],
+        existing: list[Message],
+        group: WriteGroup | None = None,
+    ) -> tuple[list[Message], list[Message]]:
+        """append と同じく追記し、(追記したメッセージ, 追記後の1日分) を返す。
+
+        existing はこの日の load の戻り値。追記後の1日分は existing に追記分を
+        merge_messages で差し込んで求め、そのままキャッシュにも載せる。
+        """
+        changed = self.changed(date_str, messages)
+        if not changed:
+            return [], existing
+        with span("merge") as current:
+            merged = merge_messages(existing, changed)
+            current.messages = len(merged)
+        self._write_changed(date_str, changed, merged, group)
+        return changed, merged
+
+    def changed(self, date_str: str, messages: list[Message]) -> list[Message]:
+        """保存済みの版とシリアライズ結果が異なるメッセージだけを返す。
+
+        シリアライズするのは messages と同じ message_id を持つ保存済みの版だけ
+        （日のメッセージ数ではなく新着の件数に比例する）。
+        """
+        if not messages:
+            return []
+        ids = {m.message_id for m in messages}
+        current = {m.message_id: _to_line(m) for m in self.load(date_str) if m.message_id in ids}
+        result = []
+        for msg in messages:
+            line = _to_line(msg)
+            if current.get(msg.message_id) != line:
+                current[msg.message_id] = line
+                result.append(msg)
+        return result
+
+    def save(self, date_str: str, messages: list[Message]) -> None:
+        """ログを messages の内容だけで置き換える（一時ファイル経由で原子的に書き換える）。"""
+        self.messages_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path(date_str)
+        tmp = path.with_suffix(".jsonl.tmp")
+        tmp.write_text("".join(_to_line(m) for m in messages), encoding="utf-8")
+        os.replace(tmp, path)
+        self._remember(date_str, _fold(messages))
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """ブロック内の書き込みを1回の単位にまとめる。JSON Lines では各追記がそのまま単位。"""
+        yield
+
+    def compact(self, date_str: str) -> None:
+        """編集履歴を畳み、1 message_id 1行のログに書き直す。"""
+        self.save(date_str, self.load(date_str))
+
+    def digest(self, date_str: str) -> str:
+        """date_str の保存内容のハッシュ（再生成が必要かの判定用）。メッセージがなければ空文字。
+
+        編集履歴を畳んだ後のメッセージから計算するため、compact しても変わらない。
+        """
+        messages = self.load(date_str)
+        if not messages:
+            return ""
+        h = hashlib.sha256()
+        for m in messages:
+            h.update(_to_line(m).encode("utf-8"))
+        return h.hexdigest()
+
+    def dates(self) -> list[str]:
+        """保存済みの日付（YYYY-MM-DD）を昇順で返す。旧形式のファイルも含む。"""
+        if not self.messages_dir.exists():
+            return []
+        names = {p.stem for p in self.messages_dir.glob("*.jsonl")}
+        names |= {p.stem for p in self.messages_dir.glob("*.json")}
+        return sorted(names)
+
+    def _read_day(self, date_str: str) -> list[Message]:
+        """load と同じ結果を返すが、キャッシュにない日を読んでもキャッシュに載せない。"""
+        self._migrate(date_str)
+        path = self.path(date_str)
+        if not path.exists():
+            return []
+        cached = self._cached(date_str)
+        if cached is not None:
+            return cached
+        return _fold(self._read_records(path))
+
+    def _write_changed(
+        self,
+        date_str: str,
+        changed: list[Message],
+        merged: list[Message] | None,
+        group: WriteGroup | None,
+    ) -> None:
+        """changed をログ末尾に追記する。merged（追記後の1日分）があればキャッシュする。"""
+        self.messages_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path(date_str)
+        data = "".join(_to_line(m) for m in changed)
+        BYTES_WRITTEN.inc(len(data.encode("utf-8")), kind="messages")
+        if group is not None:
+            group.append(path, data)
+            if merged is not None:
+                self._remember(date_str, merged, size=group.size(path))
+            return
+        _drop_torn_tail(path)
+        with path.open("a", encoding="utf-8") as f:
+            f.write(data)
+        if merged is not None:
+            self._remember(date_str, merged)
+
+    def _cached(self, date_str: str) -> list[Message] | None:
+        """キャッシュがファイルの現状と一致していれば返す。"""
+        entry = self._cache.get(date_str)
+        if entry is None:
+            return None
+        signature, messages = entry
+        current = _signature(self.path(date_str))
+        if signature[0] is None and signature[1] == current[1]:
+            # グループ書き込み後の初回参照。反映後のサイズが一致すれば mtime を確定する
+            self._cache[date_str] = (current, messages)
+        elif signature != current:
+            del self._cache[date_str]
+            return None
+        self._cache.move_to_end(date_str)
+        return messages
+
+    def _remember(
+        self, date_str: str, messages: list[Message], size: int | None = None
+    ) -> None:
+        """messages をキャッシュする。size はまだ反映していないグループ書き込み後のサイズ。"""
+        if self.cache_size <= 0:
+            return
+        signature = (None, size) if size is not None else _signature(self.path(date_str))
+        self._cache[date_str] = (signature, messages)
+        self._cache.move_to_end(date_str)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _read_records(self, path: Path) -> list[Message]:
+        result = []
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if not line:
+                continue
+            try:
+                result.append(dict_to_msg(json.loads(line)))
+            except json.JSONDecodeError:
+                # 追記中のクラッシュで末尾行が途切れている場合は読み飛ばす
+                continue
+        return result
+
+    def _migrate(self, date_str: str) -> None:
+        """旧形式の YYYY-MM-DD.json があれば .jsonl に変換して削除する。"""
+        legacy = self.messages_dir / f"{date_str}.json"
+        if not legacy.exists() or self.path(date_str).exists():
+            return
+        messages = [dict_to_msg(d) for d in json.loads(legacy.read_text())]
+        self.save(date_str, messages)
+        legacy.unlink()
+
+
+def _drop_torn_tail(path: Path) -> None:
+    """追記中のクラッシュで途切れた末尾行を切り捨てる（その後ろに追記すると新しい行も壊れるため）。"""
+    if not path.exists():
+        return
+    with path.open("r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        f.seek(0)
+        f.truncate(f.read().rfind(b"\n") + 1)
+
+
+def open_message_store(messages: Path | MessageStore) -> MessageStore:
+    """ディレクトリが渡された場合は既定の JSON Lines ストアを開く。"""
+    return messages if isinstance(messages, MessageStore) else MessageStore(messages)
+
+
+# --------------------------------------------------------------------------
+# マージ
+# --------------------------------------------------------------------------
+
+
+def merge_messages(existing: list[Message], new: list[Message]) -> list[Message]:
+    """既存と新規を message_id でマージし timestamp 順に返す。編集済みメッセージは上書き。
+
+    existing は timestamp 順・message_id 重複なし（load の戻り値）を前提に、
+    並びを保ったまま編集を id→位置の索引でその場に置き換え、新規分だけを二分探索で
+    差し込む（全体を並べ直さない）。新規分が末尾より後ろなら連結するだけで済む。
+    同時刻のメッセージは既存分が先になる。
+    """
+    merged: list[Message | None] = list(existing)
+    position = dict(zip(map(_by_message_id, existing), itertools.count()))
+    additions: dict[int, Message] = {}
+    removed = False
+    for msg in new:
+        i = position.get(msg.message_id)
+        if i is not None:
+            current = merged[i]
+            if current is not None and current.timestamp == msg.timestamp:
+                merged[i] = msg  # 編集済みメッセージは上書き
+                continue
+            # 時刻の変わった版は元の位置から外し、新規分と一緒に差し込む
+            merged[i] = None
+            removed = True
+        additions[msg.message_id] = msg
+    result = [m for m in merged if m is not None] if removed else merged
+    for msg in sorted(additions.values(), key=_by_timestamp):
+        if not result or result[-1].timestamp <= msg.timestamp:
+            result.append(msg)
+        else:
+            result.insert(bisect.bisect_right(result, msg.timestamp, key=_by_timestamp), msg)
+    return result
+
+
+_by_timestamp = attrgetter("timestamp")
+_by_message_id = attrgetter("message_id")
+
+
+def _fold(records: list[Message]) -> list[Message]:
+    """同一 message_id を後勝ちで1件にし、timestamp 順に並べる。"""
+    by_id: dict[int, Message] = {}
+    for msg in records:
+        by_id[msg.message_id] = msg  # 後から追記された版（編集）で上書き
+    return sorted(by_id.values(), key=lambda m: m.timestamp)
+
+
+def _signature(path: Path) -> tuple[int, int]:
+    st = path.stat()
+    return st.st_mtime_ns, st.st_size
+
+
+def _to_line(msg: Message) -> str:
+    return json.dumps(msg_to_dict(msg), ensure_ascii=False) + "\n"
@@ -0,0 +1,237 @@
+import math
+import threading
+from collections.abc import Callable, Iterable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TypeVar
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 秒。短間隔ポーリングの fetch（数十ms）からロングポーリングの保持時間（〜50秒）まで
+_DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = tuple[tuple[str, str], ...]
+Sample = tuple[str, Labels, float]  # (名前の接尾辞, ラベル, 値)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def samples(self) -> list[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """単調増加する値。labels ごとに別の系列を持つ。"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self) -> list[Sample]:
+        with self._lock:
+            if not self._values:
+                return [("_total", (), 0)]
+            return [("_total", labels, value) for labels, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """任意に上下する値。set で設定するか、fn を渡してスクレイプ時に求める。
+
+    fn は値か (ラベル, 値) の組の列を返す。値が None なら系列を出さない。
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], float | None | Iterable[tuple[dict[str, str], float]]] | None = None,
+    ):
+        super().__init__(name, help)
+        self.fn = fn
+        self._value: float | None = None
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def value(self) -> float | None:
+        return self._value
+
+    def samples(self) -> list[Sample]:
+        if self.fn is None:
+            return [] if self._value is None else [("", (), self._value)]
+        result = self.fn()
+        if result is None:
+            return []
+        if isinstance(result, int | float):
+            return [("", (), float(result))]
+        return [("", tuple(sorted(labels.items())), value) for labels, value in result]
+
+
+class Histogram(_Metric):
+    """観測値の分布（累積バケット・合計・件数）。"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = _DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+            self._sum += value
+            self._count += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def samples(self) -> list[Sample]:
+        with self._lock:
+            result: list[Sample] = []
+            cumulative = 0
+            for bound, count in zip(self.buckets, self._counts):
+                cumulative += count
+                result.append(("_bucket", (("le", _format_value(bound)),), cumulative))
+            result.append(("_bucket", (("le", "+Inf"),), self._count))
+            result.append(("_sum", (), self._sum))
+            result.append(("_count", (), self._count))
+            return result
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: M) -> M:
+        """metric を登録する。同名のものがあれば置き換える。"""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式（0.0.4）で全メトリクスを書き出す。"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                labels_str = _format_labels(labels)
+                lines.append(f"{metric.name}{suffix}{labels_str} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# --------------------------------------------------------------------------
+# 取り込みのメトリクス（計測は常時行い、公開は MetricsServer を起動した場合だけ）
+# --------------------------------------------------------------------------
+
+REGISTRY = Registry()
+
+POLL_DURATION = REGISTRY.register(
+    Histogram(
+        "telegram_diary_poll_duration_seconds",
+        "完了した poll_once 1回（取得から書き込みまで）の所要時間。",
+    )
+)
+FETCH_LATENCY = REGISTRY.register(
+    Histogram(
+        "telegram_diary_fetch_latency_seconds",
+        "getUpdates 1回の所要時間（ロングポーリングでは保持時間を含む）。",
+    )
+)
+MESSAGES_INGESTED = REGISTRY.register(
+    Counter("telegram_diary_messages_ingested", "取り込んで保存したメッセージ数。")
+)
+BYTES_WRITTEN = REGISTRY.register(
+    Counter("telegram_diary_bytes_written", "書き出したバイト数（kind=daily は日次 Markdown）。")
+)
+RETRIES = REGISTRY.register(
+    Counter("telegram_diary_retries", "with_retry と書き込みの再試行の回数。")
+)
+LAST_OFFSET = REGISTRY.register(
+    Gauge("telegram_diary_last_offset", "state に保存した getUpdates の offset。")
+)
+LAST_MESSAGE_TIMESTAMP = REGISTRY.register(
+    Gauge(
+        "telegram_diary_last_message_timestamp_seconds",
+        "最後に取り込んだメッセージの時刻（UNIX 秒）。",
+    )
+)
+
+
+# --------------------------------------------------------------------------
+# HTTP エンドポイント
+# --------------------------------------------------------------------------
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """GET /metrics に registry の内容を Prometheus のテキスト形式で返す HTTP サーバ。"""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], registry: Registry = REGISTRY):
+        super().__init__(address, _MetricsHandler)
+        self.registry = registry
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    server: MetricsServer
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
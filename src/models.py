@@ -7,6 +7,7 @@ class Attachment:
     file_id: str
     file_name: str
     media_type: str
+    file_unique_id: str = ""  # ボットをまたいで同じファイルを指す ID（古い記録では空）
 
 
 @dataclass
@@ -18,6 +19,72 @@ class Message:
     attachments: list[Attachment] = field(default_factory=list)
 
 
+@dataclass(frozen=True, slots=True)
+class FrozenAttachment:
+    """Attachment の不変・__slots__ 版（大量のメッセージを保持する用途向け）。"""
+
+    file_id: str
+    file_name: str
+    media_type: str
+    file_unique_id: str = ""
+
+    @classmethod
+    def from_attachment(cls, att: Attachment) -> "FrozenAttachment":
+        return cls(
+            file_id=att.file_id,
+            file_name=att.file_name,
+            media_type=att.media_type,
+            file_unique_id=att.file_unique_id,
+        )
+
+    def to_attachment(self) -> Attachment:
+        return Attachment(
+            file_id=self.file_id,
+            file_name=self.file_name,
+            media_type=self.media_type,
+            file_unique_id=self.file_unique_id,
+        )
+
+
+# 添付なしのメッセージで共有する空タプル（メッセージごとに空リストを持たない）
+NO_ATTACHMENTS: tuple[FrozenAttachment, ...] = ()
+
+
+@dataclass(frozen=True, slots=True)
+class FrozenMessage:
+    """Message の不変・__slots__ 版。添付がなければ NO_ATTACHMENTS を共有する。"""
+
+    message_id: int
+    timestamp: datetime
+    text: str
+    source_chat: int
+    attachments: tuple[FrozenAttachment, ...] = NO_ATTACHMENTS
+
+    @classmethod
+    def from_message(cls, msg: Message) -> "FrozenMessage":
+        attachments = (
+            tuple(FrozenAttachment.from_attachment(a) for a in msg.attachments)
+            if msg.attachments
+            else NO_ATTACHMENTS
+        )
+        return cls(
+            message_id=msg.message_id,
+            timestamp=msg.timestamp,
+            text=msg.text,
+            source_chat=msg.source_chat,
+            attachments=attachments,
+        )
+
+    def to_message(self) -> Message:
+        return Message(
+            message_id=self.message_id,
+            timestamp=self.timestamp,
+            text=self.text,
+            source_chat=self.source_chat,
+            attachments=[a.to_attachment() for a in self.attachments],
+        )
+
+
 @dataclass
 class State:
     last_update_id: int
@@ -28,3 +95,4 @@ class State:
 class DailySummary:
     date: str
     messages: list[Message] = field(default_factory=list)
+    summary: list[str] = field(default_factory=list)  # 要約の箇条書き。空なら summarizer で作る
@@ -31,6 +31,7 @@ def _extract_attachments(raw: dict) -> list[Attachment]:
             file_id=largest["file_id"],
             file_name=f"photo_{largest['file_id']}.jpg",
             media_type="photo",
+            file_unique_id=largest.get("file_unique_id", ""),
         ))
 
     for media_type in ("video", "document", "audio", "voice"):
@@ -40,6 +41,7 @@ def _extract_attachments(raw: dict) -> list[Attachment]:
                 file_id=obj["file_id"],
                 file_name=obj.get("file_name", f"{media_type}_{obj['file_id']}"),
                 media_type=media_type,
+                file_unique_id=obj.get("file_unique_id", ""),
             ))
 
     return result
@@ -0,0 +1,161 @@
+import json
+import math
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TextIO
+
+# enable で開いたトレースファイル。None の間は span が計測も記録もしない
+_trace: TextIO | None = None
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Span:
+    """計測中の区間。ブロック内で bytes / messages に処理した量を設定する。"""
+
+    __slots__ = ("stage", "bytes", "messages")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.bytes: int | None = None
+        self.messages: int | None = None
+
+
+def enable(path: Path) -> None:
+    """以降の span を path に JSON Lines で追記する。"""
+    global _trace
+    disable()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # 行バッファにして1レコードずつ書く（プロセスプールのワーカーも同じファイルに追記する）
+    _trace = path.open("a", encoding="utf-8", buffering=1)
+
+
+def disable() -> None:
+    global _trace
+    with _lock:
+        if _trace is not None:
+            _trace.close()
+            _trace = None
+
+
+def enabled() -> bool:
+    return _trace is not None
+
+
+@contextmanager
+def span(stage: str) -> Iterator[Span]:
+    """stage の所要時間を計測し、トレースが有効なら1レコード書き出す。
+
+    レコードは {"ts", "stage", "parent", "ms", "bytes", "messages"}。parent は同じスレッドで
+    外側にある span の stage。ブロックが例外で抜けた場合は "error": true を付ける。
+    無効時は Span を返すだけなので、常時呼び出してよい。
+    """
+    current = Span(stage)
+    if _trace is None:
+        yield current
+        return
+    stack: list[str] = _local.__dict__.setdefault("stack", [])
+    parent = stack[-1] if stack else None
+    stack.append(stage)
+    started = time.perf_counter()
+    error = False
+    try:
+        yield current
+    except BaseException:
+        error = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        stack.pop()
+        record: dict = {
+            "ts": round(time.time(), 6),
+            "stage": stage,
+            "parent": parent,
+            "ms": round(elapsed * 1000, 3),
+        }
+        if current.bytes is not None:
+            record["bytes"] = current.bytes
+        if current.messages is not None:
+            record["messages"] = current.messages
+        if error:
+            record["error"] = True
+        _write(record)
+
+
+def _write(record: dict) -> None:
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _lock:
+        if _trace is not None:
+            _trace.write(line)
+
+
+# --------------------------------------------------------------------------
+# 集計
+# --------------------------------------------------------------------------
+
+
+@dataclass
+class StageSummary:
+    stage: str
+    count: int
+    p50: float  # ミリ秒
+    p99: float
+    total: float
+    bytes: int
+    messages: int
+
+
+def summarize_trace(path: Path) -> list[StageSummary]:
+    """トレースファイルを stage ごとに集計し、合計時間の長い順に返す。壊れた行は読み飛ばす。"""
+    durations: dict[str, list[float]] = {}
+    volumes: dict[str, list[int]] = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            record = json.loads(line)
+            stage, ms = record["stage"], float(record["ms"])
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            continue
+        durations.setdefault(stage, []).append(ms)
+        volume = volumes.setdefault(stage, [0, 0])
+        volume[0] += record.get("bytes") or 0
+        volume[1] += record.get("messages") or 0
+    result = []
+    for stage, values in durations.items():
+        values.sort()
+        result.append(
+            StageSummary(
+                stage=stage,
+                count=len(values),
+                p50=_percentile(values, 50),
+                p99=_percentile(values, 99),
+                total=sum(values),
+                bytes=volumes[stage][0],
+                messages=volumes[stage][1],
+            )
+        )
+    return sorted(result, key=lambda s: (-s.total, s.stage))
+
+
+def format_summary(summaries: list[StageSummary]) -> list[str]:
+    """summarize_trace の結果を表の行にする。"""
+    width = max([len("stage"), *(len(s.stage) for s in summaries)])
+    lines = [
+        f"{'stage':<{width}} {'count':>7} {'p50 ms':>10} {'p99 ms':>10} {'total ms':>11} "
+        f"{'bytes':>12} {'messages':>9}"
+    ]
+    for s in summaries:
+        lines.append(
+            f"{s.stage:<{width}} {s.count:>7} {s.p50:>10.2f} {s.p99:>10.2f} {s.total:>11.1f} "
+            f"{s.bytes:>12} {s.messages:>9}"
+        )
+    return lines
+
+
+def _percentile(values: list[float], q: float) -> float:
+    """昇順に並んだ values の q パーセンタイル（最近接順位法）。"""
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[rank - 1]
@@ -1,7 +1,10 @@
+import asyncio
 import time
-from collections.abc import Callable
+from collections.abc import Awaitable, Callable
 from typing import TypeVar
 
+from src.metrics import RETRIES
+
 T = TypeVar("T")
 
 
@@ -23,5 +26,26 @@ def with_retry(
         except Exception as exc:
             last_exc = exc
             if attempt < max_attempts - 1:
+                RETRIES.inc()
                 time.sleep(base_delay * (backoff**attempt))
     raise last_exc
+
+
+async def with_retry_async(
+    func: Callable[[], Awaitable[T]],
+    *,
+    max_attempts: int = 3,
+    base_delay: float = 1.0,
+    backoff: float = 2.0,
+) -> T:
+    """with_retry の非同期版。待機中もイベントループをブロックしない。"""
+    last_exc: BaseException = RuntimeError("max_attempts must be >= 1")
+    for attempt in range(max_attempts):
+        try:
+            return await func()
+        except Exception as exc:
+            last_exc = exc
+            if attempt < max_attempts - 1:
+                RETRIES.inc()
+                await asyncio.sleep(base_delay * (backoff**attempt))
+    raise last_exc
@@ -0,0 +1,249 @@
+import math
+import re
+import sqlite3
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from src.message_store import MessageStore
+from src.models import Message
+
+_JST = ZoneInfo("Asia/Tokyo")
+_SPLIT = re.compile(r"[\W_]+")
+_K1 = 1.2
+_B = 0.75
+_MIN_DATE = "0000-00-00"
+_MAX_DATE = "9999-99-99"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    message_id  INTEGER NOT NULL,
+    source_chat INTEGER NOT NULL,
+    date        TEXT    NOT NULL,  -- JST の YYYY-MM-DD
+    ts          REAL    NOT NULL,
+    length      INTEGER NOT NULL,  -- トークン数（BM25 の文書長）
+    text        TEXT    NOT NULL,  -- 本文 + 添付ファイル名
+    PRIMARY KEY (message_id, source_chat)
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term        TEXT    NOT NULL,
+    date        TEXT    NOT NULL,
+    message_id  INTEGER NOT NULL,
+    source_chat INTEGER NOT NULL,
+    tf          INTEGER NOT NULL,
+    PRIMARY KEY (term, date, message_id, source_chat)
+) WITHOUT ROWID;
+"""
+
+
+def normalize(text: str) -> str:
+    """検索用の正規化（NFKC・小文字化）。全角英数と半角カナの表記揺れを吸収する。"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def tokenize(text: str) -> Counter[str]:
+    """文字 bi-gram に分割して出現回数を返す。
+
+    分かち書きのない日本語でも部分一致で引けるよう、記号・空白で区切った各区間を
+    2文字ずつずらして切り出す。1文字だけの区間はその1文字をトークンにする。
+    """
+    counts: Counter[str] = Counter()
+    for run in _SPLIT.split(normalize(text)):
+        if len(run) == 1:
+            counts[run] += 1
+        else:
+            counts.update(run[i:i + 2] for i in range(len(run) - 1))
+    return counts
+
+
+@dataclass
+class SearchResult:
+    date: str
+    message_id: int
+    source_chat: int
+    timestamp: datetime
+    text: str
+    score: float
+
+
+def _document(msg: Message) -> str:
+    """索引対象のテキスト（本文と添付ファイル名）。"""
+    return "\n".join([msg.text, *(a.file_name for a in msg.attachments)])
+
+
+class SearchIndex:
+    """メッセージ本文と添付ファイル名の転置インデックス（SQLite）。
+
+    ポスティングは (term, date, message_id) をキーに持つため、日付で絞った検索は
+    主キーの範囲走査になる。取り込み時に add で差分更新し（編集は古い版の
+    ポスティングを消して入れ直す）、検索は BM25 で順位付けする。
+    """
+
+    def __init__(self, db_path: Path = Path("search.db")):
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def add(self, messages: list[Message]) -> None:
+        """メッセージを索引に追加する。同一 message_id は後勝ちで置き換える。"""
+        latest = {(m.message_id, m.source_chat): m for m in messages}
+        self._conn.execute("BEGIN")
+        try:
+            for msg in latest.values():
+                self._remove(msg.message_id, msg.source_chat)
+                self._insert(msg)
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def import_from(self, source: MessageStore) -> int:
+        """source の全メッセージを索引に取り込み、取り込んだ件数を返す。"""
+        count = 0
+        for date_str in source.dates():
+            messages = source.load(date_str)
+            self.add(messages)
+            count += len(messages)
+        return count
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def search(
+        self,
+        query: str,
+        *,
+        since: str | None = None,
+        until: str | None = None,
+        limit: int = 20,
+    ) -> list[SearchResult]:
+        """query のすべての語を含むメッセージを関連度順に返す。
+
+        空白で区切った語ごとに bi-gram を引いて候補を絞り、正規化した本文に語が
+        そのまま含まれるものだけを残す（bi-gram が離れて現れる誤ヒットを除く）。
+        since / until（YYYY-MM-DD、両端を含む）で日付を絞り込む。
+        1文字だけの語は bi-gram では引けないため、期間内の文書を走査して照合する。
+        """
+        words = [w for w in normalize(query).split() if w]
+        if not words:
+            return []
+        low, high = since or _MIN_DATE, until or _MAX_DATE
+        terms = Counter()
+        for word in words:
+            if len(word) > 1:
+                terms.update(tokenize(word))
+
+        if terms:
+            candidates = self._candidates(list(terms), low, high)
+        else:
+            candidates = {
+                key: {} for key in self._conn.execute(
+                    "SELECT message_id, source_chat FROM docs WHERE date BETWEEN ? AND ?",
+                    (low, high),
+                )
+            }
+        if not candidates:
+            return []
+
+        total, avg_length = self._conn.execute(
+            "SELECT COUNT(*), AVG(length) FROM docs"
+        ).fetchone()
+        idf = {term: self._idf(term, total) for term in terms}
+        results = []
+        for (message_id, chat), tfs in candidates.items():
+            date_str, ts, length, text = self._conn.execute(
+                "SELECT date, ts, length, text FROM docs WHERE message_id = ? AND source_chat = ?",
+                (message_id, chat),
+            ).fetchone()
+            normalized = normalize(text)
+            if not all(w in normalized for w in words):
+                continue
+            norm = _K1 * (1 - _B + _B * length / (avg_length or 1))
+            score = sum(
+                idf[term] * tf * (_K1 + 1) / (tf + norm) for term, tf in tfs.items()
+            )
+            results.append(
+                SearchResult(
+                    date=date_str,
+                    message_id=message_id,
+                    source_chat=chat,
+                    timestamp=datetime.fromtimestamp(ts, _JST),
+                    text=text,
+                    score=score,
+                )
+            )
+        results.sort(key=lambda r: (-r.score, -r.timestamp.timestamp()))
+        return results[:limit]
+
+    def _candidates(
+        self, terms: list[str], low: str, high: str
+    ) -> dict[tuple[int, int], dict[str, int]]:
+        """すべての term を含む文書と、その term ごとの出現回数。出現の少ない term から絞る。"""
+        postings = {
+            term: {
+                (message_id, chat): tf
+                for message_id, chat, tf in self._conn.execute(
+                    "SELECT message_id, source_chat, tf FROM postings"
+                    " WHERE term = ? AND date BETWEEN ? AND ?",
+                    (term, low, high),
+                )
+            }
+            for term in terms
+        }
+        ordered = sorted(terms, key=lambda t: len(postings[t]))
+        keys = set(postings[ordered[0]])
+        for term in ordered[1:]:
+            keys &= postings[term].keys()
+            if not keys:
+                return {}
+        return {key: {t: postings[t][key] for t in terms} for key in keys}
+
+    def _idf(self, term: str, total: int) -> float:
+        (df,) = self._conn.execute(
+            "SELECT COUNT(*) FROM postings WHERE term = ?", (term,)
+        ).fetchone()
+        return math.log(1 + (total - df + 0.5) / (df + 0.5))
+
+    def _remove(self, message_id: int, chat: int) -> None:
+        row = self._conn.execute(
+            "SELECT date, text FROM docs WHERE message_id = ? AND source_chat = ?",
+            (message_id, chat),
+        ).fetchone()
+        if row is None:
+            return
+        date_str, text = row
+        self._conn.executemany(
+            "DELETE FROM postings"
+            " WHERE term = ? AND date = ? AND message_id = ? AND source_chat = ?",
+            [(term, date_str, message_id, chat) for term in tokenize(text)],
+        )
+        self._conn.execute(
+            "DELETE FROM docs WHERE message_id = ? AND source_chat = ?", (message_id, chat)
+        )
+
+    def _insert(self, msg: Message) -> None:
+        text = _document(msg)
+        counts = tokenize(text)
+        date_str = msg.timestamp.astimezone(_JST).date().isoformat()
+        self._conn.execute(
+            "INSERT INTO docs (message_id, source_chat, date, ts, length, text)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                msg.message_id, msg.source_chat, date_str,
+                msg.timestamp.timestamp(), sum(counts.values()), text,
+            ),
+        )
+        self._conn.executemany(
+            "INSERT INTO postings (term, date, message_id, source_chat, tf)"
+            " VALUES (?, ?, ?, ?, ?)",
+            [(term, date_str, msg.message_id, msg.source_chat, tf)
+             for term, tf in counts.items()],
+        )
@@ -0,0 +1,161 @@
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+
+from src.message_store import msg_to_dict
+from src.models import Message
+
+# 1レコード = message_id (int64) + 内容ダイジェスト (int64)。message_id 昇順に並べる
+_RECORD = struct.Struct("<qq")
+
+
+def message_digest(msg: Message) -> int:
+    """メッセージ内容の 64bit ダイジェスト（同一 message_id の編集を区別する）。"""
+    line = json.dumps(msg_to_dict(msg), ensure_ascii=False).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(line, digest_size=8).digest(), "little", signed=True)
+
+
+class _Ids:
+    """レコード列の message_id 部分だけを bisect できるシーケンスとして見せる。"""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+
+    def __len__(self) -> int:
+        return len(self._view) // 2
+
+    def __getitem__(self, index: int) -> int:
+        return self._view[index * 2]
+
+
+class _ChatIndex:
+    """1チャット分の索引ファイル（seen/<chat_id>.idx）を mmap して引く。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+        self._file = path.open("r+b")
+        size = os.fstat(self._file.fileno()).st_size
+        if size % _RECORD.size:
+            # 書き込み途中で落ちた末尾の半端なレコードを捨てる
+            self._file.truncate(size - size % _RECORD.size)
+        self._mm: mmap.mmap | None = None
+        self._view = memoryview(b"").cast("q")
+        self._map()
+
+    def _map(self) -> None:
+        self._unmap()
+        if os.fstat(self._file.fileno()).st_size:
+            self._mm = mmap.mmap(self._file.fileno(), 0)
+            self._view = memoryview(self._mm).cast("q")
+
+    def _unmap(self) -> None:
+        self._view.release()
+        self._view = memoryview(b"").cast("q")
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def close(self) -> None:
+        self._unmap()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return len(self._view) // 2
+
+    def _find(self, message_id: int) -> int:
+        """message_id のレコード位置。なければ -1（O(log n)）。"""
+        ids = _Ids(self._view)
+        i = bisect.bisect_left(ids, message_id)
+        return i if i < len(ids) and ids[i] == message_id else -1
+
+    def get(self, message_id: int) -> int | None:
+        i = self._find(message_id)
+        return self._view[i * 2 + 1] if i >= 0 else None
+
+    def update(self, digests: dict[int, int]) -> None:
+        """message_id → ダイジェストを反映する。
+
+        既知の ID はその場で上書きし、最大 ID より大きい新規 ID は末尾に追記する
+        （Telegram の message_id はチャット内で単調増加するため通常はこれだけで済む）。
+        それ以外の位置への挿入があるときだけファイル全体を並べ直して書き直す。
+        """
+        last = self._view[-2] if len(self) else None
+        appends: list[tuple[int, int]] = []
+        needs_rewrite = False
+        for message_id, digest in sorted(digests.items()):
+            i = self._find(message_id)
+            if i >= 0:
+                self._view[i * 2 + 1] = digest
+            elif last is None or message_id > last:
+                appends.append((message_id, digest))
+                last = message_id
+            else:
+                needs_rewrite = True
+        if needs_rewrite:
+            self._rewrite(digests)
+        elif appends:
+            self._unmap()
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(b"".join(_RECORD.pack(*r) for r in appends))
+            self._file.flush()
+            self._map()
+
+    def _rewrite(self, digests: dict[int, int]) -> None:
+        records = {self._view[i]: self._view[i + 1] for i in range(0, len(self._view), 2)}
+        records.update(digests)
+        self._unmap()
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_bytes(b"".join(_RECORD.pack(k, records[k]) for k in sorted(records)))
+        os.replace(tmp, self.path)
+        self._file.close()
+        self._file = self.path.open("r+b")
+        self._map()
+
+
+class SeenIndex:
+    """取り込み済みメッセージの永続索引。チャットごとに (message_id, 内容ダイジェスト) を
+    message_id 順の固定長レコードで保持し、mmap して二分探索で引く。
+
+    日次ファイルを開く前に、内容まで同一の重複 Update（再送・再取得）を落とすために使う。
+    同一 message_id でも内容が違うもの（編集）は通す。索引は書き込みが完了した後に
+    更新するため、更新前に落ちても重複が MessageStore 側の比較まで届くだけで済む。
+    """
+
+    def __init__(self, index_dir: Path = Path("seen")):
+        self.index_dir = index_dir
+        self._chats: dict[int, _ChatIndex] = {}
+
+    def _chat(self, chat_id: int) -> _ChatIndex:
+        index = self._chats.get(chat_id)
+        if index is None:
+            index = self._chats[chat_id] = _ChatIndex(self.index_dir / f"{chat_id}.idx")
+        return index
+
+    def contains(self, chat_id: int, message_id: int) -> bool:
+        return self._chat(chat_id).get(message_id) is not None
+
+    def unseen(self, messages: list[Message]) -> list[Message]:
+        """索引に同一内容で記録されていないメッセージ（新規・編集）だけを返す。"""
+        return [
+            m for m in messages
+            if self._chat(m.source_chat).get(m.message_id) != message_digest(m)
+        ]
+
+    def add(self, messages: list[Message]) -> None:
+        """書き込み済みのメッセージを索引に反映する（同一 ID は後勝ち）。"""
+        by_chat: dict[int, dict[int, int]] = {}
+        for m in messages:
+            by_chat.setdefault(m.source_chat, {})[m.message_id] = message_digest(m)
+        for chat_id, digests in by_chat.items():
+            self._chat(chat_id).update(digests)
+
+    def close(self) -> None:
+        for index in self._chats.values():
+            index.close()
+        self._chats.clear()
@@ -0,0 +1,236 @@
+import sqlite3
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from src.message_store import MessageStore
+from src.models import Attachment, Message
+from src.wal import WriteGroup
+
+_JST = ZoneInfo("Asia/Tokyo")
+_ITER_CHUNK = 500  # iter_messages で一度に取り出す行数
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    message_id  INTEGER NOT NULL,
+    source_chat INTEGER NOT NULL,
+    date        TEXT    NOT NULL,  -- JST の YYYY-MM-DD
+    ts          REAL    NOT NULL,  -- UNIX 時刻（範囲検索・並び替え用）
+    timestamp   TEXT    NOT NULL,  -- ISO 8601（タイムゾーン付きで復元するため）
+    text        TEXT    NOT NULL,
+    PRIMARY KEY (message_id, source_chat)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_date_ts ON messages (date, ts);
+CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages (ts);
+CREATE TABLE IF NOT EXISTS attachments (
+    message_id  INTEGER NOT NULL,
+    source_chat INTEGER NOT NULL,
+    position    INTEGER NOT NULL,
+    file_id     TEXT    NOT NULL,
+    file_name   TEXT    NOT NULL,
+    media_type  TEXT    NOT NULL,
+    file_unique_id TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (message_id, source_chat, position)
+);
+"""
+
+
+class SqliteMessageStore(MessageStore):
+    """メッセージを SQLite に保持する MessageStore。
+
+    日ごとの読み込みは (date, ts) インデックスの範囲走査になる。同一 message_id の
+    書き込みは upsert で上書きし、merge_messages の後勝ちと同じ結果になる。
+    transaction() 内の書き込みは1トランザクションにまとめてコミットする。
+    """
+
+    def __init__(self, db_path: Path = Path("messages.db")):
+        super().__init__(db_path.parent)
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate_schema()
+        self._in_transaction = False
+
+    def _migrate_schema(self) -> None:
+        """file_unique_id 列がない古いデータベースに列を足す。"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(attachments)")}
+        if "file_unique_id" not in columns:
+            self._conn.execute(
+                "ALTER TABLE attachments ADD COLUMN file_unique_id TEXT NOT NULL DEFAULT ''"
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def load(self, date_str: str) -> list[Message]:
+        rows = self._conn.execute(
+            "SELECT message_id, source_chat, timestamp, text FROM messages"
+            " WHERE date = ? ORDER BY ts, rowid",
+            (date_str,),
+        ).fetchall()
+        attachments = self._load_attachments(date_str)
+        return [
+            Message(
+                message_id=message_id,
+                timestamp=datetime.fromisoformat(timestamp),
+                text=text,
+                source_chat=source_chat,
+                attachments=attachments.get((message_id, source_chat), []),
+            )
+            for message_id, source_chat, timestamp, text in rows
+        ]
+
+    def iter_messages(
+        self, start: datetime, end: datetime, chat_id: int | None = None
+    ) -> Iterator[Message]:
+        """timestamp が start 以上 end 未満のメッセージを timestamp 順に1件ずつ返す。
+
+        日ごとに読み込まず、ts インデックス（idx_messages_ts）の範囲走査で
+        _ITER_CHUNK 行ずつ取り出す。添付はチャンクの ts 範囲でまとめて引く。
+        """
+        low, high = (
+            (t if t.tzinfo else t.replace(tzinfo=_JST)).timestamp() for t in (start, end)
+        )
+        query = (
+            "SELECT message_id, source_chat, ts, timestamp, text FROM messages"
+            " WHERE ts >= ? AND ts < ?"
+        )
+        params: tuple = (low, high)
+        if chat_id is not None:
+            query += " AND source_chat = ?"
+            params += (chat_id,)
+        cursor = self._conn.execute(query + " ORDER BY ts, rowid", params)
+        while rows := cursor.fetchmany(_ITER_CHUNK):
+            attachments = self._range_attachments(rows[0][2], rows[-1][2])
+            for message_id, source_chat, _, timestamp, text in rows:
+                yield Message(
+                    message_id=message_id,
+                    timestamp=datetime.fromisoformat(timestamp),
+                    text=text,
+                    source_chat=source_chat,
+                    attachments=attachments.get((message_id, source_chat), []),
+                )
+
+    def _write_changed(
+        self,
+        date_str: str,
+        changed: list[Message],
+        merged: list[Message] | None,
+        group: WriteGroup | None,
+    ) -> None:
+        """group は使わない。SQLite 自身のトランザクション（WAL モード）でコミットする。"""
+        with self.transaction():
+            self._upsert(date_str, changed)
+
+    def save(self, date_str: str, messages: list[Message]) -> None:
+        with self.transaction():
+            self._conn.execute(
+                "DELETE FROM attachments WHERE (message_id, source_chat) IN"
+                " (SELECT message_id, source_chat FROM messages WHERE date = ?)",
+                (date_str,),
+            )
+            self._conn.execute("DELETE FROM messages WHERE date = ?", (date_str,))
+            self._upsert(date_str, messages)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        if self._in_transaction:
+            yield
+            return
+        self._in_transaction = True
+        self._conn.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        else:
+            self._conn.execute("COMMIT")
+        finally:
+            self._in_transaction = False
+
+    def compact(self, date_str: str) -> None:
+        """upsert で常に1 message_id 1行のため、畳む必要はない。"""
+
+    def dates(self) -> list[str]:
+        rows = self._conn.execute("SELECT DISTINCT date FROM messages ORDER BY date")
+        return [date for (date,) in rows]
+
+    def import_from(self, source: MessageStore) -> int:
+        """source の全日付を取り込み、取り込んだ日数を返す（JSON Lines からの移行用）。"""
+        dates = source.dates()
+        with self.transaction():
+            for date_str in dates:
+                self._upsert(date_str, source.load(date_str))
+        return len(dates)
+
+    def _upsert(self, date_str: str, messages: list[Message]) -> None:
+        # 同一バッチ内の重複は後勝ちで1件にしてから書く（添付の主キー衝突を防ぐ）
+        messages = list({(m.message_id, m.source_chat): m for m in messages}.values())
+        self._conn.executemany(
+            "INSERT INTO messages (message_id, source_chat, date, ts, timestamp, text)"
+            " VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (message_id, source_chat) DO UPDATE SET"
+            " date = excluded.date, ts = excluded.ts,"
+            " timestamp = excluded.timestamp, text = excluded.text",
+            [
+                (
+                    m.message_id, m.source_chat, date_str,
+                    m.timestamp.timestamp(), m.timestamp.isoformat(), m.text,
+                )
+                for m in messages
+            ],
+        )
+        self._conn.executemany(
+            "DELETE FROM attachments WHERE message_id = ? AND source_chat = ?",
+            [(m.message_id, m.source_chat) for m in messages],
+        )
+        self._conn.executemany(
+            "INSERT INTO attachments"
+            " (message_id, source_chat, position, file_id, file_name, media_type,"
+            " file_unique_id)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    m.message_id, m.source_chat, i,
+                    a.file_id, a.file_name, a.media_type, a.file_unique_id,
+                )
+                for m in messages
+                for i, a in enumerate(m.attachments)
+            ],
+        )
+
+    def _load_attachments(self, date_str: str) -> dict[tuple[int, int], list[Attachment]]:
+        return self._attachments_where("m.date = ?", (date_str,))
+
+    def _range_attachments(
+        self, low: float, high: float
+    ) -> dict[tuple[int, int], list[Attachment]]:
+        """ts が low 以上 high 以下のメッセージの添付。"""
+        return self._attachments_where("m.ts >= ? AND m.ts <= ?", (low, high))
+
+    def _attachments_where(
+        self, condition: str, params: tuple
+    ) -> dict[tuple[int, int], list[Attachment]]:
+        rows = self._conn.execute(
+            "SELECT a.message_id, a.source_chat, a.file_id, a.file_name, a.media_type,"
+            " a.file_unique_id FROM attachments a JOIN messages m"
+            " ON a.message_id = m.message_id AND a.source_chat = m.source_chat"
+            f" WHERE {condition} ORDER BY a.position",
+            params,
+        )
+        result: dict[tuple[int, int], list[Attachment]] = {}
+        for message_id, source_chat, file_id, file_name, media_type, file_unique_id in rows:
+            result.setdefault((message_id, source_chat), []).append(
+                Attachment(
+                    file_id=file_id,
+                    file_name=file_name,
+                    media_type=media_type,
+                    file_unique_id=file_unique_id,
+                )
+            )
+        return result
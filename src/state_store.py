@@ -1,10 +1,12 @@
 import json
+import os
 import shutil
 from datetime import datetime
 from pathlib import Path
 from zoneinfo import ZoneInfo
 
 from src.models import State
+from src.wal import WriteGroup
 
 _DEFAULT_DT = datetime(2000, 1, 1, tzinfo=ZoneInfo("Asia/Tokyo"))
 
@@ -14,14 +16,27 @@ class StateStore:
         self.state_file = state_file
         self.backup_file = state_file.parent / (state_file.name + ".bak")
 
-    def save(self, state: State) -> None:
-        if self.state_file.exists():
-            shutil.copy2(self.state_file, self.backup_file)
+    def save(self, state: State, group: WriteGroup | None = None) -> None:
+        """state を保存する。直前の内容は .bak に残す。
+
+        group が渡された場合は書き込みをグループに積み、WriteAheadLog.commit で
+        メッセージ・日記と一緒に反映する。それ以外は一時ファイル経由で原子的に書き換える。
+        """
         data = {
             "last_update_id": state.last_update_id,
             "last_run_at": state.last_run_at.isoformat(),
         }
-        self.state_file.write_text(json.dumps(data, indent=2))
+        content = json.dumps(data, indent=2)
+        if group is not None:
+            if self.state_file.exists():
+                group.write(self.backup_file, self.state_file.read_text())
+            group.write(self.state_file, content)
+            return
+        if self.state_file.exists():
+            shutil.copy2(self.state_file, self.backup_file)
+        tmp = self.state_file.with_name(self.state_file.name + ".tmp")
+        tmp.write_text(content)
+        os.replace(tmp, self.state_file)
 
     def load(self) -> State:
         state = self._try_load(self.state_file)
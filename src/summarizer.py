@@ -0,0 +1,116 @@
+import heapq
+import math
+from collections import Counter
+
+from src.models import Message
+from src.search_index import tokenize
+
+_DAMPING = 0.85
+_MAX_ITERATIONS = 50
+_TOLERANCE = 1e-6
+_MAX_BULLET_CHARS = 80
+_MAX_NEIGHBORS = 10  # 類似度グラフで各メッセージが残す辺の数
+_MAX_POSTINGS = 40  # 類似度を数えるときに1語あたりで組にするメッセージの数
+
+
+def summarize(messages: list[Message], max_items: int = 5, min_items: int = 3) -> list[str]:
+    """日のメッセージから要点となる本文を抜き出し、要約の箇条書きにする。
+
+    各メッセージを文字 bi-gram の TF-IDF ベクトルにし、コサイン類似度で重み付けした
+    グラフ上の TextRank で得点を付ける（他のメッセージと話題を多く共有するものが高い）。
+    上位 min_items〜max_items 件（メッセージ10件ごとに1件）を時系列順で返す。
+    max_items 件以下の日はタイムラインそのものが要約になるため空リストを返す。
+    """
+    candidates = [m for m in messages if m.text.strip()]
+    count = min(summary_size(len(messages), max_items, min_items), len(candidates))
+    if count == 0:
+        return []
+    scores = _textrank(_tfidf_vectors([m.text for m in candidates]))
+    top = sorted(range(len(candidates)), key=lambda i: (-scores[i], i))[:count]
+    return [_bullet(candidates[i].text) for i in sorted(top)]
+
+
+def summary_size(n_messages: int, max_items: int = 5, min_items: int = 3) -> int:
+    """n_messages 件の日に summarize が返す箇条書きの件数（本文のあるメッセージが足りる場合）。"""
+    if n_messages <= max_items:
+        return 0
+    return min(max_items, max(min_items, n_messages // 10))
+
+
+def _tfidf_vectors(texts: list[str]) -> list[dict[str, float]]:
+    """本文ごとの L2 正規化済み TF-IDF ベクトル（疎ベクトル）。"""
+    counts = [tokenize(text) for text in texts]
+    df: Counter[str] = Counter()
+    for c in counts:
+        df.update(c.keys())
+    n = len(texts)
+    idf = {term: math.log((1 + n) / (1 + d)) + 1 for term, d in df.items()}
+    vectors = []
+    for c in counts:
+        weights = {term: tf * idf[term] for term, tf in c.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        vectors.append({term: w / norm for term, w in weights.items()})
+    return vectors
+
+
+def _similarities(vectors: list[dict[str, float]]) -> list[dict[int, float]]:
+    """コサイン類似度の隣接リスト。語を共有する組だけを転置インデックスから数える。
+
+    半数を超えるメッセージに出る語（「した」など）は区別に寄与しないうえ組の数が
+    二乗で増えるため数えない。それ以下でも組にするのは語の重みが大きい _MAX_POSTINGS 件の
+    メッセージだけにし、1語あたりの組の数を件数によらず一定に抑える。
+    各メッセージは類似度の高い _MAX_NEIGHBORS 件への辺だけを残し（どちらか一方の上位に
+    入る組は両向きに残す）、件数の多い日でも辺の数を線形に抑える。
+    """
+    postings: dict[str, list[tuple[int, float]]] = {}
+    for i, vector in enumerate(vectors):
+        for term, weight in vector.items():
+            postings.setdefault(term, []).append((i, weight))
+    limit = max(2, len(vectors) // 2)
+    edges: list[dict[int, float]] = [{} for _ in vectors]
+    for entries in postings.values():
+        if len(entries) > limit:
+            continue
+        if len(entries) > _MAX_POSTINGS:
+            entries = heapq.nlargest(_MAX_POSTINGS, entries, key=lambda e: e[1])
+        for a, (i, wi) in enumerate(entries):
+            row = edges[i]
+            for j, wj in entries[a + 1:]:
+                row[j] = row.get(j, 0.0) + wi * wj
+    for i, row in enumerate(edges):
+        for j, weight in row.items():
+            if j > i:
+                edges[j][i] = weight
+    pruned: list[dict[int, float]] = [{} for _ in vectors]
+    for i, row in enumerate(edges):
+        for j in heapq.nlargest(_MAX_NEIGHBORS, row, key=row.__getitem__):
+            pruned[i][j] = pruned[j][i] = row[j]
+    return pruned
+
+
+def _textrank(vectors: list[dict[str, float]]) -> list[float]:
+    """重み付き PageRank（べき乗法）。"""
+    n = len(vectors)
+    edges = _similarities(vectors)
+    out_weight = [sum(row.values()) for row in edges]
+    # 隣接 j から i へ渡る割合（辺の重み / j の重みの合計）を先に求めておく
+    incoming = [[(j, w / out_weight[j]) for j, w in row.items()] for row in edges]
+    scores = [1.0 / n] * n
+    for _ in range(_MAX_ITERATIONS):
+        updated = [
+            (1 - _DAMPING) / n + _DAMPING * sum(scores[j] * share for j, share in links)
+            for links in incoming
+        ]
+        delta = sum(abs(a - b) for a, b in zip(updated, scores))
+        scores = updated
+        if delta < _TOLERANCE:
+            break
+    return scores
+
+
+def _bullet(text: str) -> str:
+    """本文を1行にまとめ、長いものは末尾を省略する。"""
+    line = " / ".join(part.strip() for part in text.strip().splitlines() if part.strip())
+    if len(line) > _MAX_BULLET_CHARS:
+        line = line[:_MAX_BULLET_CHARS - 1] + "…"
+    return line
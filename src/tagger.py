@@ -0,0 +1,135 @@
+import hashlib
+import json
+import re
+import unicodedata
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from src.models import Message
+
+# 本文に直接書かれたハッシュタグ（#idea など）はそのままタグにする
+_HASHTAG = re.compile(r"(?<![\w#])#(\w+)")
+
+
+@dataclass
+class TagRule:
+    keywords: list[str] = field(default_factory=list)
+    patterns: list[str] = field(default_factory=list)  # 正規表現
+
+
+DEFAULT_RULES: dict[str, TagRule] = {
+    "idea": TagRule(keywords=["アイデア", "アイディア", "思いついた", "ひらめ", "idea"]),
+    "task": TagRule(
+        keywords=["todo", "やること", "タスク", "締め切り", "締切", "しなきゃ", "しないと"]
+    ),
+    "question": TagRule(keywords=["なぜ", "どうして"], patterns=[r"[?？]\s*$"]),
+    "仕事": TagRule(keywords=["会議", "打ち合わせ", "ミーティング", "仕事", "出張"]),
+    "健康": TagRule(keywords=["運動", "ジム", "ランニング", "睡眠", "体調", "病院"]),
+    "学習": TagRule(keywords=["勉強", "読書", "本を読", "学習", "講義"]),
+}
+
+
+def load_rules(path: Path) -> dict[str, TagRule]:
+    """タグ語彙を JSON（{"タグ名": {"keywords": [...], "patterns": [...]}}）から読み込む。"""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return {
+        tag: TagRule(keywords=rule.get("keywords", []), patterns=rule.get("patterns", []))
+        for tag, rule in data.items()
+    }
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+class _Automaton:
+    """複数キーワードを1回の走査で照合する Aho-Corasick オートマトン。"""
+
+    def __init__(self, keywords: dict[str, set[str]]):
+        self._goto: list[dict[str, int]] = [{}]
+        outputs: list[set[str]] = [set()]
+        for keyword, tags in keywords.items():
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = self._goto[state][ch] = len(self._goto)
+                    self._goto.append({})
+                    outputs.append(set())
+                state = nxt
+            outputs[state] |= tags
+
+        # 幅優先で失敗遷移を張り、失敗先の出力を引き継ぐ
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                outputs[nxt] |= outputs[self._fail[nxt]]
+                queue.append(nxt)
+        self._outputs = [frozenset(o) for o in outputs]
+
+    def search(self, text: str) -> set[str]:
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        found: set[str] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if outputs[state]:
+                found |= outputs[state]
+        return found
+
+
+class Tagger:
+    """タグ語彙をまとめてコンパイルし、メッセージごとにタグを付ける。
+
+    キーワードは1つの Aho-Corasick オートマトンにまとめ、正規表現はパターンごとに
+    コンパイルしておく（すでに付いたタグのパターンは照合しない）。
+    照合は NFKC 正規化・小文字化した本文に対して行う。
+    """
+
+    def __init__(self, rules: dict[str, TagRule] | None = None):
+        rules = DEFAULT_RULES if rules is None else rules
+        # 語彙のハッシュ。語彙が変わったら再構築で全日付を描き直すために使う
+        self.digest = hashlib.sha256(
+            json.dumps(
+                {tag: [rule.keywords, rule.patterns] for tag, rule in rules.items()},
+                ensure_ascii=False,
+                sort_keys=True,
+            ).encode("utf-8")
+        ).hexdigest()
+        keywords: dict[str, set[str]] = {}
+        for tag, rule in rules.items():
+            for keyword in rule.keywords:
+                keywords.setdefault(_normalize(keyword), set()).add(tag)
+        self._automaton = _Automaton(keywords)
+        # 1つの選択パターンにまとめると重なる一致を取りこぼし、後方参照の番号もずれるため
+        # 正規表現はパターンごとにコンパイルする
+        self._patterns = [
+            (tag, re.compile(p, re.MULTILINE)) for tag, rule in rules.items() for p in rule.patterns
+        ]
+
+    def tag_message(self, msg: Message) -> set[str]:
+        """メッセージ本文に当てはまるタグ名（# なし）を返す。"""
+        text = _normalize(msg.text)
+        tags = self._automaton.search(text)
+        for tag, pattern in self._patterns:
+            if tag not in tags and pattern.search(text):
+                tags.add(tag)
+        tags.update(m.group(1) for m in _HASHTAG.finditer(text))
+        return tags
+
+    def tag(self, messages: list[Message]) -> list[str]:
+        """日のタグ（"#idea" 形式）を、最初に現れたメッセージの順・同順位は名前順で返す。"""
+        result: list[str] = []
+        for msg in messages:
+            for tag in sorted(self.tag_message(msg) - {t[1:] for t in result}):
+                result.append(f"#{tag}")
+        return result
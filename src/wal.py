@@ -0,0 +1,253 @@
+import json
+import os
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+_DEFAULT_CHECKPOINT_EVERY = 16
+_BOOT_ID_PATH = Path("/proc/sys/kernel/random/boot_id")
+
+
+class WalLockedError(Exception):
+    """別のプロセスが WAL の排他ロックを持っている。"""
+
+
+class WriteGroup:
+    """1回のポーリングで行うファイル書き込みをまとめたもの。WriteAheadLog.commit で反映する。"""
+
+    def __init__(self) -> None:
+        self.ops: list[dict] = []
+        self._sizes: dict[Path, int] = {}
+
+    def write(self, path: Path, content: str) -> None:
+        """path の内容を content で置き換える。"""
+        self.ops.append({"op": "write", "path": str(path), "data": content})
+        self._sizes[path] = len(content.encode("utf-8"))
+
+    def append(self, path: Path, data: str, offset: int | None = None) -> None:
+        """path の末尾に data を追記する。追記位置を記録するため再実行しても二重にならない。
+
+        offset を指定すると、その位置より後ろを data で置き換える（末尾の書き直し）。
+        指定しない場合、commit までに path が短く書き直されていれば（compact など）
+        その末尾に追記する。
+        """
+        op = {"op": "append", "path": str(path), "offset": offset, "data": data}
+        if offset is None:
+            offset = op["offset"] = self.size(path)
+            op["at_end"] = True
+        self.ops.append(op)
+        self._sizes[path] = offset + len(data.encode("utf-8"))
+
+    def size(self, path: Path) -> int:
+        """このグループを反映した後の path のサイズ（バイト）。"""
+        if path in self._sizes:
+            return self._sizes[path]
+        return path.stat().st_size if path.exists() else 0
+
+
+class WriteAheadLog:
+    """メッセージ・日記・state の書き込みをグループ単位でクラッシュ整合にする先行書き込みログ。
+
+    commit ではグループ全体を WAL に1行で追記して1回だけ fsync し（コミット点）、
+    その後で各ファイルへ fsync なしで反映する（書き換えは一時ファイル + rename）。
+    反映済みファイルは checkpoint_every グループごとにまとめて fsync し、WAL を空にする。
+
+    反映を終えたグループの番号は起動 ID（boot_id）と一緒に <path>.applied に記録する。
+    recover は WAL に残るコミット済みグループのうち、同じ起動中に反映済みと記録された
+    ものは飛ばし（ページキャッシュに残っているため）、それ以降だけを再適用する。
+    OS ごと落ちた後（起動 ID が異なる）は fsync 前の反映が失われうるため全グループを
+    再適用する。末尾の途切れた行（未完了グループ）は捨てる。
+    recover は <path>.lock の排他ロックを取り、close まで保持する。
+    """
+
+    def __init__(
+        self,
+        path: Path = Path("state.wal"),
+        checkpoint_every: int = _DEFAULT_CHECKPOINT_EVERY,
+    ):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.applied_path = path.with_name(path.name + ".applied")
+        self.lock_path = path.with_name(path.name + ".lock")
+        self._groups = 0
+        self._seq = 0
+        self._dirty: set[Path] = set()
+        self._lock_file = None
+
+    def begin(self) -> WriteGroup:
+        return WriteGroup()
+
+    def commit(self, group: WriteGroup) -> None:
+        if not group.ops:
+            return
+        created = not self.path.exists()
+        self._seq += 1
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps({"seq": self._seq, "ops": group.ops}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if created:
+            _fsync_dir(self.path.parent)
+        self._apply(group.ops, committing=True)
+        self._mark_applied(self._seq)
+        self._groups += 1
+        if self._groups >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """反映済みファイルを fsync し、WAL を削除する。"""
+        for path in self._dirty:
+            if path.exists():
+                with path.open("rb") as f:
+                    os.fsync(f.fileno())
+        for directory in {p.parent for p in self._dirty}:
+            _fsync_dir(directory)
+        self._dirty.clear()
+        self._groups = 0
+        self._seq = 0
+        # 記録を先に消す（WAL だけが残った場合は全グループを再適用するので安全側になる）
+        self.applied_path.unlink(missing_ok=True)
+        self.path.unlink(missing_ok=True)
+
+    def lock(self) -> None:
+        """<path>.lock の排他ロックを取る。取れなければ WalLockedError。
+
+        ロックは close まで保持する。fcntl のない OS では何もしない。
+        """
+        if self._lock_file is not None or fcntl is None:
+            return
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        f = self.lock_path.open("a")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            raise WalLockedError(f"{self.path} is locked by another process") from None
+        self._lock_file = f
+
+    def close(self) -> None:
+        """反映済みのグループがあればチェックポイントし、ロックを手放す。"""
+        if self._groups:
+            self.checkpoint()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def recover(self) -> int:
+        """排他ロックを取り、WAL に残る未反映のコミット済みグループを再適用する。
+
+        再適用したグループ数を返す。同じ起動中に反映済みと記録されたグループは飛ばす。
+        """
+        self.lock()
+        if not self.path.exists():
+            self.applied_path.unlink(missing_ok=True)
+            return 0
+        applied = self._load_applied()
+        replayed = 0
+        for line in self.path.read_text(encoding="utf-8").splitlines(keepends=True):
+            if not line.endswith("\n"):
+                break  # fsync 前にクラッシュした未完了グループ
+            try:
+                record = json.loads(line)
+                ops = record["ops"]
+            except (json.JSONDecodeError, KeyError):
+                break
+            if record.get("seq", applied + 1) <= applied:
+                # 反映済み。チェックポイントで fsync するため対象には加える
+                self._dirty.update(Path(op["path"]) for op in ops)
+                continue
+            self._apply(ops)
+            replayed += 1
+        self.checkpoint()
+        return replayed
+
+    def _mark_applied(self, seq: int) -> None:
+        """seq までのグループを反映済みとして記録する（fsync はしない）。"""
+        boot_id = _boot_id()
+        if boot_id is None:
+            return
+        tmp = self.applied_path.with_name(self.applied_path.name + ".tmp")
+        tmp.write_text(json.dumps({"seq": seq, "boot_id": boot_id}))
+        os.replace(tmp, self.applied_path)
+
+    def _load_applied(self) -> int:
+        """同じ起動中に記録された反映済みのグループ番号。記録がなければ 0。"""
+        try:
+            data = json.loads(self.applied_path.read_text())
+            seq = int(data["seq"])
+        except (OSError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return 0
+        boot_id = _boot_id()
+        if boot_id is None or data.get("boot_id") != boot_id:
+            return 0
+        return seq
+
+    def _apply(self, ops: list[dict], committing: bool = False) -> None:
+        """ops をファイルへ反映する。
+
+        committing は commit からの初回反映。追記先が記録した位置より短く書き直されていても、
+        末尾への追記（at_end）はまだどこにも書いていないため、現在の末尾に書く。
+        recover では反映済みの内容が書き直しに含まれている可能性があるため書かない。
+        """
+        for op in ops:
+            path = Path(op["path"])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if op["op"] == "write":
+                tmp = path.with_name(path.name + ".wal-tmp")
+                tmp.write_text(op["data"], encoding="utf-8")
+                os.replace(tmp, path)
+            else:
+                _apply_append(
+                    path,
+                    op["offset"],
+                    op["data"].encode("utf-8"),
+                    at_end=committing and op.get("at_end", False),
+                )
+            self._dirty.add(path)
+
+
+def _apply_append(path: Path, offset: int, data: bytes, at_end: bool = False) -> None:
+    """offset の位置に data を書く。反映済み・別の書き換えが入った場合は何もしない。
+
+    at_end なら、追記先が offset より短く書き直されていても現在の末尾に書く。
+    """
+    size = path.stat().st_size if path.exists() else 0
+    if size < offset:
+        if not at_end:
+            return  # 追記先が別の内容に置き換えられている（compact など）
+        offset = size
+    path.touch()
+    with path.open("r+b") as f:
+        f.seek(offset)
+        if f.read(len(data)) == data:
+            return  # 反映済み
+        if size > offset + len(data):
+            return  # 後から別の書き込みが入っている
+        f.seek(offset)
+        f.truncate()
+        f.write(data)
+
+
+def _boot_id() -> str | None:
+    """OS の起動ごとに変わる ID。取得できない OS では None。"""
+    try:
+        return _BOOT_ID_PATH.read_text().strip() or None
+    except OSError:
+        return None
+
+
+def _fsync_dir(directory: Path) -> None:
+    """ディレクトリエントリ（作成・rename）を永続化する。対応しない OS では何もしない。"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
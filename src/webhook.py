@@ -0,0 +1,83 @@
+import json
+import queue
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_DEFAULT_QUEUE_SIZE = 1000
+_SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """Telegram から push された Update を受け取り、上限付きキューへ積む HTTP サーバ。
+
+    キューが満杯のときは 429 を返し、送信側（Telegram）に再送させる（バックプレッシャ）。
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        *,
+        secret_token: str | None = None,
+        queue_size: int = _DEFAULT_QUEUE_SIZE,
+    ):
+        super().__init__(address, _WebhookHandler)
+        self.secret_token = secret_token
+        self.updates: queue.Queue[dict] = queue.Queue(maxsize=queue_size)
+
+    def next_batch(self, max_size: int, wait: float) -> list[dict]:
+        """Update をまとめて取り出す。
+
+        最初の1件を最大 wait 秒待ち、届いたら同じ時間枠内に溜まった分を
+        max_size 件まで取り出す。何も届かなければ空リストを返す。
+        """
+        deadline = time.monotonic() + wait
+        try:
+            batch = [self.updates.get(timeout=wait)]
+        except queue.Empty:
+            return []
+        while len(batch) < max_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.updates.get(timeout=max(remaining, 0)))
+            except queue.Empty:
+                break
+        return batch
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    server: WebhookServer
+
+    def do_POST(self):
+        secret = self.server.secret_token
+        if secret is not None and self.headers.get(_SECRET_HEADER) != secret:
+            self._respond(403)
+            return
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+            payload = json.loads(self.rfile.read(length))
+        except (ValueError, json.JSONDecodeError):
+            self._respond(400)
+            return
+
+        # Telegram は1リクエスト1 Update だが、記録済みペイロードの再送用にリストも受け付ける
+        updates = payload if isinstance(payload, list) else [payload]
+        for update in updates:
+            try:
+                self.server.updates.put_nowait(update)
+            except queue.Full:
+                # 途中まで積んだ分が再送で重複しても message_id マージで冪等になる
+                self._respond(429, retry_after=1)
+                return
+        self._respond(200)
+
+    def _respond(self, status: int, retry_after: int | None = None) -> None:
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.day_batch import DayBatch
+from src.message_store import MessageStore, msg_to_dict
+from src.models import NO_ATTACHMENTS, Attachment, FrozenMessage, Message
+
+JST = ZoneInfo("Asia/Tokyo")
+_DT = datetime(2026, 2, 22, 12, 0, tzinfo=JST)
+
+
+def _msg(message_id=1, text="hello", dt=_DT, attachments=None):
+    return Message(
+        message_id=message_id,
+        timestamp=dt,
+        text=text,
+        source_chat=-1001234,
+        attachments=attachments or [],
+    )
+
+
+_PHOTO = Attachment(file_id="f1", file_name="photo.jpg", media_type="photo")
+
+
+# --------------------------------------------------------------------------
+# FrozenMessage
+# --------------------------------------------------------------------------
+
+
+class TestFrozenMessage:
+    def test_roundtrip(self):
+        msg = _msg(attachments=[_PHOTO])
+        assert FrozenMessage.from_message(msg).to_message() == msg
+
+    def test_shares_empty_attachments(self):
+        a = FrozenMessage.from_message(_msg(1))
+        b = FrozenMessage.from_message(_msg(2))
+        assert a.attachments is NO_ATTACHMENTS
+        assert b.attachments is NO_ATTACHMENTS
+
+    def test_is_immutable_and_slotted(self):
+        frozen = FrozenMessage.from_message(_msg())
+        assert not hasattr(frozen, "__dict__")
+        with pytest.raises(AttributeError):
+            frozen.text = "changed"
+
+    def test_to_message_returns_independent_list(self):
+        frozen = FrozenMessage.from_message(_msg())
+        frozen.to_message().attachments.append(_PHOTO)
+        assert frozen.to_message().attachments == []
+
+
+# --------------------------------------------------------------------------
+# DayBatch
+# --------------------------------------------------------------------------
+
+
+class TestDayBatch:
+    def test_roundtrip_preserves_messages(self):
+        msgs = [
+            _msg(1, "朝のメモ"),
+            _msg(2, "", attachments=[_PHOTO]),
+            _msg(3, "utc", dt=datetime(2026, 2, 22, 3, 0, tzinfo=timezone.utc)),
+        ]
+        restored = DayBatch.from_messages(msgs).to_messages()
+        assert restored == msgs
+        # タイムゾーン表記も保持される（messages/ に書き戻しても同じ行になる）
+        assert [msg_to_dict(m) for m in restored] == [msg_to_dict(m) for m in msgs]
+
+    def test_columns(self):
+        batch = DayBatch.from_messages([_msg(1), _msg(2)])
+        assert len(batch) == 2
+        assert list(batch.message_ids) == [1, 2]
+        assert list(batch.chat_ids) == [-1001234, -1001234]
+        assert batch.timestamps[0] == _DT.timestamp()
+
+    def test_text_access_without_building_message(self):
+        batch = DayBatch.from_messages([_msg(1, "一"), _msg(2, ""), _msg(3, "三")])
+        assert [batch.text(i) for i in range(3)] == ["一", "", "三"]
+
+    def test_indexing(self):
+        batch = DayBatch.from_messages([_msg(1), _msg(2)])
+        assert batch[-1].message_id == 2
+        with pytest.raises(IndexError):
+            batch[2]
+
+    def test_accepts_frozen_messages(self):
+        frozen = FrozenMessage.from_message(_msg(attachments=[_PHOTO]))
+        assert list(DayBatch.from_messages([frozen])) == [frozen]
+
+    def test_nbytes_grows_with_content(self):
+        batch = DayBatch()
+        empty = batch.nbytes()
+        batch.append(_msg(text="abc"))
+        assert batch.nbytes() > empty
+
+    def test_load_batch_from_store(self, tmp_path):
+        store = MessageStore(tmp_path)
+        store.append("2026-02-22", [_msg(1), _msg(2)])
+        assert list(store.load_batch("2026-02-22").message_ids) == [1, 2]
@@ -3,7 +3,7 @@ from unittest.mock import MagicMock, patch
 import httpx
 import pytest
 
-from src.fetcher import FetchError, fetch
+from src.fetcher import FetchError, fetch, fetch_async
 from src.normalizer import normalize
 
 # --------------------------------------------------------------------------
@@ -91,6 +91,7 @@ class TestNormalize:
         assert len(msg.attachments) == 1
         assert msg.attachments[0].file_id == "large"
         assert msg.attachments[0].media_type == "photo"
+        assert msg.attachments[0].file_unique_id == "u2"
 
     def test_document_attachment(self):
         update = _raw_update()
@@ -141,6 +142,49 @@ class TestFetch:
             fetch("token", chat_id=-1001234, offset=42)
         assert mock_get.call_args.kwargs["params"]["offset"] == 42
 
+    def test_no_timeout_param_by_default(self):
+        with patch("src.fetcher.httpx.get") as mock_get:
+            mock_get.return_value = _ok_response([])
+            fetch("token", chat_id=-1001234, offset=0)
+        assert "timeout" not in mock_get.call_args.kwargs["params"]
+
+    def test_long_polling_passes_timeout_to_api(self):
+        with patch("src.fetcher.httpx.get") as mock_get:
+            mock_get.return_value = _ok_response([])
+            fetch("token", chat_id=-1001234, offset=0, timeout=50)
+        assert mock_get.call_args.kwargs["params"]["timeout"] == 50
+        # HTTP タイムアウトはサーバ側の保持時間より長くなければならない
+        assert mock_get.call_args.kwargs["timeout"] > 50
+
+    def test_passes_limit_to_api(self):
+        with patch("src.fetcher.httpx.get") as mock_get:
+            mock_get.return_value = _ok_response([])
+            fetch("token", chat_id=-1001234, offset=0, limit=100)
+        assert mock_get.call_args.kwargs["params"]["limit"] == 100
+
+    def test_uses_custom_api_base(self):
+        with patch("src.fetcher.httpx.get") as mock_get:
+            mock_get.return_value = _ok_response([])
+            fetch("token", chat_id=-1001234, offset=0, api_base="http://127.0.0.1:8081")
+        assert mock_get.call_args.args[0] == "http://127.0.0.1:8081/bottoken/getUpdates"
+
+    def test_uses_injected_client(self):
+        client = MagicMock()
+        client.timeout = httpx.Timeout(30.0)
+        client.get.return_value = _ok_response([_raw_update(update_id=7)])
+        with patch("src.fetcher.httpx.get") as mock_get:
+            msgs, next_offset = fetch("token", chat_id=-1001234, offset=0, client=client)
+        mock_get.assert_not_called()
+        assert next_offset == 8
+        assert len(msgs) == 1
+
+    def test_injected_client_timeout_covers_long_poll(self):
+        client = MagicMock()
+        client.timeout = httpx.Timeout(30.0)
+        client.get.return_value = _ok_response([])
+        fetch("token", chat_id=-1001234, offset=0, timeout=50, client=client)
+        assert client.get.call_args.kwargs["timeout"].read == 80.0
+
     def test_raises_fetch_error_on_api_error(self):
         with patch("src.fetcher.httpx.get") as mock_get:
             mock_get.return_value = _ok_response([])
@@ -160,3 +204,28 @@ class TestFetch:
             )
             with pytest.raises(FetchError):
                 fetch("token", chat_id=-1001234, offset=0)
+
+
+class TestFetchAsync:
+    @pytest.mark.asyncio
+    async def test_returns_messages(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            assert request.url.params["offset"] == "5"
+            assert request.url.params["timeout"] == "50"
+            return httpx.Response(200, json={"ok": True, "result": [_raw_update(update_id=9)]})
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            msgs, next_offset = await fetch_async(
+                "token", -1001234, 5, client=client, timeout=50
+            )
+        assert [m.message_id for m in msgs] == [1]
+        assert next_offset == 10
+
+    @pytest.mark.asyncio
+    async def test_raises_fetch_error_on_http_error(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(500)
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with pytest.raises(FetchError):
+                await fetch_async("token", -1001234, 0, client=client)
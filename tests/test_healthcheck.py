@@ -57,3 +57,13 @@ class TestCheck:
         with patch("src.healthcheck.httpx.get", return_value=_api_ok()):
             result = check(bot_token="token", state_file=state_file)
         assert result["last_update_id"] == 42
+
+    def test_uses_injected_client(self, tmp_path):
+        state_file = tmp_path / "state.json"
+        state_file.write_text('{"last_update_id": 1, "last_run_at": "2026-02-21T00:00:00+09:00"}')
+        client = MagicMock()
+        client.get.return_value = _api_ok()
+        with patch("src.healthcheck.httpx.get") as mock_get:
+            result = check(bot_token="token", state_file=state_file, client=client)
+        mock_get.assert_not_called()
+        assert result["api"] is True
@@ -0,0 +1,104 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from src.http_client import ConnectionStats, HttpClient, create_client, request_timeout
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"ok": true, "result": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+class TestConnectionStats:
+    def test_reused_is_requests_minus_connections(self):
+        assert ConnectionStats(requests=5, connections=2).reused == 3
+
+
+class TestHttpClient:
+    def test_reuses_keepalive_connection(self, server_url):
+        with HttpClient() as client:
+            for _ in range(3):
+                client.get(f"{server_url}/getMe").raise_for_status()
+        assert client.stats.requests == 3
+        assert client.stats.connections == 1
+        assert client.stats.reused == 2
+
+    def test_counts_new_connection_after_close(self, server_url):
+        with HttpClient(max_keepalive_connections=0) as client:
+            client.get(f"{server_url}/getMe")
+            client.get(f"{server_url}/getMe")
+        assert client.stats.connections == 2
+        assert client.stats.reused == 0
+
+    def test_pool_limits_applied(self):
+        with HttpClient(max_connections=7, connect_timeout=3.0, read_timeout=12.0) as client:
+            assert client.timeout.connect == 3.0
+            assert client.timeout.read == 12.0
+
+
+class TestCreateClient:
+    def test_reads_settings_from_env(self, monkeypatch):
+        monkeypatch.setenv("HTTP_READ_TIMEOUT", "45")
+        monkeypatch.setenv("HTTP_CONNECT_TIMEOUT", "5")
+        with create_client() as client:
+            assert client.timeout.read == 45.0
+            assert client.timeout.connect == 5.0
+
+
+    def test_reuses_connection_across_poll_interval(self, server_url, monkeypatch):
+        monkeypatch.delenv("HTTP_KEEPALIVE_EXPIRY", raising=False)
+        monkeypatch.setenv("POLL_INTERVAL_SECONDS", "600")
+        with create_client() as client:
+            client.get(f"{server_url}/getUpdates").raise_for_status()
+            # 次のポーリングまでの待機（600 秒）が過ぎた状態にする
+            now = time.monotonic()
+            monkeypatch.setattr("httpcore._sync.http11.time.monotonic", lambda: now + 600)
+            client.get(f"{server_url}/getUpdates").raise_for_status()
+        assert client.stats.connections == 1
+
+    def test_default_keepalive_outlasts_default_poll_interval(self, server_url, monkeypatch):
+        monkeypatch.delenv("HTTP_KEEPALIVE_EXPIRY", raising=False)
+        monkeypatch.delenv("POLL_INTERVAL_SECONDS", raising=False)
+        with create_client() as client:
+            client.get(f"{server_url}/getUpdates").raise_for_status()
+            now = time.monotonic()
+            monkeypatch.setattr("httpcore._sync.http11.time.monotonic", lambda: now + 300)
+            client.get(f"{server_url}/getUpdates").raise_for_status()
+        assert client.stats.connections == 1
+
+
+class TestRequestTimeout:
+    def test_extends_read_timeout_by_hold(self):
+        with HttpClient(read_timeout=30.0, connect_timeout=10.0) as client:
+            timeout = request_timeout(client, 50)
+        assert timeout.read == 80.0
+        assert timeout.connect == 10.0
+
+    def test_unbounded_read_stays_unbounded(self):
+        client = httpx.Client(timeout=httpx.Timeout(None))
+        assert request_timeout(client, 50).read is None
+        client.close()
@@ -1,10 +1,14 @@
 from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
 from zoneinfo import ZoneInfo
 
 import pytest
 
 from src.journal_writer import JournalWriter
+from src.media_store import MediaStore
 from src.models import Attachment, DailySummary, Message
+from src.tagger import Tagger, TagRule
 
 JST = ZoneInfo("Asia/Tokyo")
 
@@ -72,6 +76,103 @@ class TestOutputOrder:
         assert "- 21:00 夜" in content
 
 
+# --------------------------------------------------------------------------
+# 要約
+# --------------------------------------------------------------------------
+
+
+_PROJECT_DAY = [
+    "新しいプロジェクトの設計を考えた",
+    "昼はラーメン",
+    "プロジェクトの設計レビューで指摘をもらった",
+    "雨",
+    "設計レビューの指摘を反映してプロジェクトを進めた",
+    "コーヒーを買った",
+    "夜にプロジェクトの設計をまとめ直した",
+]
+
+
+class TestSummary:
+    def test_summary_section_before_timeline(self, writer):
+        msgs = [_msg(i, 8 + i, text) for i, text in enumerate(_PROJECT_DAY, start=1)]
+        content = writer.write(_summary(messages=msgs)).read_text()
+        assert content.index("## 要約") < content.index("## タイムライン")
+        summary = content.split("## 要約\n\n")[1].split("\n\n")[0]
+        assert summary.count("- ") == 3
+        assert "- 昼はラーメン" not in summary
+
+    def test_short_day_has_no_summary_section(self, writer):
+        content = writer.write(_summary(messages=[_msg(1, 9, "朝")])).read_text()
+        assert "## 要約" not in content
+
+    def test_given_summary_is_used(self, writer):
+        content = writer.write(_summary(summary=["LLM の要約"])).read_text()
+        assert "## 要約\n\n- LLM の要約\n" in content
+
+    def test_unchanged_summary_keeps_incremental_render(self, writer, tmp_path):
+        base = [_msg(1, 9, "朝")]
+        writer.write(_summary(messages=base, summary=["要点"]))
+        new = [_msg(2, 12, "昼")]
+        with patch.object(JournalWriter, "_render_parts", side_effect=AssertionError):
+            path = writer.write(
+                _summary(messages=base + new, summary=["要点"]), new_messages=new
+            )
+
+        full = JournalWriter(tmp_path / "full").write(
+            _summary(messages=base + new, summary=["要点"])
+        )
+        assert path.read_text() == full.read_text()
+
+    def test_summary_change_falls_back_to_full_render(self, writer, tmp_path):
+        base = [_msg(i, 8 + i, text) for i, text in enumerate(_PROJECT_DAY, start=1)]
+        writer.write(_summary(messages=base))
+        new = [_msg(8, 20, "プロジェクトの設計レビューと設計の見直しで一日が終わった")]
+        path = writer.write(_summary(messages=base + new, summary=["要点"]), new_messages=new)
+
+        full = JournalWriter(tmp_path / "full").write(
+            _summary(messages=base + new, summary=["要点"])
+        )
+        assert path.read_text() == full.read_text()
+
+    def test_polling_keeps_rendered_summary(self, writer):
+        base = [_msg(i, 8 + i, text) for i, text in enumerate(_PROJECT_DAY, start=1)]
+        path = writer.write(_summary(messages=base))
+        rendered = path.read_text().split("## タイムライン")[0]
+        new = [_msg(8, 20, "プロジェクトの設計レビューと設計の見直しで一日が終わった")]
+
+        with patch("src.journal_writer.summarize", side_effect=AssertionError):
+            writer.write(_summary(messages=base + new), new_messages=new)
+        assert path.read_text().split("## タイムライン")[0] == rendered
+
+        # --generate-daily など new_messages なしの描画で作り直す
+        writer.write(_summary(messages=base + new))
+        assert path.read_text().split("## タイムライン")[0] != rendered
+
+
+# --------------------------------------------------------------------------
+# タグ
+# --------------------------------------------------------------------------
+
+
+class TestTags:
+    def test_tags_section_after_timeline(self, writer):
+        msgs = [_msg(1, 9, "朝から会議"), _msg(2, 21, "ジムに行った")]
+        content = writer.write(_summary(messages=msgs)).read_text()
+        assert content.index("## タイムライン") < content.index("## タグ")
+        assert content.endswith("## タグ\n\n- #仕事\n- #健康\n")
+
+    def test_no_tags_section_without_tags(self, writer):
+        content = writer.write(_summary(messages=[_msg(1, 9, "散歩")])).read_text()
+        assert "## タグ" not in content
+
+    def test_custom_tagger(self, tmp_path):
+        tagger = Tagger({"料理": TagRule(keywords=["夕飯"])})
+        w = JournalWriter(tmp_path / "daily", tagger)
+        content = w.write(_summary(messages=[_msg(1, 19, "夕飯は会議のあと")])).read_text()
+        assert "- #料理" in content
+        assert "#仕事" not in content
+
+
 # --------------------------------------------------------------------------
 # 冪等性
 # --------------------------------------------------------------------------
@@ -103,6 +204,25 @@ class TestIdempotency:
             writer.write(_summary(messages=[_msg(2, 12, "遅延メモ")]), logger)
         mock_warn.assert_called_once()
 
+    def test_identical_content_not_rewritten(self, writer):
+        path = writer.write(_summary())
+        mtime = path.stat().st_mtime_ns
+        writer.write(_summary())
+        assert path.stat().st_mtime_ns == mtime
+        assert writer.stats.written == 1
+        assert writer.stats.skipped == 1
+
+    def test_changed_content_rewritten(self, writer):
+        writer.write(_summary())
+        writer.write(_summary(messages=[_msg(1, 9, "変更")]))
+        assert writer.stats.written == 2
+
+    def test_externally_modified_file_rewritten(self, writer):
+        path = writer.write(_summary())
+        path.write_text("壊れた")
+        writer.write(_summary())
+        assert "## タイムライン" in path.read_text()
+
     def test_duplicate_message_ids_written_once(self, writer):
         msgs = [_msg(1, 9, "original"), _msg(1, 9, "duplicate")]
         content = writer.write(_summary(messages=msgs)).read_text()
@@ -123,6 +243,19 @@ class TestMessageOrder:
         pos_night = content.index("21:00")
         assert pos_morning < pos_afternoon < pos_night
 
+    def test_ordered_timeline_used_as_is(self, writer):
+        msgs = [_msg(1, 9, "午前"), _msg(2, 15, "午後")]
+        with patch("src.journal_writer.dedup_by_id") as dedup:
+            content = writer.write(_summary(messages=msgs), ordered=True).read_text()
+        dedup.assert_not_called()
+        assert content.index("09:00") < content.index("15:00")
+
+    def test_duplicate_ids_still_deduplicated(self, writer):
+        msgs = [_msg(1, 9, "元"), _msg(1, 9, "編集後")]
+        content = writer.write(_summary(messages=msgs)).read_text()
+        assert "編集後" in content
+        assert "- 09:00 元" not in content
+
 
 # --------------------------------------------------------------------------
 # 添付ファイル
@@ -144,6 +277,46 @@ class TestAttachments:
         assert "[ファイル: doc.pdf]" in content
 
 
+class TestMediaLinks:
+    @pytest.fixture
+    def media(self, tmp_path):
+        media = MediaStore(tmp_path / "img")
+        for key, name in (("u1", "photo.jpg"), ("u2", "clip.mp4")):
+            partial = media.partial_path(key)
+            partial.parent.mkdir(parents=True, exist_ok=True)
+            partial.write_bytes(key.encode())
+            media.commit([key], partial, Path(name).suffix)
+        return media
+
+    def test_downloaded_attachments_are_linked(self, tmp_path, media):
+        writer = JournalWriter(tmp_path / "daily", media=media)
+        photo = Attachment("p", "photo_p.jpg", "photo", file_unique_id="u1")
+        video = Attachment("v", "clip.mp4", "video", file_unique_id="u2")
+        content = writer.write(_summary(messages=[_msg(1, 9, "", [photo, video])])).read_text()
+        photo_path = media.get(photo).relative_to(tmp_path).as_posix()
+        video_path = media.get(video).relative_to(tmp_path).as_posix()
+        assert f"![画像: photo_p.jpg](../{photo_path})" in content
+        assert f"[動画: clip.mp4](../{video_path})" in content
+
+    def test_missing_download_keeps_placeholder(self, tmp_path, media):
+        writer = JournalWriter(tmp_path / "daily", media=media)
+        att = Attachment("x", "photo_x.jpg", "photo", file_unique_id="unknown")
+        content = writer.write(_summary(messages=[_msg(1, 9, "", [att])])).read_text()
+        assert "- 09:00 [画像: photo_x.jpg]\n" in content
+
+    def test_incremental_append_links_new_attachments(self, tmp_path, media):
+        writer = JournalWriter(tmp_path / "daily", media=media)
+        first = _msg(1, 9, "朝")
+        writer.write(_summary(messages=[first]))
+        second = _msg(2, 10, "", [Attachment("p", "photo_p.jpg", "photo", file_unique_id="u1")])
+        path = writer.write(_summary(messages=[first, second]), new_messages=[second])
+        full = JournalWriter(tmp_path / "full", media=media).write(
+            _summary(messages=[first, second])
+        )
+        assert path.read_text() == full.read_text()
+        assert "![画像: photo_p.jpg](../img/" in path.read_text()
+
+
 # --------------------------------------------------------------------------
 # 空ケース
 # --------------------------------------------------------------------------
@@ -153,3 +326,70 @@ class TestEmptyCases:
     def test_empty_messages(self, writer):
         content = writer.write(_summary(messages=[])).read_text()
         assert "## タイムライン" in content
+
+
+# --------------------------------------------------------------------------
+# 差分描画
+# --------------------------------------------------------------------------
+
+
+class TestIncrementalRender:
+    def test_appends_new_messages(self, writer, tmp_path):
+        base = [_msg(1, 9, "朝")]
+        writer.write(_summary(messages=base))
+        new = [_msg(2, 12, "昼")]
+        path = writer.write(_summary(messages=base + new), new_messages=new)
+
+        full = JournalWriter(tmp_path / "full").write(_summary(messages=base + new))
+        assert path.read_text() == full.read_text()
+
+    def test_does_not_rewrite_existing_lines(self, writer):
+        base = [_msg(1, 9, "朝")]
+        path = writer.write(_summary(messages=base))
+        new = [_msg(2, 12, "昼")]
+        with patch.object(JournalWriter, "_render_parts", side_effect=AssertionError):
+            writer.write(_summary(messages=base + new), new_messages=new)
+        assert "- 12:00 昼" in path.read_text()
+
+    def test_edit_falls_back_to_full_render(self, writer):
+        path = writer.write(_summary(messages=[_msg(1, 9, "元")]))
+        edited = [_msg(1, 9, "編集後")]
+        writer.write(_summary(messages=edited), new_messages=edited)
+        content = path.read_text()
+        assert "編集後" in content
+        assert "元" not in content
+
+    def test_out_of_order_falls_back_to_full_render(self, writer):
+        path = writer.write(_summary(messages=[_msg(1, 12, "昼")]))
+        late = [_msg(2, 9, "朝")]
+        writer.write(_summary(messages=[_msg(1, 12, "昼"), *late]), new_messages=late)
+        content = path.read_text()
+        assert content.index("09:00") < content.index("12:00")
+
+    def test_external_change_falls_back_to_full_render(self, writer):
+        path = writer.write(_summary(messages=[_msg(1, 9, "朝")]))
+        path.write_text("# 手で編集\n")
+        new = [_msg(2, 12, "昼")]
+        writer.write(_summary(messages=[_msg(1, 9, "朝"), *new]), new_messages=new)
+        assert "## タイムライン" in path.read_text()
+        assert "- 09:00 朝" in path.read_text()
+
+    def test_without_sidecar_renders_full(self, writer):
+        path = writer.write(_summary(messages=[_msg(1, 9, "朝")]))
+        path.with_suffix(".md.rendered").unlink()
+        new = [_msg(2, 12, "昼")]
+        writer.write(_summary(messages=[_msg(1, 9, "朝"), *new]), new_messages=new)
+        assert path.read_text().count("## タイムライン") == 1
+        assert "- 12:00 昼" in path.read_text()
+
+    def test_appends_before_tags_section(self, writer, tmp_path):
+        base = [_msg(1, 9, "朝から会議")]
+        writer.write(_summary(messages=base))
+        for new in ([_msg(2, 12, "昼は散歩")], [_msg(3, 20, "ジムに行った")]):
+            base = base + new
+            with patch.object(JournalWriter, "_render_parts", side_effect=AssertionError):
+                path = writer.write(_summary(messages=base), new_messages=new)
+
+        full = JournalWriter(tmp_path / "full").write(_summary(messages=base))
+        assert path.read_text() == full.read_text()
+        assert path.read_text().endswith("- #仕事\n- #健康\n")
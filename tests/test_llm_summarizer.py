@@ -0,0 +1,382 @@
+import logging
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.journal_writer import render_timeline
+from src.llm_summarizer import (
+    LlmError,
+    LlmSummarizer,
+    _chunk,
+    _split_timeline,
+    estimate_tokens,
+    summarize_range,
+)
+from src.message_store import MessageStore
+from src.models import Message
+
+JST = ZoneInfo("Asia/Tokyo")
+logger = logging.getLogger("test")
+
+# LLM の代わりに使うスタブ: 呼び出しを calls.log に記録し、入力の見出しと行数を返す
+_STUB = """
+import pathlib, sys
+pathlib.Path(sys.argv[1]).open("a").write("call\\n")
+lines = sys.stdin.read().splitlines()
+print(f"{lines[0]}\\n\\n## Summary\\n- {len(lines)} lines ({sys.argv[2]})")
+"""
+
+
+def _msg(message_id, day=22, hour=12, text="メモ"):
+    return Message(
+        message_id=message_id,
+        timestamp=datetime(2026, 2, day, hour, 0, tzinfo=JST),
+        text=text,
+        source_chat=-1001234,
+        attachments=[],
+    )
+
+
+@pytest.fixture
+def prompt(tmp_path):
+    path = tmp_path / "prompt.txt"
+    path.write_text("要約してください", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def calls(tmp_path):
+    return tmp_path / "calls.log"
+
+
+# map（プロンプトに「一部」を含む）と reduce を区別して応答するスタブ。map は少し待つ
+_MAP_REDUCE_STUB = """
+import pathlib, sys, time
+pathlib.Path(sys.argv[1]).open("a").write(sys.argv[-1][:2] + "\\n")
+data = sys.stdin.read()
+if "一部" in sys.argv[-1]:
+    time.sleep(float(sys.argv[2]))
+    print(f"- {data.count(chr(10) + '- ')} 件\\nタグ: memo")
+else:
+    date = data.splitlines()[0].split()[1]
+    parts = data.count("## パート")
+    print(f"---\\ndate: {date}\\n---\\n\\n# {date} 日記\\n\\n## Summary\\n- {parts} parts\\n\\n"
+          "## タグ\\n- #memo")
+"""
+
+
+def _summarizer(tmp_path, prompt, command, **kwargs):
+    return LlmSummarizer(command, prompt, cache_dir=tmp_path / "cache", **kwargs)
+
+
+def _stub(calls):
+    return [sys.executable, "-c", _STUB, str(calls)]
+
+
+def _call_count(calls):
+    return len(calls.read_text().splitlines()) if calls.exists() else 0
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MessageStore(tmp_path / "messages")
+    for day in (21, 22, 23):
+        store.append(f"2026-02-{day}", [_msg(day * 10, day), _msg(day * 10 + 1, day, 13)])
+    return store
+
+
+class TestLlmSummarizer:
+    def test_runs_command_with_timeline_on_stdin(self, tmp_path, prompt, calls):
+        summarizer = _summarizer(tmp_path, prompt, _stub(calls))
+        output, cached = summarizer.summarize("# 2026-02-22 日記\n\n- 09:00 朝\n")
+        assert output.startswith("# 2026-02-22 日記")
+        assert "3 lines (-p)" in output
+        assert not cached
+
+    def test_second_call_hits_cache(self, tmp_path, prompt, calls):
+        summarizer = _summarizer(tmp_path, prompt, _stub(calls))
+        first, _ = summarizer.summarize("timeline")
+        second, cached = summarizer.summarize("timeline")
+        assert cached and first == second
+        assert _call_count(calls) == 1
+
+    def test_prompt_change_invalidates_cache(self, tmp_path, prompt, calls):
+        _summarizer(tmp_path, prompt, _stub(calls)).summarize("timeline")
+        prompt.write_text("別のプロンプト", encoding="utf-8")
+        _, cached = _summarizer(tmp_path, prompt, _stub(calls)).summarize("timeline")
+        assert not cached
+        assert _call_count(calls) == 2
+
+    def test_command_change_invalidates_cache(self, tmp_path, prompt, calls):
+        _summarizer(tmp_path, prompt, _stub(calls)).summarize("timeline")
+        _, cached = _summarizer(
+            tmp_path, prompt, [*_stub(calls), "--model", "other"]
+        ).summarize("timeline")
+        _, flag_cached = _summarizer(
+            tmp_path, prompt, _stub(calls), prompt_flag="--prompt"
+        ).summarize("timeline")
+        assert not cached and not flag_cached
+        assert _call_count(calls) == 3
+
+    def test_nonzero_exit_raises(self, tmp_path, prompt):
+        command = [sys.executable, "-c", "import sys; sys.exit(3)"]
+        with pytest.raises(LlmError, match="exit status 3"):
+            _summarizer(tmp_path, prompt, command).summarize("timeline")
+
+    def test_timeout_raises(self, tmp_path, prompt):
+        command = [sys.executable, "-c", "import time; time.sleep(10)"]
+        with pytest.raises(LlmError, match="timed out"):
+            _summarizer(tmp_path, prompt, command, timeout=0.5).summarize("timeline")
+
+    def test_empty_output_raises_and_is_not_cached(self, tmp_path, prompt):
+        command = [sys.executable, "-c", "pass"]
+        summarizer = _summarizer(tmp_path, prompt, command)
+        with pytest.raises(LlmError, match="empty output"):
+            summarizer.summarize("timeline")
+        assert not list((tmp_path / "cache").glob("*.md"))
+
+
+class TestSummarizeRange:
+    def test_writes_each_day_and_done_marker(self, tmp_path, prompt, calls, store):
+        daily = tmp_path / "daily"
+        dates = ["2026-02-21", "2026-02-22", "2026-02-23"]
+        stats = summarize_range(
+            dates, _summarizer(tmp_path, prompt, _stub(calls)), store, daily, logger, workers=3
+        )
+        assert (stats.called, stats.cached, stats.written, stats.failed) == (3, 0, 3, [])
+        for d in dates:
+            assert (daily / f"{d}.md").read_text().startswith(f"# {d} 日記")
+            assert (daily / f"{d}.md.done").exists()
+
+    def test_unchanged_days_do_not_call_llm_again(self, tmp_path, prompt, calls, store):
+        daily = tmp_path / "daily"
+        summarizer = _summarizer(tmp_path, prompt, _stub(calls))
+        summarize_range(["2026-02-22"], summarizer, store, daily, logger)
+        stats = summarize_range(["2026-02-22"], summarizer, store, daily, logger)
+        assert (stats.called, stats.cached, stats.written) == (0, 1, 0)
+        assert _call_count(calls) == 1
+
+    def test_changed_day_is_summarized_again(self, tmp_path, prompt, calls, store):
+        daily = tmp_path / "daily"
+        summarizer = _summarizer(tmp_path, prompt, _stub(calls))
+        summarize_range(["2026-02-22"], summarizer, store, daily, logger)
+        store.append("2026-02-22", [_msg(999, 22, 20, "遅れて届いたメモ")])
+        stats = summarize_range(["2026-02-22"], summarizer, store, daily, logger)
+        assert (stats.called, stats.written) == (1, 1)
+        assert "7 lines" in (daily / "2026-02-22.md").read_text()
+
+    def test_failure_is_recorded_and_others_continue(self, tmp_path, prompt, store):
+        script = "import sys; t = sys.stdin.read(); print(t); sys.exit('2026-02-22' in t)"
+        command = [sys.executable, "-c", script]
+        stats = summarize_range(
+            ["2026-02-21", "2026-02-22"],
+            _summarizer(tmp_path, prompt, command),
+            store,
+            tmp_path / "daily",
+            logger,
+        )
+        assert stats.failed == ["2026-02-22"]
+        assert stats.written == 1
+        assert not (tmp_path / "daily" / "2026-02-22.md").exists()
+
+    def test_copies_to_notes_dir(self, tmp_path, prompt, calls, store):
+        notes = tmp_path / "notes"
+        notes.mkdir()
+        summarize_range(
+            ["2026-02-22"],
+            _summarizer(tmp_path, prompt, _stub(calls)),
+            store,
+            tmp_path / "daily",
+            logger,
+            notes_dir=notes,
+        )
+        assert (notes / "2026-02-22.md").exists()
+
+    def test_copy_failure_is_recorded_per_day(
+        self, tmp_path, prompt, calls, store, monkeypatch
+    ):
+        notes = tmp_path / "notes"
+        notes.mkdir()
+        copy2 = shutil.copy2
+
+        def failing_copy(src, dst):
+            if "2026-02-22" in str(src):
+                raise OSError("No space left on device")
+            return copy2(src, dst)
+
+        monkeypatch.setattr("src.llm_summarizer.shutil.copy2", failing_copy)
+        stats = summarize_range(
+            ["2026-02-21", "2026-02-22"],
+            _summarizer(tmp_path, prompt, _stub(calls)),
+            store,
+            tmp_path / "daily",
+            logger,
+            notes_dir=notes,
+        )
+        assert stats.failed == ["2026-02-22"]
+        assert (notes / "2026-02-21.md").is_file()
+
+    def test_skips_days_without_messages(self, tmp_path, prompt, calls, store):
+        stats = summarize_range(
+            ["2026-03-01"], _summarizer(tmp_path, prompt, _stub(calls)), store,
+            tmp_path / "daily", logger,
+        )
+        assert stats.called == 0
+        assert _call_count(calls) == 0
+
+
+# --------------------------------------------------------------------------
+# map-reduce
+# --------------------------------------------------------------------------
+
+
+def _big_timeline(count):
+    messages = [
+        _msg(i, hour=8 + i % 12, text=f"メモ{i} " + "あ" * 30) for i in range(count)
+    ]
+    return render_timeline("2026-02-22", sorted(messages, key=lambda m: m.timestamp))
+
+
+@pytest.fixture
+def map_reduce_prompts(tmp_path):
+    (tmp_path / "map.txt").write_text("一部を要約", encoding="utf-8")
+    (tmp_path / "reduce.txt").write_text("まとめる", encoding="utf-8")
+    return {
+        "map_prompt_path": tmp_path / "map.txt",
+        "reduce_prompt_path": tmp_path / "reduce.txt",
+    }
+
+
+class TestChunking:
+    def test_split_keeps_continuation_lines(self):
+        heading, items = _split_timeline(
+            "# 2026-02-22 日記\n\n## タイムライン\n\n- 09:00 一行目\n二行目\n- 10:00 次\n"
+        )
+        assert heading == "# 2026-02-22 日記"
+        assert items == ["- 09:00 一行目\n二行目\n", "- 10:00 次\n"]
+
+    def test_chunks_fit_budget(self):
+        items = [f"- 09:{i:02d} " + "あ" * 20 + "\n" for i in range(30)]
+        chunks = _chunk(items, 100)
+        assert [item for chunk in chunks for item in chunk] == items
+        assert all(sum(map(estimate_tokens, c)) <= 100 for c in chunks)
+        assert len(chunks) > 1
+
+    def test_oversized_item_gets_own_chunk(self):
+        assert _chunk(["a" * 600, "b\n"], 50) == [["a" * 600], ["b\n"]]
+
+
+class TestMapReduce:
+    def test_small_day_uses_single_call(self, tmp_path, prompt, calls, map_reduce_prompts):
+        command = [sys.executable, "-c", _MAP_REDUCE_STUB, str(calls), "0"]
+        summarizer = _summarizer(
+            tmp_path, prompt, command, token_budget=10_000, **map_reduce_prompts
+        )
+        summarizer.summarize(_big_timeline(3))
+        assert calls.read_text().splitlines() == ["要約"]
+
+    def test_large_day_is_chunked_and_reduced(self, tmp_path, prompt, calls, map_reduce_prompts):
+        command = [sys.executable, "-c", _MAP_REDUCE_STUB, str(calls), "0"]
+        summarizer = _summarizer(
+            tmp_path, prompt, command, token_budget=400, **map_reduce_prompts
+        )
+        timeline = _big_timeline(40)
+        output, cached = summarizer.summarize(timeline)
+
+        map_calls = calls.read_text().splitlines().count("一部")
+        assert map_calls > 1
+        assert calls.read_text().splitlines().count("まと") == 1
+        assert not cached
+        assert f"- {map_calls} parts" in output
+        # 元のタイムラインが Summary とタグの間にそのまま入る
+        _, items = _split_timeline(timeline)
+        assert "## タイムライン\n\n" + "".join(items) + "\n## タグ\n- #memo" in output
+        assert output.index("## Summary") < output.index("## タイムライン")
+
+    def test_chunks_run_in_parallel(self, tmp_path, prompt, calls, map_reduce_prompts):
+        command = [sys.executable, "-c", _MAP_REDUCE_STUB, str(calls), "0.5"]
+        summarizer = _summarizer(
+            tmp_path, prompt, command, token_budget=400, map_workers=8, **map_reduce_prompts
+        )
+        started = time.monotonic()
+        summarizer.summarize(_big_timeline(40))
+        elapsed = time.monotonic() - started
+        map_calls = calls.read_text().splitlines().count("一部")
+        assert map_calls >= 3
+        assert elapsed < 0.5 * map_calls
+
+    def test_oversized_reduce_input_is_merged_hierarchically(
+        self, tmp_path, prompt, calls, map_reduce_prompts
+    ):
+        command = [sys.executable, "-c", _MAP_REDUCE_STUB, str(calls), "0"]
+        summarizer = _summarizer(
+            tmp_path, prompt, command, token_budget=60, **map_reduce_prompts
+        )
+        reduce_inputs = []
+        run = summarizer._run
+
+        def recording_run(prompt_text, data):
+            if prompt_text == summarizer.reduce_prompt:
+                reduce_inputs.append(data)
+            return run(prompt_text, data)
+
+        summarizer._run = recording_run
+        output, _ = summarizer.summarize(_big_timeline(12))
+
+        lines = calls.read_text().splitlines()
+        assert lines.count("一部") > 12  # チャンク要約12件 + まとめ直し
+        assert lines.count("まと") == 1
+        [reduce_input] = reduce_inputs
+        assert estimate_tokens(summarizer.reduce_prompt) + estimate_tokens(reduce_input) <= 60
+        assert "## タイムライン" in output
+
+    def test_llm_processes_are_capped_across_days(
+        self, tmp_path, prompt, map_reduce_prompts, monkeypatch
+    ):
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def fake_run(args, **kwargs):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            data = kwargs["input"]
+            return subprocess.CompletedProcess(args, 0, f"{data.splitlines()[0]}\n## タグ\n", "")
+
+        monkeypatch.setattr("src.llm_summarizer.subprocess.run", fake_run)
+        store = MessageStore(tmp_path / "messages")
+        for day in (20, 21, 22, 23):
+            store.append(
+                f"2026-02-{day}",
+                [_msg(i, day, 8 + i % 12, f"メモ{i} " + "あ" * 30) for i in range(20)],
+            )
+        summarizer = _summarizer(
+            tmp_path, prompt, ["llm"], token_budget=200, map_workers=2, **map_reduce_prompts
+        )
+
+        stats = summarize_range(
+            store.dates(), summarizer, store, tmp_path / "daily", logger, workers=4
+        )
+
+        assert stats.failed == []
+        assert peak[0] == 2
+
+    def test_unchanged_chunks_are_cached(self, tmp_path, prompt, calls, map_reduce_prompts):
+        command = [sys.executable, "-c", _MAP_REDUCE_STUB, str(calls), "0"]
+        summarizer = _summarizer(
+            tmp_path, prompt, command, token_budget=400, **map_reduce_prompts
+        )
+        summarizer.summarize(_big_timeline(40))
+        first = len(calls.read_text().splitlines())
+        _, cached = summarizer.summarize(_big_timeline(40))
+        assert cached
+        assert len(calls.read_text().splitlines()) == first
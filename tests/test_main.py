@@ -1,17 +1,38 @@
+import asyncio
+import threading
 from datetime import datetime
 from unittest.mock import MagicMock, patch
 from zoneinfo import ZoneInfo
 
+import httpx
+import pytest
+
+from src.journal_writer import JournalWriter
 from src.main import (
-    _dict_to_msg,
     _load_day_messages,
-    _merge_messages,
-    _msg_to_dict,
     _save_day_messages,
+    _write_days,
+    compact_messages,
+    drain_backlog,
+    fetch_media,
     generate_daily,
+    generate_range,
+    ingest_async,
+    poll_loop,
     poll_once,
+    rebuild_daily,
+    search_messages,
+    serve_webhook,
 )
-from src.models import Message, State
+from src.media_fetcher import MediaStats
+from src.models import Attachment, Message, State
+from src.search_index import SearchIndex
+from src.seen_index import SeenIndex
+from src.sqlite_store import SqliteMessageStore
+from src.state_store import StateStore
+from src.tagger import Tagger, TagRule
+from src.wal import WriteAheadLog
+from src.webhook import WebhookServer
 
 JST = ZoneInfo("Asia/Tokyo")
 _DT = datetime(2026, 2, 22, 12, 0, tzinfo=JST)
@@ -33,22 +54,6 @@ def _make_store(offset=0):
     return store
 
 
-# --------------------------------------------------------------------------
-# シリアライズ
-# --------------------------------------------------------------------------
-
-
-class TestMsgSerialization:
-    def test_roundtrip(self):
-        msg = _msg()
-        assert _dict_to_msg(_msg_to_dict(msg)) == msg
-
-    def test_timestamp_preserves_timezone(self):
-        msg = _msg()
-        restored = _dict_to_msg(_msg_to_dict(msg))
-        assert restored.timestamp == msg.timestamp
-
-
 # --------------------------------------------------------------------------
 # メッセージ永続化
 # --------------------------------------------------------------------------
@@ -71,32 +76,43 @@ class TestDayMessages:
         _save_day_messages("2026-02-22", [_msg()], messages_dir)
         assert messages_dir.exists()
 
+    def test_compact_all_days(self, tmp_path):
+        _save_day_messages("2026-02-21", [_msg(1), _msg(1, "edited")], tmp_path)
+        _save_day_messages("2026-02-22", [_msg(2)], tmp_path)
+
+        compact_messages(tmp_path, MagicMock())
+
+        lines = (tmp_path / "2026-02-21.jsonl").read_text().splitlines()
+        assert len(lines) == 1
+        assert "edited" in lines[0]
+
 
 # --------------------------------------------------------------------------
-# マージ
+# _write_days
 # --------------------------------------------------------------------------
 
 
-class TestMergeMessages:
-    def test_dedup_by_message_id_keeps_last(self):
-        merged = _merge_messages([], [_msg(1, "first"), _msg(1, "edited")])
-        assert len(merged) == 1
-        assert merged[0].text == "edited"
+class TestWriteDays:
+    def test_counts_written_files(self, tmp_path):
+        writer = JournalWriter(tmp_path / "daily")
+        stats = _write_days([_msg(1)], writer, tmp_path / "messages", MagicMock())
+        assert (stats.written, stats.skipped) == (2, 0)
 
-    def test_new_overwrites_existing(self):
-        merged = _merge_messages([_msg(1, "old")], [_msg(1, "new")])
-        assert len(merged) == 1
-        assert merged[0].text == "new"
+    def test_duplicate_updates_skip_both_files(self, tmp_path):
+        writer = JournalWriter(tmp_path / "daily")
+        _write_days([_msg(1)], writer, tmp_path / "messages", MagicMock())
+        stats = _write_days([_msg(1)], writer, tmp_path / "messages", MagicMock())
+        assert (stats.written, stats.skipped) == (0, 2)
+        assert writer.stats.written == 1
 
-    def test_sorted_by_timestamp(self):
-        dt1 = datetime(2026, 2, 22, 10, 0, tzinfo=JST)
-        dt2 = datetime(2026, 2, 22, 12, 0, tzinfo=JST)
-        merged = _merge_messages([_msg(2, dt=dt2)], [_msg(1, dt=dt1)])
-        assert [m.message_id for m in merged] == [1, 2]
-
-    def test_combines_existing_and_new(self):
-        merged = _merge_messages([_msg(1)], [_msg(2)])
-        assert len(merged) == 2
+    def test_polling_adds_summary_once_day_grows(self, tmp_path):
+        writer = JournalWriter(tmp_path / "daily")
+        for i in range(1, 13):
+            text = f"プロジェクトの設計メモ その{i}"
+            _write_days([_msg(i, text, _DT.replace(minute=i))], writer, tmp_path / "messages",
+                MagicMock())
+        content = (tmp_path / "daily" / "2026-02-22.md").read_text()
+        assert "## 要約" in content
 
 
 # --------------------------------------------------------------------------
@@ -139,6 +155,86 @@ class TestPollOnce:
         written = writer.write.call_args[0][0]
         assert len(written.messages) == 2
 
+    def test_commits_messages_and_offset_as_one_group(self, tmp_path):
+        store = StateStore(tmp_path / "state.json")
+        wal = WriteAheadLog(tmp_path / "state.wal", checkpoint_every=1)
+        writer = JournalWriter(tmp_path / "daily")
+
+        with patch("src.main.fetch", return_value=([_msg()], 101)):
+            poll_once(
+                "token", -1001234, store, writer, tmp_path / "messages", MagicMock(), wal=wal
+            )
+
+        assert store.load().last_update_id == 101
+        assert _load_day_messages("2026-02-22", tmp_path / "messages") == [_msg()]
+        assert (tmp_path / "daily" / "2026-02-22.md").exists()
+
+    def test_failed_write_leaves_offset_and_data_untouched(self, tmp_path):
+        store = StateStore(tmp_path / "state.json")
+        wal = WriteAheadLog(tmp_path / "state.wal")
+        writer = MagicMock()
+        writer.write.side_effect = OSError("disk full")
+
+        with patch("src.main.fetch", return_value=([_msg()], 101)):
+            with pytest.raises(OSError):
+                poll_once(
+                    "token", -1001234, store, writer, tmp_path / "messages", MagicMock(),
+                    wal=wal,
+                )
+
+        assert store.load().last_update_id == 0
+        assert _load_day_messages("2026-02-22", tmp_path / "messages") == []
+
+    def test_downloads_media_before_rendering(self, tmp_path):
+        order = []
+        media = MagicMock()
+        media.download.side_effect = lambda msgs: order.append(("download", len(msgs))) or (
+            MediaStats()
+        )
+        writer = MagicMock()
+        writer.write.side_effect = lambda *args, **kwargs: order.append(("write", 0))
+
+        with patch("src.main.fetch", return_value=([_msg()], 101)):
+            poll_once(
+                "token", -1001234, _make_store(), writer, tmp_path, MagicMock(), media=media
+            )
+
+        assert order == [("download", 1), ("write", 0)]
+
+    def test_seen_index_drops_duplicates_before_opening_day_files(self, tmp_path):
+        seen = SeenIndex(tmp_path / "seen")
+        seen.add([_msg(1)])
+        store = _make_store(offset=100)
+
+        with patch("src.main.fetch", return_value=([_msg(1)], 101)), \
+                patch("src.main._write_days") as write_days:
+            poll_once("token", -1001234, store, MagicMock(), tmp_path, MagicMock(), seen=seen)
+
+        assert write_days.call_args[0][0] == []
+        assert store.save.call_args[0][0].last_update_id == 101
+        seen.close()
+
+    def test_seen_index_updated_after_write(self, tmp_path):
+        seen = SeenIndex(tmp_path / "seen")
+        edited = _msg(1, "edited")
+
+        with patch("src.main.fetch", return_value=([_msg(1), _msg(2)], 101)):
+            poll_once("token", -1001234, _make_store(), MagicMock(), tmp_path, MagicMock(),
+                      seen=seen)
+
+        assert seen.unseen([_msg(1), _msg(2), edited]) == [edited]
+        seen.close()
+
+    def test_updates_search_index(self, tmp_path):
+        search = SearchIndex(tmp_path / "search.db")
+
+        with patch("src.main.fetch", return_value=([_msg(1, "東京で会議")], 101)):
+            poll_once("token", -1001234, _make_store(), MagicMock(), tmp_path, MagicMock(),
+                      search=search)
+
+        assert search_messages(search, "会議") == ["2026-02-22 12:00 東京で会議"]
+        search.close()
+
     def test_saves_next_offset(self, tmp_path):
         store = _make_store(offset=100)
         writer = MagicMock()
@@ -162,6 +258,361 @@ class TestPollOnce:
         assert len(saved) == 1
         assert saved[0].message_id == 42
 
+    def test_appends_only_new_records(self, tmp_path):
+        _save_day_messages("2026-02-22", [_msg(1, "old")], tmp_path)
+        store = _make_store()
+
+        with patch("src.main.fetch", return_value=([_msg(2, "new")], 101)):
+            poll_once("token", -1001234, store, MagicMock(), tmp_path, MagicMock())
+
+        lines = (tmp_path / "2026-02-22.jsonl").read_text().splitlines()
+        assert len(lines) == 2
+        assert "old" in lines[0]
+        assert "new" in lines[1]
+
+
+    def test_writes_to_sqlite_store(self, tmp_path):
+        message_store = SqliteMessageStore(tmp_path / "messages.db")
+        writer = MagicMock()
+
+        with patch("src.main.fetch", return_value=([_msg(1), _msg(2)], 101)):
+            poll_once("token", -1001234, _make_store(), writer, message_store, MagicMock())
+
+        assert [m.message_id for m in message_store.load("2026-02-22")] == [1, 2]
+        assert len(writer.write.call_args[0][0].messages) == 2
+        message_store.close()
+
+    def test_rerenders_day_when_store_is_ahead_of_journal(self, tmp_path):
+        # SQLite へのコミット後、日記を書く前に落ちた状態から同じ更新を取り直す
+        message_store = SqliteMessageStore(tmp_path / "messages.db")
+        message_store.append("2026-02-22", [_msg(1), _msg(2)])
+        writer = JournalWriter(tmp_path / "daily")
+
+        with patch("src.main.fetch", return_value=([_msg(1), _msg(2)], 101)):
+            poll_once("token", -1001234, _make_store(), writer, message_store, MagicMock())
+
+        content = (tmp_path / "daily" / "2026-02-22.md").read_text(encoding="utf-8")
+        assert content.count("\n- ") >= 2
+        with patch("src.main.fetch", return_value=([_msg(2)], 102)):
+            poll_once("token", -1001234, _make_store(), writer, message_store, MagicMock())
+        assert writer.stats.written == 1  # 追いついた後は描き直さない
+        message_store.close()
+
+    def test_passes_poll_timeout_to_fetch(self, tmp_path):
+        store = _make_store(offset=100)
+        writer = MagicMock()
+        logger = MagicMock()
+
+        with patch("src.main.fetch", return_value=([], 100)) as mock_fetch:
+            poll_once("token", -1001234, store, writer, tmp_path, logger, poll_timeout=50)
+
+        assert mock_fetch.call_args.kwargs["timeout"] == 50
+
+
+# --------------------------------------------------------------------------
+# drain_backlog
+# --------------------------------------------------------------------------
+
+
+class TestDrainBacklog:
+    def test_pages_until_empty(self, tmp_path):
+        store = _make_store(offset=100)
+        pages = [([_msg(1)], 200), ([_msg(2)], 300), ([], 300)]
+
+        with patch("src.main.fetch", side_effect=pages) as mock_fetch:
+            count = drain_backlog("token", -1001234, store, MagicMock(), tmp_path, MagicMock())
+
+        assert count == 2
+        offsets = [c.args[2] for c in mock_fetch.call_args_list]
+        assert offsets == [100, 200, 300]
+        assert all(c.kwargs["limit"] == 100 for c in mock_fetch.call_args_list)
+
+    def test_writes_each_day_once(self, tmp_path):
+        store = _make_store()
+        writer = MagicMock()
+        pages = [([_msg(1)], 101), ([_msg(2)], 102), ([], 102)]
+
+        with patch("src.main.fetch", side_effect=pages):
+            drain_backlog("token", -1001234, store, writer, tmp_path, MagicMock())
+
+        writer.write.assert_called_once()
+        assert len(writer.write.call_args[0][0].messages) == 2
+        assert len(_load_day_messages("2026-02-22", tmp_path)) == 2
+
+    def test_saves_final_offset_once(self, tmp_path):
+        store = _make_store(offset=100)
+        pages = [([_msg(1)], 200), ([], 200)]
+
+        with patch("src.main.fetch", side_effect=pages):
+            drain_backlog("token", -1001234, store, MagicMock(), tmp_path, MagicMock())
+
+        store.save.assert_called_once()
+        assert store.save.call_args[0][0].last_update_id == 200
+
+    def test_saves_collected_pages_when_later_page_fails(self, tmp_path):
+        store = _make_store(offset=100)
+
+        def fake_fetch(bot_token, chat_id, offset, **kwargs):
+            if offset == 100:
+                return [_msg(1)], 200
+            raise RuntimeError("boom")
+
+        with patch("src.main.fetch", side_effect=fake_fetch), patch("src.retry.time.sleep"):
+            with pytest.raises(RuntimeError):
+                drain_backlog("token", -1001234, store, MagicMock(), tmp_path, MagicMock())
+
+        # 200 を要求した時点で 1 ページ目は Telegram 側で確認済みのため、失われないよう保存する
+        store.save.assert_called_once()
+        assert store.save.call_args[0][0].last_update_id == 200
+        assert _load_day_messages("2026-02-22", tmp_path) == [_msg(1)]
+
+    def test_first_page_failure_saves_nothing(self, tmp_path):
+        store = _make_store(offset=100)
+
+        with patch("src.main.fetch", side_effect=RuntimeError("boom")), \
+                patch("src.retry.time.sleep"):
+            with pytest.raises(RuntimeError):
+                drain_backlog("token", -1001234, store, MagicMock(), tmp_path, MagicMock())
+
+        store.save.assert_not_called()
+
+
+# --------------------------------------------------------------------------
+# poll_loop
+# --------------------------------------------------------------------------
+
+
+class _StopLoop(BaseException):
+    """poll_loop の except Exception に捕捉されずに無限ループを抜けるための例外。"""
+
+
+class TestPollLoop:
+    def test_sleeps_interval_in_short_polling(self, tmp_path):
+        with patch("src.main.poll_once"), \
+                patch("src.main.time.sleep", side_effect=_StopLoop) as mock_sleep:
+            try:
+                poll_loop("token", -1001234, MagicMock(), MagicMock(), tmp_path, MagicMock(), 300)
+            except _StopLoop:
+                pass
+        mock_sleep.assert_called_once_with(300)
+
+    def test_long_polling_does_not_sleep_on_success(self, tmp_path):
+        calls = {"n": 0}
+
+        def fake_poll_once(*args, **kwargs):
+            calls["n"] += 1
+            if calls["n"] == 3:
+                raise _StopLoop
+
+        with patch("src.main.poll_once", side_effect=fake_poll_once), \
+                patch("src.main.time.sleep") as mock_sleep:
+            try:
+                poll_loop(
+                    "token", -1001234, MagicMock(), MagicMock(), tmp_path, MagicMock(), 300,
+                    poll_timeout=50,
+                )
+            except _StopLoop:
+                pass
+        assert calls["n"] == 3
+        mock_sleep.assert_not_called()
+
+    def test_logs_when_new_connection_opened(self, tmp_path):
+        client = MagicMock()
+        client.stats.connections = 0
+        logger = MagicMock()
+
+        def fake_poll_once(*args, **kwargs):
+            client.stats.connections = 1
+
+        with patch("src.main.poll_once", side_effect=fake_poll_once), \
+                patch("src.main.time.sleep", side_effect=_StopLoop):
+            try:
+                poll_loop(
+                    "token", -1001234, MagicMock(), MagicMock(), tmp_path, logger, 300,
+                    client=client,
+                )
+            except _StopLoop:
+                pass
+        assert any("HTTP connection opened" in c.args[0] for c in logger.info.call_args_list)
+
+    def test_long_polling_sleeps_after_error(self, tmp_path):
+        with patch("src.main.poll_once", side_effect=RuntimeError("boom")), \
+                patch("src.main.time.sleep", side_effect=_StopLoop) as mock_sleep:
+            try:
+                poll_loop(
+                    "token", -1001234, MagicMock(), MagicMock(), tmp_path, MagicMock(), 300,
+                    poll_timeout=50,
+                )
+            except _StopLoop:
+                pass
+        mock_sleep.assert_called_once_with(300)
+
+
+# --------------------------------------------------------------------------
+# ingest_async
+# --------------------------------------------------------------------------
+
+
+class TestIngestAsync:
+    @pytest.mark.asyncio
+    async def test_writes_batches_and_saves_offsets_in_order(self, tmp_path):
+        store = _make_store(offset=100)
+        writer = MagicMock()
+        stop = asyncio.Event()
+        batches = [([_msg(1)], 101), ([_msg(2)], 102)]
+
+        async def fake_fetch(bot_token, chat_id, offset, **kwargs):
+            batch = batches.pop(0)
+            if not batches:
+                stop.set()
+            return batch
+
+        with patch("src.main.fetch_async", side_effect=fake_fetch):
+            await ingest_async(
+                "token", -1001234, store, writer, tmp_path, MagicMock(), 0,
+                client=MagicMock(), poll_timeout=50, stop=stop,
+            )
+
+        saved = [c.args[0].last_update_id for c in store.save.call_args_list]
+        assert saved == [101, 102]
+        assert len(_load_day_messages("2026-02-22", tmp_path)) == 2
+
+    @pytest.mark.asyncio
+    async def test_next_fetch_in_flight_while_writing(self, tmp_path):
+        store = _make_store(offset=100)
+        stop = asyncio.Event()
+        second_fetch_started = threading.Event()
+        offsets: list[int] = []
+
+        async def fake_fetch(bot_token, chat_id, offset, **kwargs):
+            offsets.append(offset)
+            if len(offsets) == 2:
+                second_fetch_started.set()
+                stop.set()
+            return [_msg(len(offsets))], offset + 1
+
+        overlapped: list[bool] = []
+
+        def slow_write(*args, **kwargs):
+            overlapped.append(second_fetch_started.wait(timeout=2))
+
+        with patch("src.main.fetch_async", side_effect=fake_fetch), \
+                patch("src.main._write_days", side_effect=slow_write):
+            await ingest_async(
+                "token", -1001234, store, MagicMock(), tmp_path, MagicMock(), 0,
+                client=MagicMock(), poll_timeout=50, stop=stop,
+            )
+
+        assert offsets == [100, 101]
+        assert overlapped[0] is True
+
+    @pytest.mark.asyncio
+    async def test_failed_write_is_retried_without_losing_messages(self, tmp_path):
+        store = StateStore(tmp_path / "state.json")
+        store.save(State(last_update_id=100, last_run_at=_DT))
+        stop = asyncio.Event()
+        batches = [([_msg(1)], 101), ([_msg(2)], 102), ([_msg(3)], 103)]
+
+        async def fake_fetch(bot_token, chat_id, offset, **kwargs):
+            batch = batches.pop(0)
+            if not batches:
+                stop.set()
+            return batch
+
+        real_write_days = _write_days
+        failures = iter([OSError("disk full")])
+
+        def flaky_write_days(*args, **kwargs):
+            error = next(failures, None)
+            if error is not None:
+                raise error
+            return real_write_days(*args, **kwargs)
+
+        with patch("src.main.fetch_async", side_effect=fake_fetch), \
+                patch("src.main._write_days", side_effect=flaky_write_days):
+            await ingest_async(
+                "token", -1001234, store, MagicMock(), tmp_path / "messages", MagicMock(), 0,
+                client=MagicMock(), poll_timeout=50, stop=stop, queue_size=1, retry_delay=0,
+            )
+
+        assert store.load().last_update_id == 103
+        assert [m.message_id for m in _load_day_messages("2026-02-22", tmp_path / "messages")] \
+            == [1, 2, 3]
+
+
+# --------------------------------------------------------------------------
+# serve_webhook
+# --------------------------------------------------------------------------
+
+
+def _raw_update(update_id, message_id, chat_id=-1001234):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": message_id,
+            "chat": {"id": chat_id},
+            "date": int(_DT.timestamp()),
+            "text": f"msg {message_id}",
+        },
+    }
+
+
+class TestServeWebhook:
+    def test_ingests_posted_updates(self, tmp_path):
+        store = StateStore(tmp_path / "state.json")
+        writer = MagicMock()
+        server = WebhookServer(("127.0.0.1", 0))
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=serve_webhook,
+            args=(-1001234, store, writer, tmp_path, MagicMock(), server),
+            kwargs={"batch_wait": 0.05, "stop": stop},
+        )
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/"
+            httpx.post(url, json=[_raw_update(10, 1), _raw_update(11, 2)]).raise_for_status()
+            httpx.post(url, json=_raw_update(12, 3, chat_id=-9999)).raise_for_status()
+        finally:
+            stop.set()
+            thread.join(timeout=5)
+
+        saved = _load_day_messages("2026-02-22", tmp_path)
+        assert {m.message_id for m in saved} == {1, 2}
+        assert store.load().last_update_id == 13
+
+    def test_failed_write_is_retried(self, tmp_path):
+        store = StateStore(tmp_path / "state.json")
+        server = WebhookServer(("127.0.0.1", 0))
+        stop = threading.Event()
+        real_write_days = _write_days
+        failures = iter([OSError("disk full")])
+
+        def flaky_write_days(*args, **kwargs):
+            error = next(failures, None)
+            if error is not None:
+                raise error
+            return real_write_days(*args, **kwargs)
+
+        thread = threading.Thread(
+            target=serve_webhook,
+            args=(-1001234, store, MagicMock(), tmp_path, MagicMock(), server),
+            kwargs={"batch_wait": 0.05, "stop": stop, "retry_delay": 0},
+        )
+        with patch("src.main._write_days", side_effect=flaky_write_days):
+            thread.start()
+            try:
+                url = f"http://127.0.0.1:{server.server_port}/"
+                httpx.post(url, json=[_raw_update(10, 1), _raw_update(11, 2)]).raise_for_status()
+            finally:
+                stop.set()
+                thread.join(timeout=5)
+
+        assert not thread.is_alive()
+        saved = _load_day_messages("2026-02-22", tmp_path)
+        assert {m.message_id for m in saved} == {1, 2}
+        assert store.load().last_update_id == 12
+
 
 # --------------------------------------------------------------------------
 # generate_daily
@@ -195,3 +646,156 @@ class TestGenerateDaily:
 
         written = writer.write.call_args[0][0]
         assert written.date == "2026-02-22"
+
+
+# --------------------------------------------------------------------------
+# generate_range
+# --------------------------------------------------------------------------
+
+
+def _seed_days(messages_dir, days):
+    for day in days:
+        _save_day_messages(
+            f"2026-02-{day:02d}", [_msg(day, dt=_DT.replace(day=day))], messages_dir
+        )
+
+
+class TestGenerateRange:
+    def test_writes_all_dates_in_worker_processes(self, tmp_path):
+        _seed_days(tmp_path / "messages", [20, 21, 22])
+        writer = JournalWriter(tmp_path / "daily")
+        dates = ["2026-02-20", "2026-02-21", "2026-02-22"]
+
+        stats = generate_range(dates, writer, tmp_path / "messages", MagicMock(), workers=2)
+
+        assert (stats.written, stats.skipped, stats.failed) == (3, 0, [])
+        assert all((tmp_path / "daily" / f"{d}.md").exists() for d in dates)
+
+    def test_respects_done_marker_and_unchanged_days(self, tmp_path):
+        _seed_days(tmp_path / "messages", [21, 22])
+        writer = JournalWriter(tmp_path / "daily")
+        generate_range(["2026-02-22"], writer, tmp_path / "messages", MagicMock(), workers=1)
+        (tmp_path / "daily").mkdir(exist_ok=True)
+        (tmp_path / "daily" / "2026-02-21.md.done").touch()
+
+        stats = generate_range(
+            ["2026-02-21", "2026-02-22"], writer, tmp_path / "messages", MagicMock(), workers=1
+        )
+
+        assert (stats.written, stats.skipped) == (0, 2)
+        assert not (tmp_path / "daily" / "2026-02-21.md").exists()
+
+    def test_records_failed_dates_and_continues(self, tmp_path):
+        _seed_days(tmp_path / "messages", [21, 22])
+        writer = JournalWriter(tmp_path / "daily")
+        real_write = JournalWriter.write
+
+        def flaky_write(self, summary, logger=None, **kwargs):
+            if summary.date == "2026-02-21":
+                raise OSError("disk full")
+            return real_write(self, summary, logger, **kwargs)
+
+        with patch.object(JournalWriter, "write", flaky_write):
+            stats = generate_range(
+                ["2026-02-21", "2026-02-22"], writer, tmp_path / "messages", MagicMock(),
+                workers=1,
+            )
+
+        assert stats.failed == ["2026-02-21"]
+        assert stats.written == 1
+
+
+# --------------------------------------------------------------------------
+# fetch_media
+# --------------------------------------------------------------------------
+
+
+class TestFetchMedia:
+    def test_downloads_and_rerenders_days_with_attachments(self, tmp_path):
+        with_photo = _msg(1, dt=_DT.replace(day=21))
+        with_photo.attachments = [Attachment("p", "photo_p.jpg", "photo", file_unique_id="u1")]
+        _save_day_messages("2026-02-21", [with_photo], tmp_path)
+        _save_day_messages("2026-02-22", [_msg(2)], tmp_path)
+        fetcher = MagicMock()
+        writer = MagicMock()
+
+        fetch_media(["2026-02-21", "2026-02-22"], fetcher, writer, tmp_path, MagicMock())
+
+        fetcher.download.assert_called_once_with([with_photo])
+        assert [c[0][0].date for c in writer.write.call_args_list] == ["2026-02-21"]
+
+
+# --------------------------------------------------------------------------
+# rebuild_daily
+# --------------------------------------------------------------------------
+
+
+class TestRebuildDaily:
+    def _rebuild(self, tmp_path, **kwargs):
+        writer = JournalWriter(tmp_path / "daily")
+        return rebuild_daily(writer, tmp_path / "messages", MagicMock(), workers=1, **kwargs)
+
+    def test_first_rebuild_renders_every_day(self, tmp_path):
+        _seed_days(tmp_path / "messages", [21, 22])
+        stats = self._rebuild(tmp_path)
+        assert stats.written == 2
+        assert (tmp_path / "daily" / ".manifest.json").exists()
+
+    def test_only_changed_days_are_regenerated(self, tmp_path):
+        _seed_days(tmp_path / "messages", [20, 21, 22])
+        self._rebuild(tmp_path)
+        _save_day_messages(
+            "2026-02-21", [_msg(21, "edited", dt=_DT.replace(day=21))], tmp_path / "messages"
+        )
+
+        with patch("src.main.generate_range", wraps=generate_range) as spy:
+            self._rebuild(tmp_path)
+
+        assert spy.call_args[0][0] == ["2026-02-21"]
+
+    def test_missing_markdown_is_regenerated(self, tmp_path):
+        _seed_days(tmp_path / "messages", [21, 22])
+        self._rebuild(tmp_path)
+        (tmp_path / "daily" / "2026-02-22.md").unlink()
+
+        stats = self._rebuild(tmp_path)
+
+        assert stats.written == 1
+        assert (tmp_path / "daily" / "2026-02-22.md").exists()
+
+    def test_renderer_version_change_rebuilds_everything(self, tmp_path):
+        _seed_days(tmp_path / "messages", [21, 22])
+        self._rebuild(tmp_path)
+
+        with patch("src.main.RENDERER_VERSION", 999), \
+                patch("src.main.generate_range", wraps=generate_range) as spy:
+            self._rebuild(tmp_path)
+
+        assert spy.call_args[0][0] == ["2026-02-21", "2026-02-22"]
+
+    def test_tag_rules_change_rebuilds_everything(self, tmp_path):
+        _seed_days(tmp_path / "messages", [21, 22])
+        self._rebuild(tmp_path)
+        writer = JournalWriter(tmp_path / "daily", Tagger({"memo": TagRule(keywords=["メモ"])}))
+
+        with patch("src.main.generate_range", wraps=generate_range) as spy:
+            rebuild_daily(writer, tmp_path / "messages", MagicMock(), workers=1)
+            rebuild_daily(writer, tmp_path / "messages", MagicMock(), workers=1)
+
+        assert [c[0][0] for c in spy.call_args_list] == [["2026-02-21", "2026-02-22"], []]
+
+    def test_failed_day_is_retried_next_time(self, tmp_path):
+        _seed_days(tmp_path / "messages", [21, 22])
+        real_write = JournalWriter.write
+
+        def flaky_write(self, summary, logger=None, **kwargs):
+            if summary.date == "2026-02-21":
+                raise OSError("disk full")
+            return real_write(self, summary, logger, **kwargs)
+
+        with patch.object(JournalWriter, "write", flaky_write):
+            self._rebuild(tmp_path)
+        with patch("src.main.generate_range", wraps=generate_range) as spy:
+            self._rebuild(tmp_path)
+
+        assert spy.call_args[0][0] == ["2026-02-21"]
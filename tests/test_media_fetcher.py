@@ -0,0 +1,280 @@
+import hashlib
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from zoneinfo import ZoneInfo
+
+import httpx
+import pytest
+
+from src.media_fetcher import MediaFetcher
+from src.media_store import MediaStore
+from src.models import Attachment, Message
+
+JST = ZoneInfo("Asia/Tokyo")
+_TOKEN = "123:abc"
+_VIDEO = bytes(range(256)) * 400  # 100 KiB
+_PHOTO = b"\xff\xd8photo" * 100
+
+
+# --------------------------------------------------------------------------
+# 偽の Bot API ファイルサーバ
+# --------------------------------------------------------------------------
+
+
+class _FakeFileServer(ThreadingHTTPServer):
+    """getFile とファイル本文（Range 対応）を返すローカルサーバ。
+
+    files は file_id → (file_unique_id, file_path, 本文)。cut_after を設定すると
+    次の本文レスポンスをそのバイト数で切断する。ignore_range で Range を無視する。
+    """
+
+    def __init__(self, files):
+        super().__init__(("127.0.0.1", 0), _FileHandler)
+        self.files = files
+        self.requests: list[tuple[str, str | None]] = []
+        self.cut_after: int | None = None
+        self.ignore_range = False
+        self.delay = 0.0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def downloads(self):
+        return [(path, r) for path, r in self.requests if path.startswith("/file/")]
+
+
+class _FileHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: _FakeFileServer
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.server.requests.append((url.path, self.headers.get("Range")))
+        if url.path == f"/bot{_TOKEN}/getFile":
+            self._get_file(parse_qs(url.query)["file_id"][0])
+        else:
+            self._send_file(url.path.removeprefix(f"/file/bot{_TOKEN}/"))
+
+    def _get_file(self, file_id):
+        if file_id not in self.server.files:
+            self._json(400, b'{"ok": false, "description": "Bad Request: invalid file_id"}')
+            return
+        unique_id, path, body = self.server.files[file_id]
+        self._json(
+            200,
+            (
+                f'{{"ok": true, "result": {{"file_id": "{file_id}", '
+                f'"file_unique_id": "{unique_id}", "file_size": {len(body)}, '
+                f'"file_path": "{path}"}}}}'
+            ).encode(),
+        )
+
+    def _send_file(self, path):
+        body = next(b for _, p, b in self.server.files.values() if p == path)
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        try:
+            time.sleep(self.server.delay)
+            start = 0
+            range_header = self.headers.get("Range")
+            if range_header and not self.server.ignore_range:
+                start = int(range_header.removeprefix("bytes=").rstrip("-"))
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+            else:
+                self.send_response(200)
+            payload = body[start:]
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            cut, self.server.cut_after = self.server.cut_after, None
+            if cut is not None:
+                self.wfile.write(payload[:cut])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(payload)
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def _json(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = _FakeFileServer(
+        {
+            "video-id": ("video-u", "videos/file_1.mp4", _VIDEO),
+            "photo-id": ("photo-u", "photos/file_2.jpg", _PHOTO),
+            "photo-id-2": ("photo-u", "photos/file_2.jpg", _PHOTO),
+            "copy-id": ("copy-u", "photos/file_3.jpg", _PHOTO),
+        }
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MediaStore(tmp_path / "img")
+
+
+def _fetcher(server, store, **kwargs):
+    kwargs.setdefault("retry_delay", 0)
+    return MediaFetcher(store, _TOKEN, client=httpx.Client(), api_base=server.url, **kwargs)
+
+
+def _att(file_id, unique_id="", media_type="photo", name="a.jpg"):
+    return Attachment(
+        file_id=file_id, file_name=name, media_type=media_type, file_unique_id=unique_id
+    )
+
+
+def _message(*attachments, message_id=1):
+    return Message(
+        message_id=message_id,
+        timestamp=datetime(2026, 2, 22, 12, 0, tzinfo=JST),
+        text="",
+        source_chat=-1001234,
+        attachments=list(attachments),
+    )
+
+
+# --------------------------------------------------------------------------
+# MediaFetcher
+# --------------------------------------------------------------------------
+
+
+class TestDownload:
+    def test_stores_content_addressed(self, server, store):
+        att = _att("video-id", "video-u", "video", "clip.mp4")
+        stats = _fetcher(server, store).download([_message(att)])
+
+        digest = hashlib.sha256(_VIDEO).hexdigest()
+        path = store.get(att)
+        assert path == store.media_dir / digest[:2] / f"{digest}.mp4"
+        assert path.read_bytes() == _VIDEO
+        assert (stats.downloaded, stats.bytes, stats.failed) == (1, len(_VIDEO), [])
+        assert not list((store.media_dir / ".partial").iterdir())
+
+    def test_same_unique_id_downloaded_once(self, server, store):
+        messages = [
+            _message(_att("photo-id", "photo-u"), message_id=1),
+            _message(_att("photo-id-2", "photo-u"), message_id=2),
+        ]
+        stats = _fetcher(server, store).download(messages)
+        assert stats.downloaded == 1
+        assert len(server.downloads()) == 1
+
+    def test_stored_files_are_not_requested_again(self, server, store):
+        _fetcher(server, store).download([_message(_att("photo-id", "photo-u"))])
+        server.requests.clear()
+
+        stats = _fetcher(server, MediaStore(store.media_dir)).download(
+            [_message(_att("photo-id", "photo-u"))]
+        )
+
+        assert (stats.downloaded, stats.reused) == (0, 1)
+        assert server.requests == []
+
+    def test_record_without_unique_id_reuses_stored_file(self, server, store):
+        _fetcher(server, store).download([_message(_att("photo-id", "photo-u"))])
+        server.requests.clear()
+
+        legacy = _att("photo-id-2")
+        stats = _fetcher(server, store).download([_message(legacy)])
+
+        assert stats.reused == 1
+        assert server.downloads() == []
+        assert store.get(legacy) == store.get(_att("photo-id", "photo-u"))
+
+    def test_identical_content_shares_one_file(self, server, store):
+        _fetcher(server, store).download(
+            [_message(_att("photo-id", "photo-u"), _att("copy-id", "copy-u"))]
+        )
+        assert store.get(_att("photo-id", "photo-u")) == store.get(_att("copy-id", "copy-u"))
+        assert len([p for p in store.media_dir.glob("*/*") if p.parent.name != ".partial"]) == 1
+
+    def test_failure_is_recorded_and_others_continue(self, server, store):
+        stats = _fetcher(server, store).download(
+            [_message(_att("missing-id"), _att("photo-id", "photo-u"))]
+        )
+        assert stats.failed == ["missing-id"]
+        assert stats.downloaded == 1
+
+    def test_concurrency_is_bounded(self, server, store):
+        server.delay = 0.2
+        for i in range(6):
+            server.files[f"id{i}"] = (f"u{i}", f"docs/file_{i}.bin", bytes([i]) * 10)
+        messages = [_message(_att(f"id{i}", f"u{i}", "document")) for i in range(6)]
+
+        stats = _fetcher(server, store, workers=2).download(messages)
+
+        assert stats.downloaded == 6
+        assert server.max_active == 2
+
+
+class TestResume:
+    def test_interrupted_download_resumes_with_range(self, server, store):
+        server.cut_after = 30_000
+        att = _att("video-id", "video-u", "video")
+
+        stats = _fetcher(server, store, max_attempts=2).download([_message(att)])
+
+        assert stats.downloaded == 1
+        assert [r for _, r in server.downloads()] == [None, "bytes=30000-"]
+        assert store.get(att).read_bytes() == _VIDEO
+
+    def test_partial_file_survives_until_next_run(self, server, store):
+        server.cut_after = 30_000
+        att = _att("video-id", "video-u", "video")
+
+        first = _fetcher(server, store, max_attempts=1).download([_message(att)])
+        assert first.failed == ["video-id"]
+        assert store.partial_path("video-u").stat().st_size == 30_000
+
+        second = _fetcher(server, MediaStore(store.media_dir)).download([_message(att)])
+        assert second.bytes == len(_VIDEO) - 30_000
+        assert store.get(att) is None  # 別インスタンスで保存したため索引を読み直す
+        assert MediaStore(store.media_dir).get(att).read_bytes() == _VIDEO
+
+    def test_server_without_range_support_restarts(self, server, store):
+        server.cut_after = 30_000
+        server.ignore_range = True
+        att = _att("video-id", "video-u", "video")
+
+        _fetcher(server, store, max_attempts=2).download([_message(att)])
+
+        assert store.get(att).read_bytes() == _VIDEO
+
+
+class TestMediaStore:
+    def test_index_survives_reopen(self, server, store):
+        _fetcher(server, store).download([_message(_att("photo-id", "photo-u"))])
+        reopened = MediaStore(store.media_dir)
+        assert reopened.get(_att("photo-id", "photo-u")).read_bytes() == _PHOTO
+
+    def test_missing_file_is_not_returned(self, server, store):
+        att = _att("photo-id", "photo-u")
+        _fetcher(server, store).download([_message(att)])
+        store.get(att).unlink()
+        assert store.get(att) is None
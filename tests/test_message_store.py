@@ -0,0 +1,372 @@
+import json
+import random
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.message_store import MessageStore, dict_to_msg, merge_messages, msg_to_dict
+from src.models import Attachment, Message
+
+JST = ZoneInfo("Asia/Tokyo")
+_DT = datetime(2026, 2, 22, 12, 0, tzinfo=JST)
+
+
+def _msg(message_id=1, text="hello", hour=12):
+    return Message(
+        message_id=message_id,
+        timestamp=_DT.replace(hour=hour),
+        text=text,
+        source_chat=-1001234,
+        attachments=[],
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MessageStore(tmp_path)
+
+
+# --------------------------------------------------------------------------
+# シリアライズ
+# --------------------------------------------------------------------------
+
+
+class TestMsgSerialization:
+    def test_roundtrip(self):
+        msg = _msg()
+        assert dict_to_msg(msg_to_dict(msg)) == msg
+
+    def test_timestamp_preserves_timezone(self):
+        msg = _msg()
+        restored = dict_to_msg(msg_to_dict(msg))
+        assert restored.timestamp == msg.timestamp
+
+    def test_roundtrip_with_attachment(self):
+        msg = _msg()
+        msg.attachments = [Attachment(file_id="f", file_name="a.jpg", media_type="photo")]
+        assert dict_to_msg(msg_to_dict(msg)) == msg
+
+    def test_file_unique_id_written_only_when_known(self):
+        msg = _msg()
+        msg.attachments = [Attachment(file_id="f", file_name="a.jpg", media_type="photo")]
+        assert "file_unique_id" not in msg_to_dict(msg)["attachments"][0]
+        msg.attachments[0].file_unique_id = "u1"
+        assert dict_to_msg(msg_to_dict(msg)) == msg
+
+
+# --------------------------------------------------------------------------
+# 追記ログ
+# --------------------------------------------------------------------------
+
+
+class TestAppend:
+    def test_load_returns_empty_when_no_file(self, store):
+        assert store.load("2026-02-22") == []
+
+    def test_append_and_load(self, store):
+        store.append("2026-02-22", [_msg(1)])
+        store.append("2026-02-22", [_msg(2)])
+        assert [m.message_id for m in store.load("2026-02-22")] == [1, 2]
+
+    def test_edit_resolved_at_read_time(self, store):
+        store.append("2026-02-22", [_msg(1, "original")])
+        store.append("2026-02-22", [_msg(1, "edited")])
+        loaded = store.load("2026-02-22")
+        assert len(loaded) == 1
+        assert loaded[0].text == "edited"
+
+    def test_load_sorted_by_timestamp(self, store):
+        store.append("2026-02-22", [_msg(2, hour=15)])
+        store.append("2026-02-22", [_msg(1, hour=9)])
+        assert [m.message_id for m in store.load("2026-02-22")] == [1, 2]
+
+    def test_append_only_writes_new_lines(self, store, tmp_path):
+        store.append("2026-02-22", [_msg(1)])
+        store.append("2026-02-22", [_msg(2)])
+        assert len((tmp_path / "2026-02-22.jsonl").read_text().splitlines()) == 2
+
+    def test_skips_truncated_trailing_line(self, store, tmp_path):
+        store.append("2026-02-22", [_msg(1)])
+        with (tmp_path / "2026-02-22.jsonl").open("a") as f:
+            f.write('{"message_id": 2, "timest')
+        assert [m.message_id for m in store.load("2026-02-22")] == [1]
+        # クラッシュ後の追記は途切れた行に続けず、新しい行として読める
+        store.append("2026-02-22", [_msg(3, hour=13)])
+        assert [m.message_id for m in MessageStore(tmp_path).load("2026-02-22")] == [1, 3]
+
+
+class TestSkipUnchanged:
+    def test_identical_records_not_appended(self, store, tmp_path):
+        store.append("2026-02-22", [_msg(1)])
+        assert store.append("2026-02-22", [_msg(1)]) == []
+        assert len((tmp_path / "2026-02-22.jsonl").read_text().splitlines()) == 1
+
+    def test_returns_only_changed_records(self, store):
+        store.append("2026-02-22", [_msg(1)])
+        written = store.append("2026-02-22", [_msg(1), _msg(1, "edited"), _msg(2)])
+        assert [(m.message_id, m.text) for m in written] == [(1, "edited"), (2, "hello")]
+
+    def test_duplicate_within_batch_written_once(self, store):
+        assert len(store.append("2026-02-22", [_msg(1), _msg(1)])) == 1
+
+    def test_changed_serializes_only_incoming_ids(self, store, monkeypatch):
+        store.append("2026-02-22", [_msg(i) for i in range(1, 51)])
+        serialized = []
+        original = msg_to_dict
+        monkeypatch.setattr(
+            "src.message_store.msg_to_dict", lambda m: serialized.append(m) or original(m)
+        )
+        assert store.changed("2026-02-22", [_msg(3, "edited")]) != []
+        assert {m.message_id for m in serialized} == {3}
+
+
+def _dated(message_id=1, text="hello", dt=_DT):
+    return Message(
+        message_id=message_id, timestamp=dt, text=text, source_chat=-1001234, attachments=[]
+    )
+
+
+class TestMergeMessages:
+    def test_dedup_by_message_id_keeps_last(self):
+        merged = merge_messages([], [_dated(1, "first"), _dated(1, "edited")])
+        assert len(merged) == 1
+        assert merged[0].text == "edited"
+
+    def test_new_overwrites_existing(self):
+        merged = merge_messages([_dated(1, "old")], [_dated(1, "new")])
+        assert len(merged) == 1
+        assert merged[0].text == "new"
+
+    def test_sorted_by_timestamp(self):
+        dt1 = datetime(2026, 2, 22, 10, 0, tzinfo=JST)
+        dt2 = datetime(2026, 2, 22, 12, 0, tzinfo=JST)
+        merged = merge_messages([_dated(2, dt=dt2)], [_dated(1, dt=dt1)])
+        assert [m.message_id for m in merged] == [1, 2]
+
+    def test_combines_existing_and_new(self):
+        merged = merge_messages([_dated(1)], [_dated(2)])
+        assert len(merged) == 2
+
+    def test_edit_with_new_timestamp_is_moved(self):
+        dt1 = datetime(2026, 2, 22, 10, 0, tzinfo=JST)
+        dt2 = datetime(2026, 2, 22, 12, 0, tzinfo=JST)
+        dt3 = datetime(2026, 2, 22, 14, 0, tzinfo=JST)
+        merged = merge_messages([_dated(1, dt=dt1), _dated(2, dt=dt2)], [_dated(1, dt=dt3)])
+        assert [(m.message_id, m.timestamp) for m in merged] == [(2, dt2), (1, dt3)]
+
+    def test_matches_dict_and_sort_reference(self):
+        rng = random.Random(0)
+        for _ in range(50):
+            minutes = sorted(rng.sample(range(600), 40))
+            existing = [
+                _dated(i, dt=_DT.replace(hour=0) + timedelta(minutes=m))
+                for i, m in enumerate(minutes[:30])
+            ]
+            new = [
+                _dated(30 + rng.randrange(10), dt=_DT.replace(hour=0) + timedelta(minutes=m))
+                for m in rng.sample(range(600), 10)
+            ]
+            new += [_dated(m.message_id, "edited", dt=m.timestamp) for m in rng.sample(existing, 5)]
+            rng.shuffle(new)
+
+            by_id = {m.message_id: m for m in existing}
+            for m in new:
+                by_id[m.message_id] = m
+            expected = sorted(by_id.values(), key=lambda m: m.timestamp)
+            assert merge_messages(existing, new) == expected
+
+
+
+
+class TestAppendMerged:
+    def test_returns_changed_and_merged_day(self, store):
+        store.append("2026-02-22", [_msg(1), _msg(2, hour=14)])
+        existing = store.load("2026-02-22")
+        changed, merged = store.append_merged(
+            "2026-02-22", [_msg(2, hour=14), _msg(3, hour=13)], existing
+        )
+        assert [m.message_id for m in changed] == [3]
+        assert [m.message_id for m in merged] == [1, 3, 2]
+
+    def test_merged_day_is_cached_without_refolding(self, store, monkeypatch):
+        store.append("2026-02-22", [_msg(1)])
+        existing = store.load("2026-02-22")
+        monkeypatch.setattr("src.message_store._fold", None)  # 呼ばれたら失敗する
+        _, merged = store.append_merged("2026-02-22", [_msg(2, hour=13)], existing)
+
+        hits = store.cache_stats.hits
+        assert store.load("2026-02-22") == merged
+        assert store.cache_stats.hits == hits + 1
+
+    def test_nothing_changed_returns_existing(self, store):
+        store.append("2026-02-22", [_msg(1)])
+        existing = store.load("2026-02-22")
+        assert store.append_merged("2026-02-22", [_msg(1)], existing) == ([], existing)
+
+class TestCompact:
+    def test_folds_edits_into_one_line(self, store, tmp_path):
+        store.append("2026-02-22", [_msg(1, "a")])
+        store.append("2026-02-22", [_msg(1, "b"), _msg(2)])
+        store.compact("2026-02-22")
+        lines = (tmp_path / "2026-02-22.jsonl").read_text().splitlines()
+        assert len(lines) == 2
+        assert [m.text for m in store.load("2026-02-22")] == ["b", "hello"]
+
+
+class TestDigest:
+    def test_empty_for_missing_day(self, store):
+        assert store.digest("2026-02-22") == ""
+
+    def test_changes_only_when_content_changes(self, store):
+        store.append("2026-02-22", [_msg(1)])
+        before = store.digest("2026-02-22")
+        store.append("2026-02-22", [_msg(1)])  # 同一内容は書かれない
+        assert store.digest("2026-02-22") == before
+        store.append("2026-02-22", [_msg(1, "edited")])
+        assert store.digest("2026-02-22") != before
+
+    def test_unchanged_by_compact(self, store):
+        store.append("2026-02-22", [_msg(1, "a")])
+        store.append("2026-02-22", [_msg(1, "b"), _msg(2)])
+        before = store.digest("2026-02-22")
+        store.compact("2026-02-22")
+        assert store.digest("2026-02-22") == before
+
+
+class TestIterMessages:
+    @pytest.fixture
+    def archive(self, store):
+        for day in (21, 22, 23):
+            date_str = f"2026-02-{day}"
+            store.append(date_str, [
+                Message(
+                    message_id=day * 100 + hour,
+                    timestamp=datetime(2026, 2, day, hour, 0, tzinfo=JST),
+                    text=f"{day}-{hour}",
+                    source_chat=-1001234 if hour % 2 else -1005678,
+                    attachments=[],
+                )
+                for hour in (9, 12, 18, 21)
+            ])
+        return store
+
+    def test_range_across_days_in_timestamp_order(self, archive):
+        start = datetime(2026, 2, 21, 18, 0, tzinfo=JST)
+        end = datetime(2026, 2, 23, 12, 0, tzinfo=JST)
+        texts = [m.text for m in archive.iter_messages(start, end)]
+        assert texts == ["21-18", "21-21", "22-9", "22-12", "22-18", "22-21", "23-9"]
+
+    def test_filters_by_chat(self, archive):
+        start = datetime(2026, 2, 22, 0, 0, tzinfo=JST)
+        end = datetime(2026, 2, 23, 0, 0, tzinfo=JST)
+        texts = [m.text for m in archive.iter_messages(start, end, chat_id=-1001234)]
+        assert texts == ["22-9", "22-21"]
+
+    def test_other_timezone_and_naive_bounds(self, archive):
+        start = datetime(2026, 2, 22, 0, 0, tzinfo=ZoneInfo("UTC"))  # JST 09:00
+        end = datetime(2026, 2, 22, 18, 0)  # JST とみなす
+        texts = [m.text for m in archive.iter_messages(start, end)]
+        assert texts == ["22-9", "22-12"]
+
+    def test_lazy_and_stops_after_range(self, archive, monkeypatch):
+        loaded = []
+        original = archive._read_day
+        monkeypatch.setattr(
+            archive, "_read_day", lambda d: loaded.append(d) or original(d)
+        )
+        it = archive.iter_messages(
+            datetime(2026, 2, 21, 0, 0, tzinfo=JST), datetime(2026, 2, 22, 10, 0, tzinfo=JST)
+        )
+        assert next(it).text == "21-9"
+        assert loaded == ["2026-02-21"]
+        assert [m.text for m in it][-1] == "22-9"
+        assert loaded == ["2026-02-21", "2026-02-22"]
+
+    def test_does_not_fill_cache(self, tmp_path):
+        store = MessageStore(tmp_path, cache_size=1)
+        store.append("2026-02-21", [_msg(1)])
+        store.append("2026-02-23", [_msg(2)])
+        store.load("2026-02-23")
+        list(store.iter_messages(_DT.replace(day=20), _DT.replace(day=24)))
+
+        hits = store.cache_stats.hits
+        store.load("2026-02-23")
+        assert store.cache_stats.hits == hits + 1
+
+    def test_yields_messages_with_attachments(self, store):
+        att = Attachment(file_id="f", file_name="a.jpg", media_type="photo")
+        msg = Message(
+            message_id=1, timestamp=_DT, text="", source_chat=-1001234, attachments=[att]
+        )
+        store.append("2026-02-22", [msg])
+        got = list(store.iter_messages(_DT, _DT.replace(hour=13)))
+        assert got == [msg]
+
+
+class TestMigration:
+    def _write_legacy(self, tmp_path, messages):
+        (tmp_path / "2026-02-22.json").write_text(
+            json.dumps([msg_to_dict(m) for m in messages], ensure_ascii=False, indent=2)
+        )
+
+    def test_loads_legacy_json(self, store, tmp_path):
+        self._write_legacy(tmp_path, [_msg(1), _msg(2)])
+        assert [m.message_id for m in store.load("2026-02-22")] == [1, 2]
+        assert not (tmp_path / "2026-02-22.json").exists()
+        assert (tmp_path / "2026-02-22.jsonl").exists()
+
+    def test_append_after_legacy_keeps_old_messages(self, store, tmp_path):
+        self._write_legacy(tmp_path, [_msg(1)])
+        store.append("2026-02-22", [_msg(2)])
+        assert [m.message_id for m in store.load("2026-02-22")] == [1, 2]
+
+    def test_dates_include_legacy_and_jsonl(self, store, tmp_path):
+        self._write_legacy(tmp_path, [_msg(1)])
+        store.append("2026-02-23", [_msg(2)])
+        assert store.dates() == ["2026-02-22", "2026-02-23"]
+
+
+class TestCache:
+    def test_second_load_is_cache_hit(self, store):
+        store.append("2026-02-22", [_msg(1)])
+        store.load("2026-02-22")
+        store.load("2026-02-22")
+        assert store.cache_stats.misses == 1
+        assert store.cache_stats.hits == 1
+
+    def test_append_writes_through_to_cache(self, store):
+        store.append("2026-02-22", [_msg(1)])
+        store.load("2026-02-22")
+        store.append("2026-02-22", [_msg(2), _msg(1, "edited")])
+        loaded = store.load("2026-02-22")
+        assert [(m.message_id, m.text) for m in loaded] == [(1, "edited"), (2, "hello")]
+        assert store.cache_stats.misses == 1
+
+    def test_external_edit_invalidates_cache(self, store, tmp_path):
+        store.save("2026-02-22", [_msg(1)])
+        store.load("2026-02-22")
+        other = MessageStore(tmp_path)
+        other.append("2026-02-22", [_msg(2)])
+        assert [m.message_id for m in store.load("2026-02-22")] == [1, 2]
+        assert store.cache_stats.misses == 1
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        store = MessageStore(tmp_path, cache_size=1)
+        store.save("2026-02-21", [_msg(1)])
+        store.save("2026-02-22", [_msg(2)])
+        store.load("2026-02-21")
+        assert store.cache_stats.misses == 1
+
+    def test_cache_disabled_with_zero_size(self, tmp_path):
+        store = MessageStore(tmp_path, cache_size=0)
+        store.save("2026-02-22", [_msg(1)])
+        store.load("2026-02-22")
+        store.load("2026-02-22")
+        assert store.cache_stats.hits == 0
+        assert store.cache_stats.misses == 2
+
+    def test_returned_list_does_not_alias_cache(self, store):
+        store.save("2026-02-22", [_msg(1)])
+        store.load("2026-02-22").append(_msg(2))
+        assert len(store.load("2026-02-22")) == 1
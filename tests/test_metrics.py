@@ -0,0 +1,183 @@
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from zoneinfo import ZoneInfo
+
+import httpx
+import pytest
+
+from src.journal_writer import JournalWriter
+from src.main import _start_metrics_server, poll_once
+from src.message_store import MessageStore
+from src.metrics import (
+    BYTES_WRITTEN,
+    CONTENT_TYPE,
+    FETCH_LATENCY,
+    LAST_MESSAGE_TIMESTAMP,
+    LAST_OFFSET,
+    MESSAGES_INGESTED,
+    POLL_DURATION,
+    RETRIES,
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+)
+from src.models import Message
+from src.retry import with_retry
+from src.state_store import StateStore
+
+JST = ZoneInfo("Asia/Tokyo")
+
+
+def _msg(message_id, minute=0):
+    return Message(
+        message_id=message_id,
+        timestamp=datetime(2026, 2, 22, 9, minute, tzinfo=JST),
+        text=f"メモ{message_id}",
+        source_chat=-1001234,
+        attachments=[],
+    )
+
+
+class TestTextFormat:
+    def test_counter_with_labels(self):
+        registry = Registry()
+        counter = registry.register(Counter("x_bytes", "書いたバイト数"))
+        counter.inc(10, kind="daily")
+        counter.inc(5, kind="daily")
+        counter.inc(1, kind='a"b')
+        assert registry.render() == (
+            "# HELP x_bytes 書いたバイト数\n"
+            "# TYPE x_bytes counter\n"
+            'x_bytes_total{kind="daily"} 15\n'
+            'x_bytes_total{kind="a\\"b"} 1\n'
+        )
+
+    def test_unused_counter_reports_zero(self):
+        registry = Registry()
+        registry.register(Counter("x", "help"))
+        assert "x_total 0\n" in registry.render()
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        histogram = registry.register(Histogram("x_seconds", "help", buckets=(0.1, 1.0)))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(value)
+        lines = registry.render().splitlines()[2:]
+        assert lines == [
+            'x_seconds_bucket{le="0.1"} 1',
+            'x_seconds_bucket{le="1"} 3',
+            'x_seconds_bucket{le="+Inf"} 4',
+            "x_seconds_sum 4.25",
+            "x_seconds_count 4",
+        ]
+
+    def test_gauge_set_and_callback(self):
+        registry = Registry()
+        registry.register(Gauge("unset", "help"))
+        registry.register(Gauge("offset", "help")).set(101)
+        registry.register(Gauge("sizes", "help", fn=lambda: [({"date": "2026-02-22"}, 42)]))
+        text = registry.render()
+        assert "\nunset " not in text
+        assert "offset 101\n" in text
+        assert 'sizes{date="2026-02-22"} 42\n' in text
+
+
+class TestInstrumentation:
+    def test_with_retry_counts_retries(self):
+        before = RETRIES.value()
+        calls = iter([ValueError(), ValueError(), "ok"])
+
+        def flaky():
+            result = next(calls)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        assert with_retry(flaky, base_delay=0) == "ok"
+        assert RETRIES.value() == before + 2
+
+    def test_poll_once_updates_metrics(self, tmp_path):
+        polls, fetches = POLL_DURATION.count, FETCH_LATENCY.count
+        ingested = MESSAGES_INGESTED.value()
+        daily_bytes = BYTES_WRITTEN.value(kind="daily")
+        LAST_MESSAGE_TIMESTAMP.set(0)
+        updates = {
+            "ok": True,
+            "result": [
+                {
+                    "update_id": 41,
+                    "channel_post": {
+                        "message_id": 7,
+                        "date": 1771718400,
+                        "chat": {"id": -1001234},
+                        "text": "メモ",
+                    },
+                }
+            ],
+        }
+        response = MagicMock(content=b"{}")
+        response.json.return_value = updates
+        with patch("src.fetcher.httpx.get", return_value=response):
+            poll_once(
+                "token", -1001234, StateStore(tmp_path / "state.json"),
+                JournalWriter(tmp_path / "daily"), tmp_path / "messages", MagicMock(),
+            )
+
+        assert (POLL_DURATION.count, FETCH_LATENCY.count) == (polls + 1, fetches + 1)
+        assert MESSAGES_INGESTED.value() == ingested + 1
+        assert LAST_OFFSET.value() == 42
+        assert LAST_MESSAGE_TIMESTAMP.value() == 1771718400
+        assert BYTES_WRITTEN.value(kind="daily") > daily_bytes
+
+
+class TestMetricsServer:
+    @pytest.fixture
+    def server(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("METRICS_PORT", "0")
+        store = MessageStore(tmp_path / "messages")
+        store.append("2026-02-22", [_msg(1), _msg(2, 30)])
+        writer = JournalWriter(tmp_path / "daily")
+        (tmp_path / "daily").mkdir()
+        (tmp_path / "daily" / "2026-02-22.md").write_text("x" * 12)
+        server = _start_metrics_server(
+            StateStore(tmp_path / "state.json"), writer, store, MagicMock()
+        )
+        yield f"http://127.0.0.1:{server.server_port}"
+        server.shutdown()
+        server.server_close()
+
+    def test_serves_prometheus_text(self, server):
+        response = httpx.get(f"{server}/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == CONTENT_TYPE
+        text = response.text
+        assert "# TYPE telegram_diary_poll_duration_seconds histogram" in text
+        assert 'telegram_diary_daily_file_bytes{date="2026-02-22"} 12' in text
+        assert "telegram_diary_ingest_lag_seconds " in text
+        assert "telegram_diary_retries_total" in text
+
+    def test_exposes_message_cache_stats(self, server):
+        text = httpx.get(f"{server}/metrics").text
+        # 起動時に最新日を読み込んだ1回だけがキャッシュ外れ
+        assert 'telegram_diary_message_cache_lookups{result="hit"} 0' in text
+        assert 'telegram_diary_message_cache_lookups{result="miss"} 1' in text
+
+    def test_lag_counts_from_latest_stored_message(self, server):
+        text = httpx.get(f"{server}/metrics").text
+        line = next(
+            line for line in text.splitlines()
+            if line.startswith("telegram_diary_ingest_lag_seconds ")
+        )
+        latest = datetime(2026, 2, 22, 9, 30, tzinfo=JST).timestamp()
+        assert float(line.split()[1]) >= datetime.now(JST).timestamp() - latest - 1
+
+    def test_unknown_path_is_404(self, server):
+        assert httpx.get(f"{server}/").status_code == 404
+
+    def test_disabled_without_port(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("METRICS_PORT", raising=False)
+        assert _start_metrics_server(
+            StateStore(tmp_path / "s.json"), JournalWriter(tmp_path), MessageStore(tmp_path),
+            MagicMock(),
+        ) is None
@@ -0,0 +1,144 @@
+import json
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src import profiler
+from src.journal_writer import JournalWriter
+from src.main import generate_daily, poll_once
+from src.message_store import MessageStore
+from src.models import Message
+from src.profiler import format_summary, span, summarize_trace
+from src.state_store import StateStore
+
+JST = ZoneInfo("Asia/Tokyo")
+
+
+@pytest.fixture
+def trace(tmp_path):
+    path = tmp_path / "profile.jsonl"
+    profiler.enable(path)
+    yield path
+    profiler.disable()
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestSpan:
+    def test_disabled_span_records_nothing(self, tmp_path):
+        with span("fetch") as current:
+            current.bytes = 10
+        assert not profiler.enabled()
+
+    def test_records_duration_and_volume(self, trace):
+        with span("fetch") as current:
+            current.bytes = 1024
+            current.messages = 3
+        [record] = _records(trace)
+        assert record["stage"] == "fetch"
+        assert (record["bytes"], record["messages"]) == (1024, 3)
+        assert record["ms"] >= 0
+        assert record["parent"] is None
+
+    def test_nested_span_records_parent(self, trace):
+        with span("poll"):
+            with span("fetch"):
+                pass
+        inner, outer = _records(trace)
+        assert (inner["stage"], inner["parent"]) == ("fetch", "poll")
+        assert outer["stage"] == "poll"
+
+    def test_exception_is_marked_and_reraised(self, trace):
+        with pytest.raises(ValueError):
+            with span("render"):
+                raise ValueError("boom")
+        assert _records(trace)[0]["error"] is True
+
+
+class TestSummarizeTrace:
+    def test_percentiles_per_stage(self, tmp_path):
+        path = tmp_path / "profile.jsonl"
+        lines = [{"stage": "fetch", "ms": float(ms), "bytes": 10} for ms in range(1, 101)]
+        lines.append({"stage": "render", "ms": 5.0, "messages": 2})
+        path.write_text(
+            "".join(json.dumps(line) + "\n" for line in lines) + '{"stage": "broken"\n'
+        )
+
+        fetch, render = summarize_trace(path)
+
+        assert (fetch.stage, fetch.count, fetch.p50, fetch.p99) == ("fetch", 100, 50.0, 99.0)
+        assert fetch.bytes == 1000
+        assert (render.count, render.p50, render.p99, render.messages) == (1, 5.0, 5.0, 2)
+
+    def test_format_summary_has_header_and_row_per_stage(self, tmp_path):
+        path = tmp_path / "profile.jsonl"
+        path.write_text('{"stage": "fetch", "ms": 12.5}\n')
+        lines = format_summary(summarize_trace(path))
+        assert lines[0].split() == [
+            "stage", "count", "p50", "ms", "p99", "ms", "total", "ms", "bytes", "messages"
+        ]
+        assert lines[1].split()[:4] == ["fetch", "1", "12.50", "12.50"]
+
+
+# --------------------------------------------------------------------------
+# 計測箇所
+# --------------------------------------------------------------------------
+
+
+def _msg(message_id):
+    return Message(
+        message_id=message_id,
+        timestamp=datetime(2026, 2, 22, 9, message_id, tzinfo=JST),
+        text=f"メモ{message_id}",
+        source_chat=-1001234,
+        attachments=[],
+    )
+
+
+class TestInstrumentation:
+    def test_poll_once_records_each_stage(self, tmp_path, trace):
+        updates = {
+            "ok": True,
+            "result": [
+                {
+                    "update_id": 10 + i,
+                    "channel_post": {
+                        "message_id": i,
+                        "date": 1771718400 + i,
+                        "chat": {"id": -1001234},
+                        "text": f"メモ{i}",
+                    },
+                }
+                for i in (1, 2)
+            ],
+        }
+        response = MagicMock(content=json.dumps(updates).encode())
+        response.json.return_value = updates
+        with patch("src.fetcher.httpx.get", return_value=response):
+            poll_once(
+                "token", -1001234, StateStore(tmp_path / "state.json"),
+                JournalWriter(tmp_path / "daily"), tmp_path / "messages", MagicMock(),
+            )
+
+        records = {r["stage"]: r for r in _records(trace)}
+        assert {"poll", "fetch", "normalize", "load", "save", "merge", "render", "state"} <= set(
+            records
+        )
+        assert records["fetch"]["bytes"] == len(response.content)
+        assert records["normalize"]["messages"] == 2
+        assert records["render"]["bytes"] > 0
+        assert records["fetch"]["parent"] == "poll"
+
+    def test_generate_daily_records_load_and_render(self, tmp_path, trace):
+        messages = tmp_path / "messages"
+        MessageStore(messages).append("2026-02-22", [_msg(1), _msg(2)])
+        generate_daily("2026-02-22", JournalWriter(tmp_path / "daily"), messages, MagicMock())
+
+        records = _records(trace)
+        assert [r["stage"] for r in records] == ["load", "summarize", "render"]
+        assert records[1]["parent"] == "render"
+        assert records[2]["messages"] == 2
@@ -2,7 +2,7 @@ from unittest.mock import call, patch
 
 import pytest
 
-from src.retry import with_retry
+from src.retry import with_retry, with_retry_async
 
 
 class TestWithRetry:
@@ -68,3 +68,29 @@ class TestWithRetry:
             with pytest.raises(ValueError):
                 with_retry(flaky, max_attempts=1)
         assert attempts["n"] == 1
+
+
+class TestWithRetryAsync:
+    @pytest.mark.asyncio
+    async def test_retries_until_success(self):
+        attempts = {"n": 0}
+
+        async def flaky():
+            attempts["n"] += 1
+            if attempts["n"] < 3:
+                raise ValueError("not yet")
+            return "ok"
+
+        with patch("src.retry.asyncio.sleep") as mock_sleep:
+            result = await with_retry_async(flaky, max_attempts=3)
+        assert result == "ok"
+        assert mock_sleep.call_args_list == [call(1.0), call(2.0)]
+
+    @pytest.mark.asyncio
+    async def test_raises_after_max_attempts(self):
+        async def always_fails():
+            raise ValueError("always fails")
+
+        with patch("src.retry.asyncio.sleep"):
+            with pytest.raises(ValueError, match="always fails"):
+                await with_retry_async(always_fails, max_attempts=2)
@@ -0,0 +1,101 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.message_store import MessageStore
+from src.models import Attachment, Message
+from src.search_index import SearchIndex, tokenize
+
+JST = ZoneInfo("Asia/Tokyo")
+
+
+def _msg(message_id, text, day=22, hour=12, attachments=None, chat_id=-1001234):
+    return Message(
+        message_id=message_id,
+        timestamp=datetime(2026, 2, day, hour, 0, tzinfo=JST),
+        text=text,
+        source_chat=chat_id,
+        attachments=attachments or [],
+    )
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(tmp_path / "search.db")
+    yield index
+    index.close()
+
+
+def _ids(results):
+    return [r.message_id for r in results]
+
+
+class TestTokenize:
+    def test_character_bigrams(self):
+        assert tokenize("東京都") == {"東京": 1, "京都": 1}
+
+    def test_splits_on_punctuation_and_normalizes_width(self):
+        assert tokenize("晴れ、Ｐｙ") == {"晴れ": 1, "py": 1}
+
+    def test_single_character_run_kept(self):
+        assert tokenize("A 猫") == {"a": 1, "猫": 1}
+
+
+class TestSearch:
+    def test_finds_substring_in_japanese_text(self, index):
+        index.add([_msg(1, "今日は東京で会議"), _msg(2, "大阪に出張")])
+        assert _ids(index.search("東京")) == [1]
+
+    def test_rejects_scattered_bigrams(self, index):
+        index.add([_msg(1, "東京と京都に行った")])
+        assert index.search("東京都") == []
+
+    def test_all_words_required(self, index):
+        index.add([_msg(1, "東京で会議"), _msg(2, "東京で食事")])
+        assert _ids(index.search("東京 会議")) == [1]
+
+    def test_matches_attachment_names(self, index):
+        att = Attachment(file_id="f", file_name="議事録.pdf", media_type="document")
+        index.add([_msg(1, "", attachments=[att])])
+        assert _ids(index.search("議事録")) == [1]
+
+    def test_ranks_denser_match_first(self, index):
+        index.add([
+            _msg(1, "会議が長引いた。その後は買い物をして帰宅した"),
+            _msg(2, "会議、会議、会議"),
+        ])
+        assert _ids(index.search("会議")) == [2, 1]
+
+    def test_date_filters(self, index):
+        index.add([_msg(1, "メモ", day=20), _msg(2, "メモ", day=21), _msg(3, "メモ", day=22)])
+        assert sorted(_ids(index.search("メモ", since="2026-02-21"))) == [2, 3]
+        assert sorted(_ids(index.search("メモ", until="2026-02-21"))) == [1, 2]
+
+    def test_single_character_query(self, index):
+        index.add([_msg(1, "猫を見た"), _msg(2, "犬を見た")])
+        assert _ids(index.search("猫")) == [1]
+
+    def test_edit_replaces_postings(self, index):
+        index.add([_msg(1, "東京で会議")])
+        index.add([_msg(1, "大阪で会議")])
+        assert index.search("東京") == []
+        assert _ids(index.search("大阪")) == [1]
+        assert len(index) == 1
+
+    def test_limit(self, index):
+        index.add([_msg(i, "メモ", hour=i) for i in range(1, 6)])
+        assert len(index.search("メモ", limit=3)) == 3
+
+    def test_empty_query(self, index):
+        index.add([_msg(1, "メモ")])
+        assert index.search("  ") == []
+
+
+class TestImport:
+    def test_imports_all_days(self, index, tmp_path):
+        store = MessageStore(tmp_path / "messages")
+        store.append("2026-02-21", [_msg(1, "昨日のメモ", day=21)])
+        store.append("2026-02-22", [_msg(2, "今日のメモ")])
+        assert index.import_from(store) == 2
+        assert sorted(_ids(index.search("メモ"))) == [1, 2]
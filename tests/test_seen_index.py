@@ -0,0 +1,92 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.models import Message
+from src.seen_index import SeenIndex, message_digest
+
+JST = ZoneInfo("Asia/Tokyo")
+_DT = datetime(2026, 2, 22, 12, 0, tzinfo=JST)
+
+
+def _msg(message_id=1, text="hello", chat_id=-1001234):
+    return Message(
+        message_id=message_id,
+        timestamp=_DT,
+        text=text,
+        source_chat=chat_id,
+        attachments=[],
+    )
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SeenIndex(tmp_path / "seen")
+    yield index
+    index.close()
+
+
+class TestMessageDigest:
+    def test_same_content_same_digest(self):
+        assert message_digest(_msg(1)) == message_digest(_msg(1))
+
+    def test_edit_changes_digest(self):
+        assert message_digest(_msg(1)) != message_digest(_msg(1, "edited"))
+
+
+class TestSeenIndex:
+    def test_everything_unseen_initially(self, index):
+        msgs = [_msg(1), _msg(2)]
+        assert index.unseen(msgs) == msgs
+
+    def test_drops_identical_redelivery(self, index):
+        index.add([_msg(1), _msg(2)])
+        assert index.unseen([_msg(1), _msg(2), _msg(3)]) == [_msg(3)]
+
+    def test_edit_passes_and_replaces_digest(self, index):
+        index.add([_msg(1)])
+        edited = _msg(1, "edited")
+        assert index.unseen([edited]) == [edited]
+        index.add([edited])
+        assert index.unseen([edited]) == []
+
+    def test_chats_are_independent(self, index):
+        index.add([_msg(1, chat_id=-1)])
+        assert index.contains(-1, 1)
+        assert not index.contains(-2, 1)
+
+    def test_persists_across_instances(self, tmp_path, index):
+        index.add([_msg(1), _msg(5)])
+        index.close()
+        reopened = SeenIndex(tmp_path / "seen")
+        try:
+            assert reopened.unseen([_msg(1), _msg(5)]) == []
+        finally:
+            reopened.close()
+
+    def test_new_ids_are_appended_in_place(self, tmp_path, index):
+        index.add([_msg(1)])
+        inode = (tmp_path / "seen" / "-1001234.idx").stat().st_ino
+        index.add([_msg(2)])
+        path = tmp_path / "seen" / "-1001234.idx"
+        assert path.stat().st_ino == inode
+        assert path.stat().st_size == 32
+
+    def test_out_of_order_id_keeps_index_sorted(self, index):
+        index.add([_msg(10), _msg(30)])
+        index.add([_msg(20)])
+        assert all(index.contains(-1001234, i) for i in (10, 20, 30))
+        assert not index.contains(-1001234, 25)
+
+    def test_truncates_torn_record(self, tmp_path, index):
+        index.add([_msg(1)])
+        index.close()
+        with (tmp_path / "seen" / "-1001234.idx").open("ab") as f:
+            f.write(b"\x01\x02\x03")
+        reopened = SeenIndex(tmp_path / "seen")
+        try:
+            assert reopened.contains(-1001234, 1)
+            assert (tmp_path / "seen" / "-1001234.idx").stat().st_size == 16
+        finally:
+            reopened.close()
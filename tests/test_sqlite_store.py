@@ -0,0 +1,182 @@
+import sqlite3
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.message_store import MessageStore
+from src.models import Attachment, Message
+from src.sqlite_store import SqliteMessageStore
+
+JST = ZoneInfo("Asia/Tokyo")
+_DT = datetime(2026, 2, 22, 12, 0, tzinfo=JST)
+
+
+def _msg(message_id=1, text="hello", hour=12, attachments=None):
+    return Message(
+        message_id=message_id,
+        timestamp=_DT.replace(hour=hour),
+        text=text,
+        source_chat=-1001234,
+        attachments=attachments or [],
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = SqliteMessageStore(tmp_path / "messages.db")
+    yield s
+    s.close()
+
+
+class TestLoadAndAppend:
+    def test_load_returns_empty_for_unknown_date(self, store):
+        assert store.load("2026-02-22") == []
+
+    def test_roundtrip_preserves_message(self, store):
+        att = Attachment(file_id="f1", file_name="a.jpg", media_type="photo")
+        msg = _msg(1, attachments=[att])
+        store.append("2026-02-22", [msg])
+        assert store.load("2026-02-22") == [msg]
+
+    def test_roundtrip_preserves_file_unique_id(self, store):
+        att = Attachment(file_id="f1", file_name="a.jpg", media_type="photo", file_unique_id="u1")
+        store.append("2026-02-22", [_msg(1, attachments=[att])])
+        assert store.load("2026-02-22")[0].attachments == [att]
+
+    def test_adds_file_unique_id_to_old_database(self, tmp_path):
+        db = tmp_path / "old.db"
+        conn = sqlite3.connect(db)
+        conn.execute(
+            "CREATE TABLE attachments (message_id INTEGER NOT NULL, source_chat INTEGER NOT NULL,"
+            " position INTEGER NOT NULL, file_id TEXT NOT NULL, file_name TEXT NOT NULL,"
+            " media_type TEXT NOT NULL, PRIMARY KEY (message_id, source_chat, position))"
+        )
+        conn.close()
+        s = SqliteMessageStore(db)
+        att = Attachment(file_id="f1", file_name="a.jpg", media_type="photo", file_unique_id="u1")
+        s.append("2026-02-22", [_msg(1, attachments=[att])])
+        assert s.load("2026-02-22")[0].attachments == [att]
+        s.close()
+
+    def test_timestamp_keeps_timezone(self, store):
+        store.append("2026-02-22", [_msg(1)])
+        assert store.load("2026-02-22")[0].timestamp.tzinfo is not None
+
+    def test_sorted_by_timestamp(self, store):
+        store.append("2026-02-22", [_msg(2, hour=15), _msg(1, hour=9)])
+        assert [m.message_id for m in store.load("2026-02-22")] == [1, 2]
+
+    def test_upsert_overwrites_edited_message(self, store):
+        store.append("2026-02-22", [_msg(1, "old")])
+        store.append("2026-02-22", [_msg(1, "new")])
+        loaded = store.load("2026-02-22")
+        assert len(loaded) == 1
+        assert loaded[0].text == "new"
+
+    def test_edit_replaces_attachments(self, store):
+        a1 = Attachment(file_id="a", file_name="a.jpg", media_type="photo")
+        a2 = Attachment(file_id="b", file_name="b.pdf", media_type="document")
+        store.append("2026-02-22", [_msg(1, attachments=[a1]), _msg(1, attachments=[a2])])
+        assert store.load("2026-02-22")[0].attachments == [a2]
+
+    def test_days_are_separate(self, store):
+        store.append("2026-02-21", [_msg(1)])
+        store.append("2026-02-22", [_msg(2)])
+        assert [m.message_id for m in store.load("2026-02-22")] == [2]
+        assert store.dates() == ["2026-02-21", "2026-02-22"]
+
+
+    def test_identical_records_not_rewritten(self, store):
+        store.append("2026-02-22", [_msg(1)])
+        assert store.append("2026-02-22", [_msg(1)]) == []
+
+
+class TestSave:
+    def test_replaces_day(self, store):
+        store.append("2026-02-22", [_msg(1), _msg(2)])
+        store.save("2026-02-22", [_msg(3)])
+        assert [m.message_id for m in store.load("2026-02-22")] == [3]
+
+
+class TestDigest:
+    def test_tracks_content(self, store):
+        assert store.digest("2026-02-22") == ""
+        store.append("2026-02-22", [_msg(1)])
+        before = store.digest("2026-02-22")
+        store.append("2026-02-22", [_msg(1, "edited")])
+        assert store.digest("2026-02-22") not in ("", before)
+
+
+class TestTransaction:
+    def test_rolls_back_on_error(self, store):
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                store.append("2026-02-22", [_msg(1)])
+                raise RuntimeError("boom")
+        assert store.load("2026-02-22") == []
+
+    def test_nested_appends_commit_together(self, store, tmp_path):
+        with store.transaction():
+            store.append("2026-02-21", [_msg(1)])
+            store.append("2026-02-22", [_msg(2)])
+        reopened = SqliteMessageStore(tmp_path / "messages.db")
+        assert reopened.dates() == ["2026-02-21", "2026-02-22"]
+        reopened.close()
+
+
+class TestIterMessages:
+    def test_range_query(self, store):
+        store.append("2026-02-22", [_msg(1, "a", hour=9), _msg(2, "b", hour=12)])
+        store.append("2026-02-23", [
+            Message(
+                message_id=3,
+                timestamp=datetime(2026, 2, 23, 8, 0, tzinfo=JST),
+                text="c",
+                source_chat=-1001234,
+                attachments=[],
+            )
+        ])
+        start = datetime(2026, 2, 22, 10, 0, tzinfo=JST)
+        end = datetime(2026, 2, 24, 0, 0, tzinfo=JST)
+        assert [m.text for m in store.iter_messages(start, end)] == ["b", "c"]
+
+    def test_filters_by_chat_and_keeps_attachments_across_chunks(self, store, monkeypatch):
+        monkeypatch.setattr("src.sqlite_store._ITER_CHUNK", 1)
+        att = Attachment(file_id="f", file_name="a.jpg", media_type="photo")
+        other = Message(
+            message_id=9, timestamp=_DT.replace(hour=11), text="x", source_chat=-1005678,
+            attachments=[],
+        )
+        messages = [_msg(1, "a", 9, [att]), other, _msg(2, "b", 12, [att])]
+        store.append("2026-02-22", messages)
+
+        got = list(store.iter_messages(_DT.replace(hour=0), _DT.replace(hour=23), -1001234))
+        assert got == [messages[0], messages[2]]
+        assert list(store.iter_messages(datetime(2026, 2, 22, 10), _DT)) == [other]
+
+    def test_range_query_uses_ts_index(self, store):
+        plan = store._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT message_id FROM messages"
+            " WHERE ts >= ? AND ts < ? ORDER BY ts, rowid",
+            (0, 1),
+        ).fetchall()
+        assert any("idx_messages_ts" in row[-1] for row in plan)
+
+
+class TestImport:
+    def test_imports_jsonl_days(self, store, tmp_path):
+        source = MessageStore(tmp_path / "messages")
+        source.append("2026-02-21", [_msg(1)])
+        source.append("2026-02-22", [_msg(2), _msg(2, "edited")])
+        assert store.import_from(source) == 2
+        assert store.load("2026-02-22")[0].text == "edited"
+
+
+class TestDayLoadUsesIndex:
+    def test_query_plan_uses_date_index(self, store):
+        plan = store._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT message_id FROM messages WHERE date = ? ORDER BY ts",
+            ("2026-02-22",),
+        ).fetchall()
+        assert any("idx_messages_date_ts" in row[-1] for row in plan)
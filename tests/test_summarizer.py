@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from src.models import Message
+from src.summarizer import _bullet, _similarities, _tfidf_vectors, summarize
+
+JST = ZoneInfo("Asia/Tokyo")
+_BASE = datetime(2026, 2, 22, 8, 0, tzinfo=JST)
+
+
+def _messages(texts):
+    return [
+        Message(
+            message_id=i,
+            timestamp=_BASE + timedelta(minutes=10 * i),
+            text=text,
+            source_chat=-1001234,
+            attachments=[],
+        )
+        for i, text in enumerate(texts, start=1)
+    ]
+
+
+_DAY = [
+    "新しいプロジェクトの設計を考えた",
+    "昼はラーメン",
+    "プロジェクトの設計レビューで指摘をもらった",
+    "雨",
+    "設計レビューの指摘を反映してプロジェクトを進めた",
+    "コーヒーを買った",
+    "夜にプロジェクトの設計をまとめ直した",
+]
+
+
+class TestSummarize:
+    def test_short_day_has_no_summary(self):
+        assert summarize(_messages(["朝", "昼", "夜"])) == []
+
+    def test_picks_central_messages(self):
+        bullets = summarize(_messages(_DAY))
+        assert len(bullets) == 3
+        assert all("プロジェクト" in b or "設計" in b for b in bullets)
+
+    def test_bullets_in_timeline_order(self):
+        bullets = summarize(_messages(_DAY))
+        positions = [_DAY.index(b) for b in bullets]
+        assert positions == sorted(positions)
+
+    def test_count_grows_with_day_size(self):
+        texts = [f"メモ{i} 今日の作業{i % 7}について" for i in range(60)]
+        assert len(summarize(_messages(texts))) == 5
+
+    def test_ignores_messages_without_text(self):
+        bullets = summarize(_messages(["", " ", *_DAY]))
+        assert "" not in bullets
+
+    def test_deterministic(self):
+        assert summarize(_messages(_DAY)) == summarize(_messages(_DAY))
+
+
+class TestSimilarities:
+    def test_symmetric_and_only_shared_terms(self):
+        edges = _similarities(_tfidf_vectors(["東京で会議", "東京で食事", "雨"]))
+        assert edges[0][1] == edges[1][0] > 0
+        assert edges[2] == {}
+
+    def test_pairs_per_term_are_capped(self, monkeypatch):
+        monkeypatch.setattr("src.summarizer._MAX_POSTINGS", 3)
+        # 「会議」を7件が共有する（半数以下なので数える）。重みの大きい短い本文3件だけが組になる
+        texts = ["会議"] * 3 + ["会議と朝食", "会議後に散歩", "夜も会議", "午後から会議へ"]
+        texts += ["雨"] * 8
+        edges = _similarities(_tfidf_vectors(texts))
+        assert set(edges[0]) == {1, 2}
+        assert all(edges[i] == {} for i in range(3, 7))
+
+
+class TestBullet:
+    def test_joins_lines(self):
+        assert _bullet("一行目\n\n二行目\n") == "一行目 / 二行目"
+
+    def test_truncates_long_text(self):
+        bullet = _bullet("あ" * 200)
+        assert len(bullet) == 80
+        assert bullet.endswith("…")
@@ -0,0 +1,94 @@
+import json
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from src.models import Message
+from src.tagger import Tagger, TagRule, _Automaton, load_rules
+
+JST = ZoneInfo("Asia/Tokyo")
+
+
+def _msg(message_id, text, hour=12):
+    return Message(
+        message_id=message_id,
+        timestamp=datetime(2026, 2, 22, hour, 0, tzinfo=JST),
+        text=text,
+        source_chat=-1001234,
+        attachments=[],
+    )
+
+
+class TestAutomaton:
+    def test_finds_overlapping_keywords(self):
+        automaton = _Automaton({"he": {"a"}, "she": {"b"}, "hers": {"c"}})
+        assert automaton.search("ushers") == {"a", "b", "c"}
+
+    def test_follows_failure_links(self):
+        automaton = _Automaton({"abcd": {"x"}, "bce": {"y"}})
+        assert automaton.search("abce") == {"y"}
+
+    def test_no_match(self):
+        assert _Automaton({"会議": {"仕事"}}).search("散歩した") == set()
+
+
+class TestTagger:
+    def test_keyword_match(self):
+        tagger = Tagger({"仕事": TagRule(keywords=["会議"])})
+        assert tagger.tag_message(_msg(1, "午後から会議")) == {"仕事"}
+
+    def test_normalizes_width_and_case(self):
+        tagger = Tagger({"task": TagRule(keywords=["TODO"])})
+        assert tagger.tag_message(_msg(1, "ｔｏｄｏ: 買い物")) == {"task"}
+
+    def test_regex_pattern(self):
+        tagger = Tagger({"question": TagRule(patterns=[r"[?？]\s*$"])})
+        assert tagger.tag_message(_msg(1, "これでいいのかな？")) == {"question"}
+        assert tagger.tag_message(_msg(2, "？ではない")) == set()
+
+    def test_keywords_and_patterns_combined(self):
+        tagger = Tagger({
+            "健康": TagRule(keywords=["ジム"]),
+            "記録": TagRule(patterns=[r"\d+km"]),
+        })
+        assert tagger.tag_message(_msg(1, "ジムで 5km 走った")) == {"健康", "記録"}
+
+    def test_overlapping_patterns_all_match(self):
+        tagger = Tagger({"a": TagRule(patterns=[r"foo"]), "b": TagRule(patterns=[r"foobar"])})
+        assert tagger.tag_message(_msg(1, "foobar")) == {"a", "b"}
+
+    def test_pattern_backreference(self):
+        tagger = Tagger({
+            "other": TagRule(patterns=[r"(x)"]),
+            "繰り返し": TagRule(patterns=[r"(\w)\1"]),
+        })
+        assert tagger.tag_message(_msg(1, "すごごい")) == {"繰り返し"}
+
+    def test_explicit_hashtags(self):
+        tagger = Tagger({})
+        assert tagger.tag_message(_msg(1, "新しい案 #Idea #読書")) == {"idea", "読書"}
+
+    def test_default_rules(self):
+        assert Tagger().tag_message(_msg(1, "アイデアを思いついた")) == {"idea"}
+
+    def test_day_tags_in_first_appearance_order(self):
+        tagger = Tagger({
+            "仕事": TagRule(keywords=["会議"]),
+            "健康": TagRule(keywords=["ジム"]),
+        })
+        messages = [_msg(1, "ジム", hour=9), _msg(2, "会議", hour=10), _msg(3, "ジム", hour=20)]
+        assert tagger.tag(messages) == ["#健康", "#仕事"]
+
+    def test_no_tags(self):
+        assert Tagger({}).tag([_msg(1, "散歩")]) == []
+
+
+class TestLoadRules:
+    def test_loads_json_vocabulary(self, tmp_path):
+        path = tmp_path / "tags.json"
+        path.write_text(
+            json.dumps({"料理": {"keywords": ["夕飯"], "patterns": ["レシピ"]}}),
+            encoding="utf-8",
+        )
+        rules = load_rules(path)
+        assert rules == {"料理": TagRule(keywords=["夕飯"], patterns=["レシピ"])}
+        assert Tagger(rules).tag([_msg(1, "夕飯はカレー")]) == ["#料理"]
@@ -0,0 +1,277 @@
+import json
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.journal_writer import JournalWriter
+from src.message_store import MessageStore
+from src.models import DailySummary, Message, State
+from src.state_store import StateStore
+from src.wal import WalLockedError, WriteAheadLog
+
+JST = ZoneInfo("Asia/Tokyo")
+_DT = datetime(2026, 2, 22, 12, 0, tzinfo=JST)
+
+
+def _msg(message_id=1, text="hello", hour=12):
+    return Message(
+        message_id=message_id,
+        timestamp=_DT.replace(hour=hour),
+        text=text,
+        source_chat=-1001234,
+        attachments=[],
+    )
+
+
+@pytest.fixture
+def wal(tmp_path):
+    wal = WriteAheadLog(tmp_path / "state.wal")
+    yield wal
+    wal.close()
+
+
+@pytest.fixture
+def boot_id(tmp_path, monkeypatch):
+    path = tmp_path / "boot_id"
+    path.write_text("boot-1\n")
+    monkeypatch.setattr("src.wal._BOOT_ID_PATH", path)
+    return path
+
+
+def _crash_after_commit(wal: WriteAheadLog, group) -> None:
+    """WAL への記録（コミット点）までを行い、ファイルへの反映前に落ちた状態を作る。"""
+    with wal.path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"ops": group.ops}, ensure_ascii=False) + "\n")
+
+
+# --------------------------------------------------------------------------
+# コミット
+# --------------------------------------------------------------------------
+
+
+class TestCommit:
+    def test_applies_writes_and_appends(self, wal, tmp_path):
+        (tmp_path / "log.txt").write_text("a\n")
+        group = wal.begin()
+        group.write(tmp_path / "state.json", "{}")
+        group.append(tmp_path / "log.txt", "b\n")
+        group.append(tmp_path / "log.txt", "c\n")
+        wal.commit(group)
+        assert (tmp_path / "state.json").read_text() == "{}"
+        assert (tmp_path / "log.txt").read_text() == "a\nb\nc\n"
+
+    def test_nothing_written_before_commit(self, wal, tmp_path):
+        group = wal.begin()
+        group.write(tmp_path / "state.json", "{}")
+        assert not (tmp_path / "state.json").exists()
+        assert not wal.path.exists()
+
+    def test_empty_group_does_not_touch_log(self, wal):
+        wal.commit(wal.begin())
+        assert not wal.path.exists()
+
+    def test_keeps_log_until_checkpoint(self, tmp_path):
+        wal = WriteAheadLog(tmp_path / "state.wal", checkpoint_every=2)
+        for i in range(2):
+            group = wal.begin()
+            group.write(tmp_path / "state.json", str(i))
+            wal.commit(group)
+            assert wal.path.exists() is (i == 0)
+
+    def test_group_size_includes_pending_appends(self, wal, tmp_path):
+        (tmp_path / "log.txt").write_text("ab")
+        group = wal.begin()
+        group.append(tmp_path / "log.txt", "日本")
+        assert group.size(tmp_path / "log.txt") == 2 + len("日本".encode())
+
+
+# --------------------------------------------------------------------------
+# 起動時の復旧
+# --------------------------------------------------------------------------
+
+
+class TestRecover:
+    def test_no_log_is_noop(self, wal):
+        assert wal.recover() == 0
+
+    def test_replays_committed_group(self, wal, tmp_path):
+        group = wal.begin()
+        group.write(tmp_path / "state.json", "{}")
+        group.append(tmp_path / "messages" / "d.jsonl", "x\n")
+        _crash_after_commit(wal, group)
+
+        assert wal.recover() == 1
+        assert (tmp_path / "state.json").read_text() == "{}"
+        assert (tmp_path / "messages" / "d.jsonl").read_text() == "x\n"
+        assert not wal.path.exists()
+
+    def test_discards_torn_group(self, wal, tmp_path):
+        wal.path.write_text('{"ops": [{"op": "write", "path": "x"')
+        assert wal.recover() == 0
+        assert not wal.path.exists()
+
+    def test_append_replay_is_idempotent(self, wal, tmp_path):
+        path = tmp_path / "log.txt"
+        path.write_text("a\n")
+        group = wal.begin()
+        group.append(path, "b\n")
+        _crash_after_commit(wal, group)
+        path.write_text("a\nb\n")  # 反映済みのところで落ちた
+
+        wal.recover()
+        assert path.read_text() == "a\nb\n"
+
+    def test_append_replay_completes_partial_write(self, wal, tmp_path):
+        path = tmp_path / "log.txt"
+        path.write_text("a\n")
+        group = wal.begin()
+        group.append(path, "bbbb\n")
+        _crash_after_commit(wal, group)
+        path.write_text("a\nbb")  # 追記の途中で落ちた
+
+        wal.recover()
+        assert path.read_text() == "a\nbbbb\n"
+
+    def test_append_at_offset_rewrites_tail(self, wal, tmp_path):
+        path = tmp_path / "log.txt"
+        path.write_text("a\n\n## tail\n")
+        group = wal.begin()
+        group.append(path, "b\n\n## tail2\n", offset=2)
+        assert group.size(path) == len("a\nb\n\n## tail2\n")
+        _crash_after_commit(wal, group)
+
+        wal.recover()
+        assert path.read_text() == "a\nb\n\n## tail2\n"
+
+    def test_groups_applied_in_same_boot_are_not_replayed(self, wal, tmp_path, boot_id):
+        path = tmp_path / "daily.md"
+        group = wal.begin()
+        group.write(path, "タイムラインのみ")
+        wal.commit(group)
+        path.write_text("LLM 要約済み")  # WAL を通さない書き込み（--llm-summarize など）
+
+        assert WriteAheadLog(wal.path).recover() == 0
+        assert path.read_text() == "LLM 要約済み"
+        assert not wal.path.exists()
+        assert not wal.applied_path.exists()
+
+    def test_replays_applied_groups_after_reboot(self, wal, tmp_path, boot_id):
+        path = tmp_path / "state.json"
+        group = wal.begin()
+        group.write(path, "20")
+        wal.commit(group)
+        path.write_text("")  # fsync 前の反映が OS ごと失われた
+        boot_id.write_text("boot-2\n")
+
+        assert WriteAheadLog(wal.path).recover() == 1
+        assert path.read_text() == "20"
+
+    def test_replays_only_groups_after_watermark(self, wal, tmp_path, boot_id):
+        path = tmp_path / "state.json"
+        for value in ("10", "20"):
+            group = wal.begin()
+            group.write(path, value)
+            wal.commit(group)
+        group = wal.begin()
+        group.write(path, "30")
+        _crash_after_commit(wal, group)
+        with wal.path.open("r+", encoding="utf-8") as f:
+            lines = f.read().splitlines(keepends=True)
+            lines[-1] = lines[-1].replace('{"ops"', '{"seq": 3, "ops"')
+            f.seek(0)
+            f.write("".join(lines))
+
+        assert WriteAheadLog(wal.path).recover() == 1
+        assert path.read_text() == "30"
+
+    def test_append_skipped_when_file_replaced(self, wal, tmp_path):
+        path = tmp_path / "log.txt"
+        path.write_text("aaaa\n")
+        group = wal.begin()
+        group.append(path, "b\n")
+        _crash_after_commit(wal, group)
+        path.write_text("c\n")  # compact などで置き換えられた
+
+        wal.recover()
+        assert path.read_text() == "c\n"
+
+
+class TestLock:
+    def test_second_process_cannot_recover(self, wal):
+        wal.recover()
+        with pytest.raises(WalLockedError):
+            WriteAheadLog(wal.path).recover()
+
+    def test_close_releases_lock_and_checkpoints(self, wal, tmp_path):
+        wal.recover()
+        group = wal.begin()
+        group.write(tmp_path / "state.json", "{}")
+        wal.commit(group)
+        wal.close()
+
+        assert not wal.path.exists()
+        other = WriteAheadLog(wal.path)
+        assert other.recover() == 0
+        other.close()
+
+
+# --------------------------------------------------------------------------
+# 各ストアとの連携
+# --------------------------------------------------------------------------
+
+
+class TestGroupedWriters:
+    def test_state_store_keeps_backup(self, wal, tmp_path):
+        store = StateStore(tmp_path / "state.json")
+        store.save(State(last_update_id=10, last_run_at=_DT))
+        group = wal.begin()
+        store.save(State(last_update_id=20, last_run_at=_DT), group=group)
+        assert store.load().last_update_id == 10
+        wal.commit(group)
+        assert store.load().last_update_id == 20
+        assert json.loads(store.backup_file.read_text())["last_update_id"] == 10
+
+    def test_message_store_cache_survives_grouped_append(self, wal, tmp_path):
+        messages = MessageStore(tmp_path / "messages")
+        messages.append("2026-02-22", [_msg(1)])
+        messages.load("2026-02-22")
+        group = wal.begin()
+        messages.append("2026-02-22", [_msg(2, hour=13)], group)
+        wal.commit(group)
+
+        hits = messages.cache_stats.hits
+        assert [m.message_id for m in messages.load("2026-02-22")] == [1, 2]
+        assert messages.cache_stats.hits == hits + 1
+
+    def test_message_append_survives_compact_before_commit(self, wal, tmp_path):
+        messages = MessageStore(tmp_path / "messages")
+        messages.append("2026-02-22", [_msg(1, "v1")])
+        messages.append("2026-02-22", [_msg(1, "v2")])  # 編集履歴で compact により短くなる
+        group = wal.begin()
+        messages.append("2026-02-22", [_msg(2, hour=13)], group)
+        messages.compact("2026-02-22")  # ステージ後・コミット前に書き直された
+        wal.commit(group)
+
+        folded = MessageStore(tmp_path / "messages").load("2026-02-22")
+        assert [(m.message_id, m.text) for m in folded] == [(1, "v2"), (2, "hello")]
+
+    def test_journal_incremental_append_matches_full_render(self, wal, tmp_path):
+        writer = JournalWriter(tmp_path / "daily")
+        first, second = _msg(1, "朝", hour=9), _msg(2, "昼", hour=12)
+        writer.write(DailySummary(date="2026-02-22", messages=[first]))
+        group = wal.begin()
+        path = writer.write(
+            DailySummary(date="2026-02-22", messages=[first, second]),
+            new_messages=[second],
+            group=group,
+        )
+        wal.commit(group)
+
+        full = JournalWriter(tmp_path / "full").write(
+            DailySummary(date="2026-02-22", messages=[first, second])
+        )
+        assert path.read_text(encoding="utf-8") == full.read_text(encoding="utf-8")
+        # サイドカーのサイズが反映後のファイルと一致し、次回も差分描画できる
+        third = _msg(3, "夜", hour=20)
+        assert writer._append(path, [third], [])
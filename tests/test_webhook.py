@@ -0,0 +1,78 @@
+import threading
+
+import httpx
+import pytest
+
+from src.webhook import WebhookServer
+
+_DATE = 1740139200
+
+
+def _update(update_id=1, message_id=1, chat_id=-1001234):
+    return {
+        "update_id": update_id,
+        "message": {"message_id": message_id, "chat": {"id": chat_id}, "date": _DATE, "text": "x"},
+    }
+
+
+def _serve(server: WebhookServer) -> str:
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{server.server_port}/"
+
+
+@pytest.fixture
+def server():
+    server = WebhookServer(("127.0.0.1", 0), queue_size=2)
+    server.url = _serve(server)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestWebhookServer:
+    def test_enqueues_update(self, server):
+        resp = httpx.post(server.url, json=_update())
+        assert resp.status_code == 200
+        assert server.updates.get_nowait()["update_id"] == 1
+
+    def test_accepts_list_of_recorded_updates(self, server):
+        resp = httpx.post(server.url, json=[_update(1), _update(2)])
+        assert resp.status_code == 200
+        assert server.updates.qsize() == 2
+
+    def test_returns_429_when_queue_full(self, server):
+        resp = httpx.post(server.url, json=[_update(1), _update(2), _update(3)])
+        assert resp.status_code == 429
+        assert resp.headers["Retry-After"] == "1"
+
+    def test_rejects_invalid_json(self, server):
+        resp = httpx.post(server.url, content=b"not json")
+        assert resp.status_code == 400
+
+    def test_rejects_wrong_secret_token(self):
+        server = WebhookServer(("127.0.0.1", 0), secret_token="s3cret")
+        url = _serve(server)
+        try:
+            bad = httpx.post(url, json=_update(), headers={
+                "X-Telegram-Bot-Api-Secret-Token": "wrong"
+            })
+            good = httpx.post(url, json=_update(), headers={
+                "X-Telegram-Bot-Api-Secret-Token": "s3cret"
+            })
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert bad.status_code == 403
+        assert good.status_code == 200
+
+
+class TestNextBatch:
+    def test_returns_empty_when_nothing_arrives(self, server):
+        assert server.next_batch(10, wait=0.01) == []
+
+    def test_collects_up_to_max_size(self, server):
+        server.updates.put_nowait(_update(1))
+        server.updates.put_nowait(_update(2))
+        assert len(server.next_batch(1, wait=0.01)) == 1
+        assert len(server.next_batch(10, wait=0.01)) == 1